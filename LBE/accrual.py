@@ -0,0 +1,105 @@
+"""Nightly accrual for ACTIVE loans, one keyset chunk of loan ids at a time.
+
+For each loan, `process_chunk()`:
+
+* marks PENDING installments due before `as_of` as OVERDUE;
+* moves `next_due_date` forward to the next unpaid installment falling due on or
+  after `as_of` (or the oldest unpaid one once the schedule has run out) and
+  records `overdue_since` / `overdue_amount`, via `Loan.due_state()` like
+  `Loan.post_payment()`; and
+* accrues a simple daily penalty on each overdue installment's unpaid amount,
+  starting `LBE_PENALTY_GRACE_DAYS` after that installment's due date.
+
+Penalties accrue only for the days after `last_accrual_date`, so re-running a
+chunk for the same date changes nothing. That makes retries and resumes safe.
+"""
+import datetime
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from . import amortization, loan_cache
+from .models import Installment, Loan
+
+PENALTY_RATE = Decimal(str(getattr(settings, "LBE_PENALTY_RATE", "24.00")))  # Percent per year on overdue EMIs
+GRACE_DAYS = getattr(settings, "LBE_PENALTY_GRACE_DAYS", 3)
+ACCRUAL_FIELDS = ["next_due_date", "overdue_since", "overdue_amount", "penalty_accrued", "last_accrual_date"]
+
+
+def chunk_bounds(after_id=0, chunk_size=5000):
+    """Yield `(first_id, last_id)` ranges covering ACTIVE loans with id > `after_id`."""
+    active = Loan.objects.filter(status="ACTIVE").order_by("id").values_list("id", flat=True)
+    while True:
+        first_id = active.filter(id__gt=after_id).first()
+        if first_id is None:
+            return
+        last_id = active.filter(id__gte=first_id)[chunk_size - 1:chunk_size].first()
+        if last_id is None:
+            last_id = active.last()
+        yield first_id, last_id
+        after_id = last_id
+
+
+def process_chunk(first_id, last_id, as_of):
+    """Accrue every ACTIVE loan with id in [first_id, last_id]; returns per-chunk counters."""
+    started = time.perf_counter()
+    rate_bp = amortization.to_basis_points(PENALTY_RATE)
+    grace = datetime.timedelta(days=GRACE_DAYS)
+
+    with transaction.atomic():
+        # Row locks keep a concurrent payment from interleaving with our read-modify-write
+        loans = list(
+            Loan.objects.select_for_update().filter(status="ACTIVE", id__range=(first_id, last_id))
+            .only("id", "version", *ACCRUAL_FIELDS)
+        )
+        unpaid = defaultdict(list)
+        for loan_id, due_date, amount, amount_paid in (
+            Installment.objects.filter(loan_id__gte=first_id, loan_id__lte=last_id).exclude(status=Installment.PAID)
+            .order_by("loan_id", "due_date").values_list("loan_id", "due_date", "amount", "amount_paid")
+        ):
+            unpaid[loan_id].append((due_date, amortization.to_paisa(amount - amount_paid)))
+
+        changed, overdue_ids, penalty_total = [], [], 0
+        for loan in loans:
+            rows = unpaid.get(loan.id, [])
+            values = Loan.due_state(rows, as_of, loan.next_due_date)
+
+            penalty_paisa = 0
+            if values["overdue_since"]:
+                overdue_ids.append(loan.id)
+            for due_date, owed in rows:  # Each installment in arrears, from the end of its own grace period
+                if due_date >= as_of:
+                    break
+                accrue_from = max(due_date + grace, loan.last_accrual_date or datetime.date.min)
+                days = (as_of - accrue_from).days
+                if days > 0:
+                    penalty_paisa += int(amortization.penalty(owed, rate_bp, days))
+            penalty_total += penalty_paisa
+
+            values.update({
+                "penalty_accrued": loan.penalty_accrued + amortization.from_paisa(penalty_paisa),
+                "last_accrual_date": max(as_of, loan.last_accrual_date or as_of),
+            })
+            if any(getattr(loan, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(loan, field, value)
+                loan.version += 1  # Safe under the row lock; changes the loan's ETag
+                changed.append(loan)
+
+        Loan.objects.bulk_update(changed, ACCRUAL_FIELDS + ["version"], batch_size=1000)
+        marked = Installment.objects.filter(
+            loan_id__in=overdue_ids, status=Installment.PENDING, due_date__lt=as_of,
+        ).update(status=Installment.OVERDUE) if overdue_ids else 0
+
+    loan_cache.invalidate(*(loan.id for loan in changed))
+    return {
+        "loans": len(loans),
+        "updated": len(changed),
+        "overdue": len(overdue_ids),
+        "installments_marked": marked,
+        "penalty": amortization.from_paisa(penalty_total),
+        "seconds": time.perf_counter() - started,
+    }
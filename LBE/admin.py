@@ -1,6 +1,10 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.db import DatabaseError
+from django.db.models import F
 from .models import CustomUser, Loan
+from . import loan_cache, portfolio
 
 # ✅ CustomUserAdmin with better filtering & ordering
 class CustomUserAdmin(UserAdmin):
@@ -22,14 +26,53 @@ class CustomUserAdmin(UserAdmin):
     ordering = ('date_joined',)
     filter_horizontal = ('groups', 'user_permissions')
 
+class LoanAdminForm(forms.ModelForm):
+    class Meta:
+        model = Loan
+        fields = '__all__'
+        widgets = {'version': forms.HiddenInput}  # ✅ The version the form was opened at
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.instance.pk is not None:
+            # The admin saves inside a transaction, so this row lock holds until our UPDATE commits
+            current = Loan.objects.select_for_update().filter(pk=self.instance.pk).values_list('version', flat=True).get()
+            if cleaned_data.get('version') != current:
+                raise forms.ValidationError(
+                    "This loan changed while you were editing it (e.g. a payment was posted). "
+                    "Reload the page and make your edit again."
+                )
+        return cleaned_data
+
+
 # ✅ LoanAdmin with better filtering & searching
 class LoanAdmin(admin.ModelAdmin):
+    form = LoanAdminForm
     list_display = ('id', 'user', 'amount', 'tenure', 'interest_rate', 'monthly_installment', 'total_amount', 'status', 'created_at')
+    list_select_related = ('user',)  # ✅ One JOIN instead of a query per row for `user` and __str__
     search_fields = ('user__username', 'user__email')
     list_filter = ('status', 'created_at', 'tenure')
     ordering = ('-created_at',)  # Show latest loans first
     readonly_fields = ('monthly_installment', 'total_interest', 'total_amount', 'next_due_date')
 
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return self.readonly_fields
+        # ✅ Terms, payments and status change only through the API, which re-prices and keeps the ledger and portfolio in step
+        return self.readonly_fields + tuple(field for field in portfolio.LOAN_FIELDS if field not in self.readonly_fields)
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            super().save_model(request, obj, form, change)
+            return
+        # ✅ Compare-and-swap on the version the form was opened at, writing only the edited columns
+        edits = {field: getattr(obj, field) for field in form.changed_data if field != 'version'}
+        saved = Loan.objects.filter(pk=obj.pk, version=obj.version).update(**edits, version=F('version') + 1)
+        if not saved:  # Unreachable while LoanAdminForm.clean() holds the row lock
+            raise DatabaseError(f"Loan {obj.pk} changed concurrently; admin edit not saved.")
+        obj.version += 1  # Admin edits are mutations too: new ETag, stale payloads dropped
+        loan_cache.invalidate(obj.id)
+
 # ✅ Register models correctly
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(Loan, LoanAdmin)  # ✅ LoanAdmin now shows extra details
@@ -0,0 +1,397 @@
+"""Amortization engine shared by loan pricing, schedules and batch jobs.
+
+Two paths compute the same numbers:
+
+* `price_loan()` / `schedule()` work on a single loan with exact Decimal and
+  integer arithmetic (used by the model methods).
+* `price_batch()` / `schedule_batch()` work on many loans at once with NumPy
+  arrays (used by bulk jobs and reports).
+
+`price_loan()` reads the EMI factor for a (rate, tenure) pair from
+`annuity_table` and only falls back to the Decimal formula on a half-paisa
+near-tie. The table is filled lazily and can be shared between workers
+through a memory-mapped file (see `AnnuityTable.open()`).
+
+Money is carried in integer paisa internally. EMIs are rounded half-to-even to
+the paisa exactly like the original `round(emi, 2)` on a Decimal, so both paths
+reconcile to the paisa with the historical Decimal formula.
+"""
+import math
+import mmap
+import os
+import stat
+from collections import namedtuple
+from decimal import Decimal
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+# rate (percent p.a., 2 dp) in basis points / RATE_DIVISOR = monthly rate
+RATE_DIVISOR = 100 * 100 * 12
+
+# Float EMIs this close to a half paisa are re-priced with Decimal to settle the tie
+HALF_PAISA_TOLERANCE = 1e-6
+
+# Largest principal priced from float annuity factors; beyond it float error may exceed the tolerance
+TABLE_MAX_PAISA = 10**9
+
+Pricing = namedtuple("Pricing", ["monthly_installment", "total_interest", "total_amount"])
+
+
+def to_paisa(value):
+    return int((Decimal(value) * 100).to_integral_value())
+
+
+def from_paisa(paisa):
+    return Decimal(int(paisa)).scaleb(-2)
+
+
+def paisa_strings(paisa):
+    """Int64 paisa as `"1234.50"` strings, the way DRF renders a `decimal_places=2` field."""
+    return [f"{'-' if value < 0 else ''}{abs(value) // 100}.{abs(value) % 100:02d}"
+            for value in np.asarray(paisa, dtype=np.int64).tolist()]
+
+
+def to_basis_points(interest_rate):
+    return int((Decimal(interest_rate) * 100).to_integral_value())
+
+
+def decimal_emi(amount, interest_rate, tenure):
+    """Unrounded EMI using the original compound-interest Decimal formula."""
+    amount = Decimal(amount)
+    yearly_rate = Decimal(interest_rate) / 100
+    monthly_rate = yearly_rate / 12
+
+    if monthly_rate > 0:
+        return (amount * monthly_rate * ((1 + monthly_rate) ** tenure)) / (((1 + monthly_rate) ** tenure) - 1)
+    return amount / tenure  # 0% interest: straight-line repayment
+
+
+class AnnuityTable:
+    """EMI per paisa of principal for every (rate in basis points, tenure) pair, filled on first use.
+
+    Rates are bounded by `Loan.interest_rate` (5 digits, 2 dp) and tenures by
+    `LoanSerializer`, so the whole product space fits in one float64 array.
+    Unfilled cells are 0.0, so a freshly created (sparse) file is already an
+    empty table, and concurrent writers only ever store identical values.
+    """
+    MAX_RATE_BP = 99999
+    MAX_TENURE = 24
+
+    def __init__(self):
+        self.path = None
+        self._factors = None
+
+    @property
+    def shape(self):
+        return (self.MAX_RATE_BP + 1, self.MAX_TENURE + 1)
+
+    def open(self, path):
+        """Back the table with a memory-mapped file shared by every process that opens it.
+
+        Factors read from the file price real loans, so only a regular file owned by this user and
+        writable by no one else is accepted; symlinks are not followed. Anything else raises `PermissionError`.
+        """
+        os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW | getattr(os, "O_CLOEXEC", 0), 0o600)
+        try:
+            info = os.fstat(fd)
+            if not stat.S_ISREG(info.st_mode) or info.st_uid != os.geteuid() or info.st_mode & 0o022:
+                raise PermissionError(f"{path} must be a regular file owned by uid {os.geteuid()} "
+                                      f"and not writable by group or others")
+            size = self.shape[0] * self.shape[1] * np.dtype(np.float64).itemsize
+            if info.st_size < size:
+                os.ftruncate(fd, size)  # Never shrinks a file another worker has mapped
+            buffer = mmap.mmap(fd, size)  # Maps the checked descriptor, not whatever the path names now
+        finally:
+            os.close(fd)
+        self._factors = np.ndarray(self.shape, dtype=np.float64, buffer=buffer)
+        self.path = path
+
+    def factors(self):
+        if self._factors is None:
+            self._factors = np.zeros(self.shape, dtype=np.float64)  # Private to this process
+        return self._factors
+
+    def covers(self, rate_bp, tenure):
+        return 0 <= rate_bp <= self.MAX_RATE_BP and 1 <= tenure <= self.MAX_TENURE
+
+    def factor(self, rate_bp, tenure):
+        factors = self.factors()
+        value = factors.item(rate_bp, tenure)  # A plain float; far cheaper than memmap indexing
+        if value == 0.0:
+            value = float(decimal_emi(1, Decimal(rate_bp).scaleb(-2), tenure))
+            factors[rate_bp, tenure] = value
+        return value
+
+    def filled(self):
+        return int(np.count_nonzero(self.factors()))
+
+
+annuity_table = AnnuityTable()
+
+
+def exact_emi(amount, interest_rate, tenure):
+    """EMI rounded to the paisa with the original Decimal formula."""
+    return round(decimal_emi(amount, interest_rate, tenure), 2)
+
+
+def emi(amount, interest_rate, tenure):
+    """EMI rounded to the paisa, as `exact_emi()` but via `annuity_table` where it can."""
+    amount_paisa = Decimal(amount) * 100
+    rate_bp = Decimal(interest_rate) * 100
+    paisa, bp = int(amount_paisa), int(rate_bp)
+    if paisa != amount_paisa or bp != rate_bp or abs(paisa) > TABLE_MAX_PAISA or not annuity_table.covers(bp, tenure):
+        return exact_emi(amount, interest_rate, tenure)  # Off-grid terms
+
+    value = paisa * annuity_table.factor(bp, tenure)
+    if abs(value - math.floor(value) - 0.5) < HALF_PAISA_TOLERANCE:
+        return exact_emi(amount, interest_rate, tenure)  # Let Decimal settle the tie
+    return from_paisa(round(value))
+
+
+def price_loan(amount, interest_rate, tenure):
+    """Price a single loan; returns Decimal `Pricing` rounded to the paisa."""
+    amount = Decimal(amount)
+    monthly_installment = emi(amount, interest_rate, tenure)
+    total_interest = round((monthly_installment * tenure) - amount, 2)
+    total_amount = round(amount + total_interest, 2)
+    return Pricing(monthly_installment, total_interest, total_amount)
+
+
+def _round_half_even_div(numerator, denominator):
+    """Integer division rounded half-to-even (works for ints and int64 arrays)."""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    return quotient + ((twice > denominator) | ((twice == denominator) & (quotient % 2 == 1)))
+
+
+def emi_batch(amount_paisa, rate_bp, tenures):
+    """EMIs in paisa for principals in paisa, rates in basis points and tenures (int64 arrays)."""
+    amount_paisa = np.asarray(amount_paisa, dtype=np.int64)
+    rate_bp = np.asarray(rate_bp, dtype=np.int64)
+    tenures = np.asarray(tenures, dtype=np.int64)
+
+    monthly_rate = rate_bp / RATE_DIVISOR
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (1 + monthly_rate) ** tenures
+        emi = np.where(
+            monthly_rate > 0,
+            amount_paisa * monthly_rate * growth / (growth - 1),
+            amount_paisa / tenures,
+        )
+
+    emi_paisa = np.rint(emi).astype(np.int64)
+
+    # Settle near-ties exactly; these are rare (a handful per million loans)
+    ties = np.flatnonzero(np.abs(emi - np.floor(emi) - 0.5) < HALF_PAISA_TOLERANCE)
+    for i in ties:
+        emi_paisa.flat[i] = to_paisa(exact_emi(from_paisa(amount_paisa.flat[i]), from_paisa(rate_bp.flat[i]), int(tenures.flat[i])))
+    return emi_paisa
+
+
+def price_batch(amounts, interest_rates, tenures):
+    """Price many loans at once.
+
+    Accepts array-likes of amounts (rupees), yearly rates (percent) and tenures
+    (months). Returns a dict of int64 paisa arrays: `monthly_installment`,
+    `total_interest` and `total_amount`.
+    """
+    amount_paisa = np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+    rate_bp = np.rint(np.asarray(interest_rates, dtype=np.float64) * 100).astype(np.int64)
+    tenure = np.asarray(tenures, dtype=np.int64)
+    amount_paisa, rate_bp, tenure = np.broadcast_arrays(amount_paisa, rate_bp, tenure)
+    emi_paisa = emi_batch(amount_paisa, rate_bp, tenure)
+
+    total_interest = emi_paisa * tenure - amount_paisa
+    return {
+        "monthly_installment": emi_paisa,
+        "total_interest": total_interest,
+        "total_amount": amount_paisa + total_interest,
+    }
+
+
+def price_grid(amounts, interest_rates, tenures):
+    """Price every amount x tenure x rate combination in one `price_batch()` pass.
+
+    Returns `(amount, interest_rate, tenure, pricing)`: the flattened grid axes
+    (amount-major, then tenure, then rate) and the `price_batch()` result.
+    """
+    amount, tenure, rate = (axis.ravel() for axis in np.meshgrid(
+        np.asarray(amounts, dtype=np.float64),
+        np.asarray(tenures, dtype=np.int64),
+        np.asarray(interest_rates, dtype=np.float64),
+        indexing="ij",
+    ))
+    return amount, rate, tenure, price_batch(amount, rate, tenure)
+
+
+def daily_interest(principal_paisa, rate_bp, days):
+    """Simple interest in paisa for `days` at `rate_bp` per year (365-day basis)."""
+    return _round_half_even_div(principal_paisa * rate_bp * days, 100 * 100 * 365)
+
+
+def penalty(overdue_paisa, rate_bp, days):
+    """Simple daily penalty in paisa on an overdue amount at `rate_bp` per year (365-day basis)."""
+    return daily_interest(overdue_paisa, rate_bp, days)
+
+
+def schedule(amount, interest_rate, tenure, monthly_installment, start_date):
+    """Installment-by-installment breakdown for one loan.
+
+    Interest accrues on the outstanding balance each month (rounded to the
+    paisa); the final installment absorbs rounding so the balance closes at
+    zero while every installment stays equal to the EMI.
+    """
+    balance = to_paisa(amount)
+    rate_bp = to_basis_points(interest_rate)
+    emi = to_paisa(monthly_installment)
+
+    rows = []
+    for i in range(tenure):
+        if i == tenure - 1:
+            interest = emi - balance
+        else:
+            interest = _round_half_even_div(balance * rate_bp, RATE_DIVISOR)
+        principal = emi - interest
+        balance -= principal
+        rows.append({
+            "installment_no": i + 1,
+            "due_date": start_date + relativedelta(months=i),
+            "amount": from_paisa(emi),
+            "principal": from_paisa(principal),
+            "interest": from_paisa(interest),
+            "balance": from_paisa(balance),
+        })
+    return rows
+
+
+def schedule_batch(amount_paisa, rate_bp, tenures, emi_paisa):
+    """Vectorized `schedule()` for many loans (money in int64 paisa).
+
+    Returns `(principal, interest, balance)` arrays shaped (loans, max tenure);
+    columns past a loan's tenure are zero.
+    """
+    balance = np.array(amount_paisa, dtype=np.int64)
+    rate_bp = np.asarray(rate_bp, dtype=np.int64)
+    tenures = np.asarray(tenures, dtype=np.int64)
+    emi_paisa = np.asarray(emi_paisa, dtype=np.int64)
+
+    periods = int(tenures.max()) if tenures.size else 0
+    principal = np.zeros((balance.size, periods), dtype=np.int64)
+    interest = np.zeros_like(principal)
+    balances = np.zeros_like(principal)
+
+    for i in range(periods):
+        active = i < tenures
+        accrued = np.where(i == tenures - 1, emi_paisa - balance, _round_half_even_div(balance * rate_bp, RATE_DIVISOR))
+        paid_principal = emi_paisa - accrued
+        balance = np.where(active, balance - paid_principal, balance)
+        interest[:, i] = np.where(active, accrued, 0)
+        principal[:, i] = np.where(active, paid_principal, 0)
+        balances[:, i] = np.where(active, balance, 0)
+
+    return principal, interest, balances
+
+
+def outstanding_batch(amount_paisa, rate_bp, tenures, emi_paisa, paid_paisa):
+    """Split what is still owed on many loans into principal and interest (int64 paisa).
+
+    Payments settle installments in order; a part-paid installment covers its
+    interest before its principal. Returns `(outstanding_principal,
+    interest_receivable)`; together they equal `tenure * emi - paid`.
+    """
+    amount_paisa = np.asarray(amount_paisa, dtype=np.int64)
+    tenures = np.asarray(tenures, dtype=np.int64)
+    emi_paisa = np.asarray(emi_paisa, dtype=np.int64)
+    paid_paisa = np.asarray(paid_paisa, dtype=np.int64)
+    if not amount_paisa.size:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    _, interest, balances = schedule_batch(amount_paisa, rate_bp, tenures, emi_paisa)
+    rows = np.arange(amount_paisa.size)
+    covered = np.minimum(paid_paisa // np.maximum(emi_paisa, 1), tenures)
+    last = balances.shape[1] - 1
+
+    balance = np.where(covered > 0, balances[rows, np.clip(covered - 1, 0, last)], amount_paisa)
+    next_interest = np.where(covered < tenures, interest[rows, np.clip(covered, 0, last)], 0)
+    partial = paid_paisa - covered * emi_paisa
+    principal = np.maximum(balance - np.maximum(partial - next_interest, 0), 0)
+
+    outstanding = np.maximum(tenures * emi_paisa - paid_paisa, 0)
+    return principal, outstanding - principal
+
+
+def tenure_batch(amount_paisa, rate_bp, emi_paisa, max_tenures):
+    """Fewest installments (at most `max_tenures`) whose re-priced EMI does not exceed `emi_paisa`."""
+    amount_paisa = np.asarray(amount_paisa, dtype=np.int64)
+    rate_bp = np.asarray(rate_bp, dtype=np.int64)
+    emi_paisa = np.asarray(emi_paisa, dtype=np.int64)
+
+    monthly_rate = rate_bp / RATE_DIVISOR
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = amount_paisa * monthly_rate / emi_paisa  # n = -log(1 - B*r/E) / log(1 + r)
+        periods = np.where(
+            monthly_rate > 0,
+            -np.log1p(-np.minimum(ratio, 1.0)) / np.log1p(monthly_rate),
+            amount_paisa / emi_paisa,
+        )
+    tenures = np.clip(np.ceil(np.nan_to_num(periods, posinf=0) - 1e-9), 1, max_tenures).astype(np.int64)
+
+    # Float logs can land one short of the exact bound; step up where the re-priced EMI overshoots
+    short = (emi_batch(amount_paisa, rate_bp, tenures) > emi_paisa) & (tenures < max_tenures)
+    return tenures + short
+
+
+def simulate_batch(balance_paisa, rate_bp, tenures, emi_paisa, prepayments, reduce="tenure"):
+    """Re-amortize many loans under a prepayment plan, without touching the loans (int64 paisa).
+
+    `balance_paisa`, `tenures` and `emi_paisa` describe each loan now: principal
+    outstanding, installments left and EMI. `prepayments[:, k]` goes to
+    principal just before the k-th remaining installment. A prepayment re-prices
+    the loan: `reduce="emi"` keeps the installments left and lowers the EMI,
+    `reduce="tenure"` keeps (at most) the EMI and drops installments. One that
+    covers the balance closes the loan.
+
+    Returns a dict of arrays: `amount`, `principal`, `interest`, `balance`
+    and `prepaid`, each shaped (loans, max tenure), plus the final
+    `monthly_installment` and `tenure` per loan. Installment rows follow
+    `schedule()`: the last one absorbs rounding.
+    """
+    if reduce not in ("emi", "tenure"):
+        raise ValueError(f"reduce must be 'emi' or 'tenure', not {reduce!r}")
+    balance = np.array(balance_paisa, dtype=np.int64)
+    rate_bp = np.asarray(rate_bp, dtype=np.int64)
+    remaining = np.array(tenures, dtype=np.int64)
+    emi = np.array(emi_paisa, dtype=np.int64)
+    prepayments = np.asarray(prepayments, dtype=np.int64).reshape(balance.size, -1)
+
+    periods = int(remaining.max()) if remaining.size else 0
+    shape = (balance.size, periods)
+    result = {key: np.zeros(shape, dtype=np.int64) for key in ("amount", "principal", "interest", "balance", "prepaid")}
+
+    for i in range(periods):
+        prepaid = np.minimum(prepayments[:, i], balance) if i < prepayments.shape[1] else np.zeros_like(balance)
+        balance -= prepaid
+        result["prepaid"][:, i] = prepaid
+        remaining = np.where(balance > 0, remaining, 0)
+
+        repriced = np.flatnonzero((prepaid > 0) & (remaining > 0))
+        if repriced.size:
+            if reduce == "tenure":
+                remaining[repriced] = tenure_batch(balance[repriced], rate_bp[repriced], emi[repriced], remaining[repriced])
+            emi[repriced] = emi_batch(balance[repriced], rate_bp[repriced], remaining[repriced])
+
+        active = remaining > 0
+        accrued = np.where(remaining == 1, emi - balance, _round_half_even_div(balance * rate_bp, RATE_DIVISOR))
+        paid_principal = emi - accrued
+        balance = np.where(active, balance - paid_principal, balance)
+        result["amount"][:, i] = np.where(active, emi, 0)
+        result["interest"][:, i] = np.where(active, accrued, 0)
+        result["principal"][:, i] = np.where(active, paid_principal, 0)
+        result["balance"][:, i] = np.where(active, balance, 0)
+        remaining = remaining - active
+
+    result["tenure"] = np.count_nonzero(result["amount"], axis=1)
+    result["monthly_installment"] = np.where(result["tenure"] > 0, emi, 0)
+    return result
@@ -1,6 +1,33 @@
+import logging
+
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
 
 class LbeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LBE'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core import checks
+        from django.db.backends.signals import connection_created
+
+        from .amortization import annuity_table
+        from .authentication import check_auth_cache
+        from .db_routers import check_sticky_cache
+        from .metrics import install_query_wrapper
+        from .throttling import check_throttle_cache
+
+        connection_created.connect(install_query_wrapper, dispatch_uid="lbe_metrics_query_wrapper")
+        checks.register(check_sticky_cache, checks.Tags.caches)
+        checks.register(check_auth_cache, checks.Tags.caches)
+        checks.register(check_throttle_cache, checks.Tags.caches)
+
+        path = getattr(settings, "LBE_ANNUITY_TABLE_PATH", None)
+        if path:
+            try:
+                annuity_table.open(path)
+            except OSError as exc:  # Read-only or missing directory: keep a per-process table
+                logger.warning("Annuity table %s unavailable (%s); using a private table.", path, exc)
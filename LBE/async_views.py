@@ -0,0 +1,130 @@
+"""ASGI-native read endpoints (`/api/async/...`).
+
+DRF views are synchronous, so these are plain Django async views that mirror
+the sync read paths and reuse their serializers and JWT authentication. Under
+an ASGI server a request waiting on the database no longer pins a worker, so
+one process can hold many more slow mobile connections open. Django's async
+ORM still runs each query in a per-request thread.
+
+Only bearer-token (JWT) authentication is supported here. Write paths stay on
+the synchronous DRF views. Reads go to a replica like their sync twins (see
+LBE/db_routers.py).
+"""
+import base64
+import binascii
+
+from django.http import HttpResponseNotModified, JsonResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import db_routers, loan_cache
+from .authentication import CachedJWTAuthentication
+from .models import Loan
+from .pagination import LoanCursorPagination
+from .serializers import LoanListSerializer, LoanSerializer, schedule_payload
+from .views import CachedLoanPayloadMixin, LoanListMixin
+
+
+class AsyncReadView(View):
+    """Authenticates the bearer token, then delegates to `respond()`."""
+    http_method_names = ["get", "options"]
+    authenticator = CachedJWTAuthentication()
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            authenticated = await self.authenticator.aauthenticate(request)
+        except AuthenticationFailed as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+            return self.unauthorized(detail)
+        if authenticated is None:
+            return self.unauthorized({"detail": "Authentication credentials were not provided."})
+        request.user = authenticated[0]
+        token = db_routers.use_alias(await db_routers.aread_alias(request.user))
+        try:
+            return await self.respond(request, *args, **kwargs)
+        finally:
+            db_routers.reset_alias(token)
+
+    def unauthorized(self, detail):
+        response = JsonResponse(detail, status=401)
+        response["WWW-Authenticate"] = 'Bearer realm="api"'
+        return response
+
+    async def cached_loan_payload(self, request, id, kind, build):
+        """Async twin of `CachedLoanPayloadMixin.retrieve()`: ETag/304, then cached or freshly built payload."""
+        row = await Loan.objects.filter(id=id).values_list("user_id", "version").afirst()
+        if row is None:
+            return JsonResponse({"detail": "No Loan matches the given query."}, status=404)
+        user_id, version = row
+        if user_id != request.user.pk and not request.user.is_staff:
+            return JsonResponse({"detail": "You do not have permission to perform this action."}, status=403)
+
+        tag = loan_cache.etag(kind, id, version)
+        if loan_cache.not_modified(request, tag):
+            return self.with_validators(HttpResponseNotModified(), tag)
+
+        data = await loan_cache.aget_payload(kind, id, version)
+        if data is None:
+            loan = await Loan.objects.prefetch_related("installments").aget(id=id)
+            data = build(loan)
+            await loan_cache.aset_payload(kind, loan.id, loan.version, data)
+            tag = loan_cache.etag(kind, loan.id, loan.version)
+        return self.with_validators(JsonResponse(data, encoder=JSONEncoder), tag)
+
+    with_validators = staticmethod(CachedLoanPayloadMixin.with_validators)
+
+
+# ✅ Async: List Loans (forward-only keyset pages, newest first)
+class AsyncLoanListView(AsyncReadView):
+    page_size = LoanCursorPagination.page_size
+    max_page_size = LoanCursorPagination.max_page_size
+
+    async def respond(self, request):
+        try:
+            page_size = max(1, min(int(request.GET.get("page_size", self.page_size)), self.max_page_size))
+            before_id = self.decode_cursor(request.GET.get("cursor"))
+        except (TypeError, ValueError, binascii.Error):
+            return JsonResponse({"detail": "Invalid cursor"}, status=404)
+
+        queryset = Loan.objects.filter(user=request.user).only(*LoanListMixin.list_fields).order_by("-id")
+        if before_id is not None:
+            queryset = queryset.filter(id__lt=before_id)
+        loans = [loan async for loan in queryset[:page_size + 1]]
+
+        next_url = None
+        if len(loans) > page_size:
+            loans = loans[:page_size]
+            query = request.GET.copy()
+            query["cursor"] = self.encode_cursor(loans[-1].id)
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+        return JsonResponse(
+            {"next": next_url, "previous": None, "results": LoanListSerializer(loans, many=True).data},
+            encoder=JSONEncoder,  # Same number/date formatting as DRF's JSONRenderer
+        )
+
+    @staticmethod
+    def encode_cursor(before_id):
+        return base64.urlsafe_b64encode(f"b={before_id}".encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        if not cursor:
+            return None
+        key, _, value = base64.urlsafe_b64decode(cursor.encode()).decode().partition("=")
+        if key != "b":
+            raise ValueError(cursor)
+        return int(value)
+
+
+# ✅ Async: Loan Details (User or Admin)
+class AsyncLoanDetailView(AsyncReadView):
+    async def respond(self, request, id):
+        return await self.cached_loan_payload(request, id, "detail", lambda loan: LoanSerializer(loan).data)
+
+
+# ✅ Async: Payment Schedule only (User or Admin)
+class AsyncLoanScheduleView(AsyncReadView):
+    async def respond(self, request, id):
+        return await self.cached_loan_payload(request, id, "schedule", schedule_payload)
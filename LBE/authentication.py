@@ -0,0 +1,112 @@
+"""JWT authentication backed by a short-lived, in-process user snapshot.
+
+Tokens carry the `is_staff`, `is_verified` and `is_active` claims. On each
+request the user is rebuilt from a cached snapshot of the fields permissions
+need, so authenticated reads do not query `CustomUser`. Snapshots expire after
+`LBE_AUTH_CACHE_TTL` seconds and are dropped whenever the user is saved.
+
+`LBE_AUTH_CACHE` must name a cache every worker shares, or a deactivated user
+or revoked admin keeps access on other workers for up to the TTL;
+`check_auth_cache()` fails the system checks for a per-process backend.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .checks import shared_cache_errors
+
+TOKEN_CLAIMS = ("is_staff", "is_verified", "is_active")
+SNAPSHOT_FIELDS = ("id", "username", "email", "is_staff", "is_superuser", "is_active", "is_verified")
+
+
+def snapshot_cache():
+    return caches[getattr(settings, "LBE_AUTH_CACHE", "default")]
+
+
+def check_auth_cache(app_configs=None, **kwargs):
+    """System check: `forget_user()` must reach the snapshots every worker reads."""
+    return shared_cache_errors(
+        "LBE_AUTH_CACHE", ("LBE.E003", "LBE.E004"),
+        "a deactivated user or revoked admin keeps access on other workers until the snapshot expires",
+    )
+
+
+def snapshot_key(user_id):
+    return f"lbe:auth-user:{user_id}"
+
+
+def forget_user(user_id):
+    """Drop the cached auth snapshot after the user's fields changed."""
+    snapshot_cache().delete(snapshot_key(user_id))
+
+
+class LoanRefreshToken(RefreshToken):
+    """Refresh token (and derived access token) carrying the authorization claims."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in TOKEN_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        snapshot = snapshot_cache().get(snapshot_key(user_id))
+        if snapshot is None:
+            user = super().get_user(validated_token)  # The only query, once per user per TTL
+            snapshot_cache().set(snapshot_key(user_id), self.snapshot(user), self.ttl())
+            return user
+        return self.from_snapshot(snapshot)
+
+    async def aauthenticate(self, request):
+        """`authenticate()` for plain Django async views; only a cache miss touches the database."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        user_id = self.get_user_id(validated_token)
+        snapshot = await snapshot_cache().aget(snapshot_key(user_id))
+        if snapshot is None:
+            user = await sync_to_async(super().get_user)(validated_token)
+            await snapshot_cache().aset(snapshot_key(user_id), self.snapshot(user), self.ttl())
+            return user, validated_token
+        return self.from_snapshot(snapshot), validated_token
+
+    def get_user_id(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+        if validated_token.get("is_active") is False:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user_id
+
+    @staticmethod
+    def ttl():
+        return getattr(settings, "LBE_AUTH_CACHE_TTL", 60)
+
+    @staticmethod
+    def snapshot(user):
+        return {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+
+    def from_snapshot(self, snapshot):
+        if not snapshot["is_active"]:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+        user = self.user_model(**snapshot)
+        user._state.adding = False
+        user._state.db = DEFAULT_DB_ALIAS
+        user.is_auth_snapshot = True  # Partial instance: CustomUser.save() refuses to persist it
+        return user
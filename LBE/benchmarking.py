@@ -0,0 +1,191 @@
+"""Helpers shared by the `bench_*` management commands.
+
+Benchmarks never touch the configured database: they run against a throwaway
+test database created (and destroyed) by `isolated_database()`.
+"""
+import datetime
+import platform
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decimal import Decimal
+
+import django
+from dateutil.relativedelta import relativedelta
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from . import amortization
+from .models import CustomUser, Loan
+
+# A handful of representative products, cycled through when seeding loans
+SEED_TERMS = [
+    (Decimal("10000.00"), 12, Decimal("10.00")),
+    (Decimal("25000.00"), 6, Decimal("12.50")),
+    (Decimal("50000.00"), 24, Decimal("9.75")),
+    (Decimal("1000.00"), 3, Decimal("18.00")),
+    (Decimal("100000.00"), 18, Decimal("11.25")),
+]
+
+
+@contextmanager
+def isolated_database(verbosity=0):
+    """Run the enclosed block against a fresh, migrated test database."""
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        teardown_test_environment()
+
+
+def measure(func, repeat=3):
+    """Return (best wall time in seconds, peak traced memory in bytes, last result)."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak, result
+
+
+def create_user(username="bench", is_staff=False, password=None):
+    user = CustomUser(username=username, email=f"{username}@example.com", is_staff=is_staff, is_verified=True)
+    if password:
+        user.set_password(password)
+    else:
+        user.set_unusable_password()
+    user.save()
+    return user
+
+
+def seed_loans(user, count, batch_size=5000):
+    """Bulk-insert `count` loans for `user`, priced in one pass by the batch engine."""
+    next_due_date = datetime.date.today() + relativedelta(months=1)
+    created = 0
+    while created < count:
+        terms = [SEED_TERMS[i % len(SEED_TERMS)] for i in range(created, min(count, created + batch_size))]
+        amounts, tenures, rates = zip(*terms)
+        priced = amortization.price_batch(amounts, rates, tenures)
+        Loan.objects.bulk_create([
+            Loan(
+                user=user,
+                amount=amount,
+                tenure=tenure,
+                interest_rate=interest_rate,
+                monthly_installment=amortization.from_paisa(priced["monthly_installment"][i]),
+                total_interest=amortization.from_paisa(priced["total_interest"][i]),
+                total_amount=amortization.from_paisa(priced["total_amount"][i]),
+                next_due_date=next_due_date,
+            )
+            for i, (amount, tenure, interest_rate) in enumerate(terms)
+        ])
+        created += len(terms)
+    return created
+
+
+def seed_book(loans, users=1000, seed=42, batch_size=20000):
+    """Insert a large, realistic loan book with raw `executemany` (much faster than the ORM).
+
+    Creates `users` borrowers and spreads `loans` across them with mixed terms,
+    ~80% ACTIVE, creation dates over two years and due dates around today.
+    """
+    rng = random.Random(seed)
+    CustomUser.objects.bulk_create([
+        CustomUser(username=f"borrower{i}", email=f"borrower{i}@example.com", password="!", is_verified=True)
+        for i in range(users)
+    ], batch_size=5000)
+    user_ids = list(CustomUser.objects.filter(username__startswith="borrower").values_list("id", flat=True))
+
+    amounts, tenures, rates = zip(*SEED_TERMS)
+    priced = amortization.price_batch(amounts, rates, tenures)
+    terms = [
+        (str(SEED_TERMS[i][0]), SEED_TERMS[i][1], str(SEED_TERMS[i][2]),
+         *(str(amortization.from_paisa(priced[field][i])) for field in amortization.Pricing._fields))
+        for i in range(len(SEED_TERMS))
+    ]
+
+    table = Loan._meta.db_table
+    columns = ["user_id", "amount", "tenure", "interest_rate", "monthly_installment", "total_interest",
+               "total_amount", "amount_paid", "created_at", "next_due_date", "status",
+               "version", "overdue_amount", "penalty_accrued"]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        connection.ops.quote_name(table),
+        ", ".join(connection.ops.quote_name(column) for column in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+    now = timezone.now()
+    today = datetime.date.today()
+    ops = connection.ops
+
+    with connection.cursor() as cursor:
+        for start in range(0, loans, batch_size):
+            rows = []
+            for _ in range(min(batch_size, loans - start)):
+                amount, tenure, rate, emi, interest, total = rng.choice(terms)
+                active = rng.random() < 0.8
+                rows.append((
+                    rng.choice(user_ids), amount, tenure, rate, emi, interest, total,
+                    "0.00" if active else total,
+                    ops.adapt_datetimefield_value(now - datetime.timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))),
+                    ops.adapt_datefield_value(today + datetime.timedelta(days=rng.randrange(-60, 30))),
+                    "ACTIVE" if active else "CLOSED",
+                    0, "0.00", "0.00",
+                ))
+            cursor.executemany(sql, rows)
+    return loans
+
+
+def format_bytes(size):
+    return f"{size / (1024 * 1024):.2f} MiB"
+
+
+def latency_stats(samples):
+    """Summarise per-operation wall times (seconds) as throughput and latency percentiles."""
+    ordered = sorted(samples)
+    total = sum(ordered)
+
+    def percentile(p):
+        return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))] * 1000
+
+    return {
+        "count": len(ordered),
+        "ops_per_sec": round(len(ordered) / total, 2) if total else None,
+        "mean_ms": round(total / len(ordered) * 1000, 4),
+        "p50_ms": round(percentile(50), 4),
+        "p95_ms": round(percentile(95), 4),
+        "p99_ms": round(percentile(99), 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+def compare_results(baseline, current, threshold=0.2, metric="p50_ms"):
+    """Rows of `(name, baseline, current, relative change, regressed)` for benchmarks present in both runs."""
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        before, after = baseline[name][metric], current[name][metric]
+        change = (after - before) / before if before else 0.0
+        rows.append((name, before, after, change, change > threshold))
+    return rows
+
+
+def run_metadata(**scale):
+    """Environment details stored next to results so runs are only compared like for like."""
+    return {
+        "timestamp": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "machine": platform.machine(),
+        "scale": scale,
+    }
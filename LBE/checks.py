@@ -0,0 +1,24 @@
+"""System checks for settings that must name a cache every worker process shares."""
+from django.conf import settings
+from django.core import checks
+
+PER_PROCESS_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def shared_cache_errors(setting, ids, consequence):
+    """Errors when the cache alias in `setting` is unknown or per-process; `ids` is `(unknown, per-process)`."""
+    alias = getattr(settings, setting, "default")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+    if backend is None:
+        return [checks.Error(f"{setting} names an unknown cache alias {alias!r}.", id=ids[0])]
+    if backend in PER_PROCESS_CACHES:
+        return [checks.Error(
+            f"{setting} ({alias!r}) uses {backend.rsplit('.', 1)[-1]}, which each worker process keeps to itself, "
+            f"so {consequence}.",
+            hint="Point it at a cache shared by every worker: file-based on one host, Redis or Memcached across hosts.",
+            id=ids[1],
+        )]
+    return []
@@ -0,0 +1,163 @@
+"""Route the read-heavy loan views to read replicas, with read-your-writes stickiness.
+
+Only views that opt in (`ReplicaReadMixin`, and the async read views) read from
+a replica. Everything else, including every write, stays on `default`. A view
+opts in for the duration of its handler, after authentication, by setting a
+context variable that `ReadReplicaRouter.db_for_read()` consults.
+
+Replication lags, so a user who has just written (originated, paid,
+foreclosed...) must not be sent to a replica that has not seen the write yet.
+`ReplicaStickinessMiddleware` notes any request that asked the router for a
+write connection. When it finishes, it pins that user to the primary for
+`LBE_REPLICA_STICKY_SECONDS`. The pin is a key in the `LBE_REPLICA_STICKY_CACHE`
+alias, which must be shared by every worker: `check_sticky_cache()` fails the
+system checks for a per-process backend while replicas are configured. Within a
+request, reads after a write, and reads inside a transaction on `default`, go
+to `default` too.
+
+Replica aliases come from `LBE_READ_REPLICAS`; when it is empty, routing is a
+no-op.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .checks import shared_cache_errors
+
+_read_alias = ContextVar("lbe_read_alias", default=None)
+_request_writes = ContextVar("lbe_request_writes", default=None)
+
+
+def replicas():
+    return getattr(settings, "LBE_READ_REPLICAS", [])
+
+
+def _sticky_cache():
+    return caches[getattr(settings, "LBE_REPLICA_STICKY_CACHE", "default")]
+
+
+def check_sticky_cache(app_configs=None, **kwargs):
+    """System check: with replicas configured, pins must live in a cache every worker process sees."""
+    if not replicas():
+        return []
+    return shared_cache_errors(
+        "LBE_REPLICA_STICKY_CACHE", ("LBE.E001", "LBE.E002"),
+        "a user's next request may read a replica that has not seen their write",
+    )
+
+
+def _sticky_key(user_id):
+    return f"lbe:db-sticky:{user_id}"
+
+
+def pin_to_primary(user_id):
+    """Send `user_id`'s replica reads to `default` until replicas have caught up with their write."""
+    _sticky_cache().set(_sticky_key(user_id), True, timeout=getattr(settings, "LBE_REPLICA_STICKY_SECONDS", 5))
+
+
+async def apin_to_primary(user_id):
+    await _sticky_cache().aset(_sticky_key(user_id), True, timeout=getattr(settings, "LBE_REPLICA_STICKY_SECONDS", 5))
+
+
+def read_alias(user):
+    """The replica to read from for `user`, or None for `default`."""
+    aliases = replicas()
+    if not aliases or (user.is_authenticated and _sticky_cache().get(_sticky_key(user.pk))):
+        return None
+    return random.choice(aliases)
+
+
+async def aread_alias(user):
+    aliases = replicas()
+    if not aliases or (user.is_authenticated and await _sticky_cache().aget(_sticky_key(user.pk))):
+        return None
+    return random.choice(aliases)
+
+
+def use_alias(alias):
+    """Route reads in the current context to `alias` (None: `default`); returns a token for `reset_alias()`."""
+    return _read_alias.set(alias)
+
+
+def reset_alias(token):
+    _read_alias.reset(token)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None:
+            return None
+        writes = _request_writes.get()
+        if (writes and writes["wrote"]) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        writes = _request_writes.get()
+        if writes is not None:
+            writes["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Replicas hold the same rows as the primary
+
+
+class ReplicaReadMixin:
+    """Runs a DRF view's handler with reads on a replica, unless the user is pinned to the primary."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)  # Authenticates and checks permissions on `default`
+        self._replica_token = use_alias(read_alias(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            reset_alias(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaStickinessMiddleware:
+    """Pins the requesting user to the primary after any request that wrote to the database."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        writes = {"wrote": False}  # Mutated, not re-set, so the flag survives sync/async context copies
+        token = _request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        if self.should_pin(request, writes):
+            pin_to_primary(request.user.pk)
+        return response
+
+    async def __acall__(self, request):
+        writes = {"wrote": False}
+        token = _request_writes.set(writes)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        if self.should_pin(request, writes):
+            await apin_to_primary(request.user.pk)
+        return response
+
+    @staticmethod
+    def should_pin(request, writes):
+        user = getattr(request, "user", None)  # DRF copies its authenticated user onto the Django request
+        return writes["wrote"] and bool(replicas()) and user is not None and user.is_authenticated
@@ -0,0 +1,47 @@
+"""Password hashers whose cost comes from settings, so it can be tuned per deployment.
+
+`PASSWORD_HASHERS[0]` is the policy: new passwords are hashed with it. On
+every successful login Django's `check_password()` re-hashes any stored
+password that was made by another hasher or at a different cost (see
+`must_update()`), so raising *or* lowering the cost, or switching between
+PBKDF2 and scrypt, migrates users transparently as they log in.
+
+Both hashers keep Django's algorithm names, so hashes written before this
+module existed still verify. Use `manage.py bench_hashers` to choose a cost
+for a login latency budget.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with `LBE_PBKDF2_ITERATIONS` iterations (Django's default if unset)."""
+
+    @property
+    def iterations(self):
+        return getattr(settings, "LBE_PBKDF2_ITERATIONS", PBKDF2PasswordHasher.iterations)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with `LBE_SCRYPT_WORK_FACTOR` (N), `LBE_SCRYPT_BLOCK_SIZE` (r) and `LBE_SCRYPT_PARALLELISM` (p).
+
+    Memory per hash is about 128 * N * r bytes (16 MiB with Django's defaults).
+    """
+
+    @property
+    def work_factor(self):
+        return getattr(settings, "LBE_SCRYPT_WORK_FACTOR", ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return getattr(settings, "LBE_SCRYPT_BLOCK_SIZE", ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, "LBE_SCRYPT_PARALLELISM", ScryptPasswordHasher.parallelism)
+
+    @property
+    def maxmem(self):
+        # A ceiling, not an allocation. It must also cover stored hashes made at a higher cost than today's,
+        # or those users could not log in to be re-hashed.
+        return getattr(settings, "LBE_SCRYPT_MAXMEM", 256 * 1024 * 1024)
@@ -0,0 +1,185 @@
+"""Column-oriented, read-only snapshot of the loan book for reporting.
+
+A `Loan` instance costs a couple of kilobytes: `_state`, a dict of attributes,
+Decimal and datetime objects. `LoanBook` keeps one packed NumPy record per loan
+(63 bytes), so a report can hold the entire book in one process and filter or
+aggregate it with vectorized operations instead of querysets.
+
+Money columns hold int64 paisa, `interest_rate` holds basis points and `status`
+holds an index into `STATUSES`. Results are converted back to Decimals and
+status names at the edges. A snapshot can be saved to a `.npy` file and
+memory-mapped by later runs or other processes.
+"""
+import datetime
+
+import numpy as np
+
+from . import amortization
+from .models import Loan
+from .portfolio import TENURE_BUCKETS
+
+STATUSES = ("ACTIVE", "CLOSED")
+FIELDS = ("id", "user_id", "amount", "interest_rate", "tenure", "monthly_installment", "amount_paid",
+          "status", "created_at", "next_due_date")
+MONEY_COLUMNS = ("amount", "monthly_installment", "amount_paid", "outstanding")
+
+DTYPE = np.dtype([
+    ("id", np.int64),
+    ("user_id", np.int64),
+    ("amount", np.int64),
+    ("interest_rate", np.int32),
+    ("tenure", np.int16),
+    ("monthly_installment", np.int64),
+    ("amount_paid", np.int64),
+    ("status", np.uint8),
+    ("created_at", "datetime64[s]"),  # UTC
+    ("next_due_date", "datetime64[D]"),
+])
+
+LOOKUPS = {
+    "exact": np.equal,
+    "lt": np.less,
+    "lte": np.less_equal,
+    "gt": np.greater,
+    "gte": np.greater_equal,
+    "in": np.isin,
+}
+
+
+def _paisa(values):
+    """Decimals with at most 2 dp to int64 paisa (exact through float for any `max_digits=10` value)."""
+    return np.rint(np.array([value or 0 for value in values], dtype=np.float64) * 100).astype(np.int64)
+
+
+def _utc(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _coerce(column, value):
+    """A filter value in the column's storage units."""
+    if column == "status":
+        return STATUSES.index(value)
+    if column in MONEY_COLUMNS:
+        return amortization.to_paisa(value)
+    if column == "interest_rate":
+        return amortization.to_basis_points(value)
+    if column == "created_at":
+        return np.datetime64(_utc(value), "s")
+    if column in ("next_due_date", "maturity_month"):
+        return np.datetime64(value, "D" if column == "next_due_date" else "M")
+    return value
+
+
+class LoanBook:
+    """Immutable loan snapshot; `filter()` returns a new book, aggregations return plain dicts."""
+
+    def __init__(self, records):
+        self.records = records
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from `values_list(*FIELDS)` rows."""
+        rows = list(rows)
+        records = np.empty(len(rows), dtype=DTYPE)
+        if not rows:
+            return cls(records)
+
+        ids, user_ids, amounts, rates, tenures, emis, paid, statuses, created, due = zip(*rows)
+        codes = {status: code for code, status in enumerate(STATUSES)}
+        records["id"] = ids
+        records["user_id"] = user_ids
+        records["amount"] = _paisa(amounts)
+        records["interest_rate"] = _paisa(rates)
+        records["tenure"] = tenures
+        records["monthly_installment"] = _paisa(emis)
+        records["amount_paid"] = _paisa(paid)
+        records["status"] = [codes[status] for status in statuses]
+        records["created_at"] = np.array([_utc(value) for value in created], dtype="datetime64[s]")
+        records["next_due_date"] = np.array(due, dtype="datetime64[D]")  # None becomes NaT
+        return cls(records)
+
+    @classmethod
+    def from_queryset(cls, queryset=None, chunk_size=20000):
+        """Stream `queryset` (default: every loan) in chunks; only one chunk of row tuples is alive at a time."""
+        queryset = Loan.objects.all() if queryset is None else queryset
+        rows = queryset.order_by("id").values_list(*FIELDS).iterator(chunk_size=chunk_size)
+        chunks = []
+        while True:
+            chunk = [row for _, row in zip(range(chunk_size), rows)]
+            if not chunk:
+                break
+            chunks.append(cls.from_rows(chunk).records)
+        return cls(np.concatenate(chunks) if chunks else np.empty(0, dtype=DTYPE))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a snapshot written by `save()`; memory-mapped (read-only, shared page cache) by default."""
+        return cls(np.load(path, mmap_mode="r" if mmap else None))
+
+    def save(self, path):
+        np.save(path, self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
+
+    def __getitem__(self, column):
+        """A column as an array; also the derived `outstanding`, `tenure_bucket` and `maturity_month`."""
+        records = self.records
+        if column == "outstanding":
+            owed = records["tenure"].astype(np.int64) * records["monthly_installment"] - records["amount_paid"]
+            return np.maximum(owed, 0)
+        if column == "tenure_bucket":
+            upper = [bound for _, bound in TENURE_BUCKETS if bound is not None]
+            labels = np.array([label for label, _ in TENURE_BUCKETS])
+            return labels[np.searchsorted(upper, records["tenure"], side="left")]
+        if column == "maturity_month":
+            return records["created_at"].astype("datetime64[M]") + records["tenure"].astype("timedelta64[M]")
+        return records[column]
+
+    def filter(self, mask=None, **conditions):
+        """A new book with the matching loans, e.g. `filter(status="ACTIVE", tenure__gte=12)`."""
+        keep = np.ones(len(self), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        for lookup, value in conditions.items():
+            column, _, operator = lookup.partition("__")
+            value = [_coerce(column, item) for item in value] if operator == "in" else _coerce(column, value)
+            keep &= LOOKUPS[operator or "exact"](self[column], value)
+        return LoanBook(self.records[keep])
+
+    def total(self, column):
+        """Sum of a column; money as a Decimal."""
+        value = int(self[column].sum(dtype=np.int64))
+        return amortization.from_paisa(value) if column in MONEY_COLUMNS else value
+
+    def group_by(self, column, measures=("amount", "amount_paid", "outstanding")):
+        """`{key: {"loan_count": n, measure: total, ...}}` grouped on a column, keys in sorted order."""
+        if not len(self):
+            return {}
+        keys, groups = np.unique(self[column], return_inverse=True)
+        order = np.argsort(groups, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(groups[order]) != 0])
+        counts = np.diff(np.r_[starts, len(order)])
+        # reduceat over int64 keeps paisa totals exact (float bincount weights would not past 2**53)
+        sums = {measure: np.add.reduceat(self[measure].astype(np.int64)[order], starts) for measure in measures}
+
+        result = {}
+        for i, key in enumerate(keys):
+            row = {"loan_count": int(counts[i])}
+            for measure in measures:
+                value = int(sums[measure][i])
+                row[measure] = amortization.from_paisa(value) if measure in MONEY_COLUMNS else value
+            result[self._label(column, key)] = row
+        return result
+
+    @staticmethod
+    def _label(column, key):
+        if column == "status":
+            return STATUSES[key]
+        if column == "maturity_month":
+            return str(key)
+        return key.item() if hasattr(key, "item") else key
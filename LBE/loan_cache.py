@@ -0,0 +1,69 @@
+"""Conditional GET and a server-side cache for loan detail/schedule payloads.
+
+Every mutation of a loan bumps `Loan.version`. ETags are derived from it, and
+cached payloads are stored with the version they were rendered at. A poll then
+costs one primary-key lookup of `(user_id, version)` and is answered with either
+`304 Not Modified` or the cached payload. Only the first request after a
+change runs the serializer.
+
+Mutations also `invalidate()` the cached payloads explicitly. The version check
+stays as a backstop, so a payload rendered concurrently with a change can never
+be served for the newer version.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+
+KINDS = ("detail", "schedule")
+PAYLOAD_FORMAT = 1  # Bump when the detail/schedule representation changes
+
+
+def payload_cache():
+    return caches[getattr(settings, "LBE_RESPONSE_CACHE", "default")]
+
+
+def ttl():
+    return getattr(settings, "LBE_RESPONSE_CACHE_TTL", 300)
+
+
+def payload_key(kind, loan_id):
+    return f"lbe:loan-payload:{kind}:{loan_id}"
+
+
+def etag(kind, loan_id, version):
+    return f'"loan-{loan_id}-{kind}-v{version}-f{PAYLOAD_FORMAT}"'
+
+
+def not_modified(request, tag):
+    """True if the request's If-None-Match already names `tag`."""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return "*" in tags or tag in tags or f"W/{tag}" in tags
+
+
+def get_payload(kind, loan_id, version):
+    return _fresh(payload_cache().get(payload_key(kind, loan_id)), version)
+
+
+async def aget_payload(kind, loan_id, version):
+    return _fresh(await payload_cache().aget(payload_key(kind, loan_id)), version)
+
+
+def _fresh(cached, version):
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    return None
+
+
+def set_payload(kind, loan_id, version, data):
+    payload_cache().set(payload_key(kind, loan_id), (version, data), ttl())
+
+
+async def aset_payload(kind, loan_id, version, data):
+    await payload_cache().aset(payload_key(kind, loan_id), (version, data), ttl())
+
+
+def invalidate(*loan_ids):
+    payload_cache().delete_many([payload_key(kind, loan_id) for loan_id in loan_ids for kind in KINDS])
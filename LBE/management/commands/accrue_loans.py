@@ -0,0 +1,107 @@
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from LBE.accrual import chunk_bounds, process_chunk
+from LBE.models import BatchCheckpoint
+
+JOB = "accrue_loans"
+
+
+def _init_worker():
+    if not apps.ready:  # "spawn" start method: the child starts from a blank interpreter
+        django.setup()
+    connections.close_all()  # Never share the parent's database sockets
+
+
+class Command(BaseCommand):
+    help = (
+        "Nightly accrual: roll due dates forward, flag overdue loans and accrue late-payment penalties, "
+        "in keyset chunks across a process pool. Resumes from the last checkpoint for the same date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--as-of", help="Business date (YYYY-MM-DD); defaults to today.")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                            help="Worker processes; 1 runs every chunk in this process.")
+        parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start from the first loan.")
+
+    def handle(self, *args, **options):
+        as_of = parse_date(options["as_of"]) if options["as_of"] else datetime.date.today()
+        if as_of is None:
+            raise CommandError("--as-of must be a date in YYYY-MM-DD format.")
+
+        checkpoint, created = BatchCheckpoint.objects.get_or_create(job=JOB, as_of=as_of)
+        if options["restart"] and not created:
+            checkpoint.last_id = checkpoint.loans_processed = 0
+            checkpoint.finished_at = None
+            checkpoint.save()
+        elif checkpoint.finished_at:
+            self.stdout.write(f"Accrual for {as_of} already finished at {checkpoint.finished_at:%Y-%m-%d %H:%M}; "
+                              "use --restart to run it again.")
+            return
+        elif checkpoint.last_id:
+            self.stdout.write(f"Resuming accrual for {as_of} after loan {checkpoint.last_id}.")
+
+        workers = options["workers"]
+        if workers > 1 and connection.vendor == "sqlite":
+            self.stdout.write("SQLite allows a single writer; running chunks in this process.")
+            workers = 1
+
+        bounds = list(chunk_bounds(checkpoint.last_id, options["chunk_size"]))
+        self.stdout.write(f"Accruing {len(bounds)} chunks with {workers} worker(s).")
+        started = time.perf_counter()
+        totals = {"loans": 0, "overdue": 0, "installments_marked": 0, "penalty": 0}
+        finished, next_index = {}, 0  # Chunks done out of order wait here until the ones before them finish
+
+        for index, stats in self.run_chunks(bounds, as_of, workers):
+            first_id, last_id = bounds[index]
+            for key in totals:
+                totals[key] += stats[key]
+            self.stdout.write(
+                f"Chunk {index + 1}/{len(bounds)} (loans {first_id}-{last_id}): {stats['loans']} loans, "
+                f"{stats['updated']} updated, {stats['overdue']} overdue, {stats['installments_marked']} installments "
+                f"marked, penalty {stats['penalty']} in {stats['seconds']:.2f}s "
+                f"({stats['loans'] / max(stats['seconds'], 1e-9):.0f} loans/s)"
+            )
+
+            finished[index] = stats["loans"]
+            while next_index in finished:
+                checkpoint.last_id = bounds[next_index][1]
+                checkpoint.loans_processed += finished.pop(next_index)
+                next_index += 1
+            checkpoint.save(update_fields=["last_id", "loans_processed", "updated_at"])
+
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=["finished_at", "updated_at"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Accrued {totals['loans']} loans in {elapsed:.2f}s ({totals['loans'] / max(elapsed, 1e-9):.0f} loans/s): "
+            f"{totals['overdue']} overdue, {totals['installments_marked']} installments marked, "
+            f"penalty {totals['penalty']}."
+        )
+
+    def run_chunks(self, bounds, as_of, workers):
+        """Yield `(chunk index, stats)` as chunks finish (out of order with several workers)."""
+        if workers <= 1:
+            for index, (first_id, last_id) in enumerate(bounds):
+                yield index, process_chunk(first_id, last_id, as_of)
+            return
+
+        connections.close_all()  # Forked children must not inherit open connections
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(process_chunk, first_id, last_id, as_of): index
+                for index, (first_id, last_id) in enumerate(bounds)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
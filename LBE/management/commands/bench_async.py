@@ -0,0 +1,140 @@
+import http.client
+import json
+import threading
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LBE.benchmarking import create_user, latency_stats, run_metadata
+from LBE.models import CustomUser, Loan
+
+# (name, sync path, async path); "{id}" is replaced by one of the user's loans
+ENDPOINTS = [
+    ("list", "/api/loans/", "/api/async/loans/"),
+    ("detail", "/api/loans/{id}/", "/api/async/loans/{id}/"),
+    ("schedule", None, "/api/async/loans/{id}/schedule/"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the loan read paths on running servers: the sync DRF views behind a WSGI server (--wsgi) "
+        "against the async views behind an ASGI server (--asgi), at increasing concurrency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi", metavar="URL", help="Base URL of the WSGI deployment, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--asgi", metavar="URL", help="Base URL of the ASGI deployment, e.g. http://127.0.0.1:8001")
+        parser.add_argument("--concurrency", nargs="+", type=int, default=[10, 50, 200])
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint and concurrency level.")
+        parser.add_argument("--username", default="bench-async")
+        parser.add_argument("--password", default="bench-pass-123")
+        parser.add_argument("--seed-loans", type=int, default=0,
+                            help="First create the user with this many loans in the CONFIGURED database "
+                                 "(point LBE_SQLITE_PATH at a scratch file).")
+        parser.add_argument("--output", help="Write the results JSON to this file.")
+
+    def handle(self, *args, **options):
+        if options["seed_loans"]:
+            self.seed(options)
+        targets = [(mode, options[mode].rstrip("/")) for mode in ("wsgi", "asgi") if options[mode]]
+        if not targets:
+            raise CommandError("Pass --wsgi and/or --asgi with the base URL of a running server.")
+
+        token = self.login(targets[0][1], options["username"], options["password"])
+        headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+        loan_id = Loan.objects.filter(user__username=options["username"]).values_list("id", flat=True).first()
+        if loan_id is None:
+            raise CommandError(f"{options['username']} has no loans; run once with --seed-loans.")
+
+        results = {}
+        self.stdout.write(f"{'target':<6} {'endpoint':<10} {'conc':>5} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+        for concurrency in options["concurrency"]:
+            for name, sync_path, async_path in ENDPOINTS:
+                for mode, base_url in targets:
+                    path = sync_path if mode == "wsgi" else async_path
+                    if path is None:
+                        continue
+                    samples, errors, elapsed = self.load(base_url, path.format(id=loan_id), headers,
+                                                         options["requests"], concurrency)
+                    stats = latency_stats(samples) if samples else {"count": 0}
+                    stats.update(errors=errors, throughput=round(len(samples) / elapsed, 1))
+                    results[f"{mode}.{name}.c{concurrency}"] = stats
+                    self.stdout.write(
+                        f"{mode:<6} {name:<10} {concurrency:>5} {stats['throughput']:>9.1f} "
+                        f"{stats.get('p50_ms', 0):>7.1f}ms {stats.get('p95_ms', 0):>7.1f}ms "
+                        f"{stats.get('p99_ms', 0):>7.1f}ms {errors:>7}"
+                    )
+
+        if options["output"]:
+            report = {"meta": run_metadata(concurrency=options["concurrency"], requests=options["requests"]),
+                      "results": results}
+            with open(options["output"], "w") as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+    def seed(self, options):
+        user = CustomUser.objects.filter(username=options["username"]).first()
+        if user is None:
+            user = create_user(options["username"], password=options["password"])
+        Loan.originate_batch(user, [
+            {"amount": Decimal("25000.00"), "tenure": 12, "interest_rate": Decimal("11.50")}
+            for _ in range(options["seed_loans"])
+        ])
+        self.stdout.write(f"Seeded {options['seed_loans']} loans for {user.username}.")
+
+    def login(self, base_url, username, password):
+        try:
+            status, body = self.request(self.connect(base_url), "POST", "/api/login/", {
+                "Content-Type": "application/json",
+            }, json.dumps({"username": username, "password": password}))
+        except OSError as exc:
+            raise CommandError(f"Cannot reach {base_url}: {exc}")
+        if status != 200:
+            raise CommandError(f"Login on {base_url} failed ({status}): {body[:200]!r}")
+        return json.loads(body)["access"]
+
+    def load(self, base_url, path, headers, total, concurrency):
+        """Issue `total` GETs from `concurrency` threads, each on its own keep-alive connection."""
+        samples, errors, lock = [], [0], threading.Lock()
+        per_thread = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+
+        def worker(count):
+            connection, timings, failed = self.connect(base_url), [], 0
+            for _ in range(count):
+                started = time.perf_counter()
+                try:
+                    status, _ = self.request(connection, "GET", path, headers)
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection, status = self.connect(base_url), None
+                if status == 200:
+                    timings.append(time.perf_counter() - started)
+                else:
+                    failed += 1
+            connection.close()
+            with lock:
+                samples.extend(timings)
+                errors[0] += failed
+
+        threads = [threading.Thread(target=worker, args=(count,)) for count in per_thread if count]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, errors[0], time.perf_counter() - started
+
+    @staticmethod
+    def connect(base_url):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        return connection_class(parts.hostname, parts.port, timeout=30)
+
+    @staticmethod
+    def request(connection, method, path, headers, body=None):
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read()
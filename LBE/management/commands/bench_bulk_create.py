@@ -0,0 +1,50 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from LBE.benchmarking import SEED_TERMS, create_user, isolated_database
+from LBE.models import Loan
+
+
+class Command(BaseCommand):
+    help = "Compare loans/sec for one-at-a-time creation against the bulk origination endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loans", type=int, default=2000, help="Loans created per scenario.")
+
+    def handle(self, *args, **options):
+        count = options["loans"]
+        rows = [
+            {"amount": str(amount), "tenure": tenure, "interest_rate": str(rate)}
+            for amount, tenure, rate in (SEED_TERMS[i % len(SEED_TERMS)] for i in range(count))
+        ]
+
+        with isolated_database():
+            client = APIClient()
+            client.force_authenticate(create_user())
+
+            def single():
+                for row in rows:
+                    response = client.post(reverse("add-loan"), row, format="json")
+                    assert response.status_code == 201, response.data
+
+            def bulk_json():
+                response = client.post(reverse("bulk-add-loans"), rows, format="json")
+                assert response.status_code == 201, response.data
+
+            def bulk_ndjson():
+                body = "\n".join(json.dumps(row) for row in rows)
+                response = client.post(reverse("bulk-add-loans"), body, content_type="application/x-ndjson")
+                assert response.status_code == 201, response.data
+
+            self.stdout.write(f"{'scenario':<24} {'loans':>8} {'seconds':>10} {'loans/sec':>12}")
+            for label, func in [("single /loans/add/", single), ("bulk JSON", bulk_json), ("bulk NDJSON", bulk_ndjson)]:
+                before = Loan.objects.count()
+                started = time.perf_counter()
+                func()
+                elapsed = time.perf_counter() - started
+                created = Loan.objects.count() - before
+                self.stdout.write(f"{label:<24} {created:>8} {elapsed:>10.2f} {created / elapsed:>12.0f}")
@@ -0,0 +1,99 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+from django.core.management.base import BaseCommand, CommandError
+
+PASSWORD = "bench-pass-123"
+SALT = "benchsaltbenchsalt12"
+OWASP_PBKDF2_SHA256 = 600000  # OWASP Password Storage Cheat Sheet minimum
+
+
+def pbkdf2(iterations):
+    PBKDF2PasswordHasher().encode(PASSWORD, SALT, iterations=iterations)
+
+
+def scrypt(work_factor, block_size, parallelism):
+    ScryptPasswordHasher().encode(PASSWORD, SALT, n=work_factor, r=block_size, p=parallelism)
+
+
+def best_of(func, *args, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def hash_many(count, func, *args):
+    for _ in range(count):
+        func(*args)
+    return count
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure password hashing cost on this machine and recommend LBE_PBKDF2_ITERATIONS / "
+        "LBE_SCRYPT_WORK_FACTOR for a per-login latency budget, with the resulting logins/s per core."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--budget-ms", type=float, default=250.0, help="Target hashing time per login.")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed hashes per setting (best is used).")
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                            help="Processes for the all-core throughput run (0 skips it).")
+
+    def handle(self, *args, **options):
+        budget = options["budget_ms"] / 1000
+        if budget <= 0:
+            raise CommandError("--budget-ms must be positive.")
+        repeat = options["repeat"]
+
+        configured = getattr(settings, "LBE_PBKDF2_ITERATIONS", PBKDF2PasswordHasher.iterations)
+        current = best_of(pbkdf2, configured, repeat=repeat)
+        self.stdout.write(f"PBKDF2-SHA256 at the configured {configured:,} iterations: "
+                          f"{current * 1000:.1f}ms per hash, {1 / current:.1f} logins/s per core")
+
+        # Cost is linear in the iteration count: calibrate once, then confirm the pick
+        calibration = 100000
+        per_iteration = best_of(pbkdf2, calibration, repeat=repeat) / calibration
+        iterations = max(10000, int(budget / per_iteration) // 10000 * 10000)
+        measured = best_of(pbkdf2, iterations, repeat=repeat)
+        self.stdout.write(f"Recommended LBE_PBKDF2_ITERATIONS = {iterations:,} "
+                          f"({measured * 1000:.1f}ms per hash, {1 / measured:.1f} logins/s per core)")
+        if iterations < OWASP_PBKDF2_SHA256:
+            self.stdout.write(self.style.WARNING(
+                f"  Below OWASP's {OWASP_PBKDF2_SHA256:,}-iteration minimum for PBKDF2-SHA256; "
+                "prefer a larger budget or scrypt if that matters more than latency."))
+
+        block_size = getattr(settings, "LBE_SCRYPT_BLOCK_SIZE", ScryptPasswordHasher.block_size)
+        parallelism = getattr(settings, "LBE_SCRYPT_PARALLELISM", ScryptPasswordHasher.parallelism)
+        chosen = None
+        self.stdout.write(f"scrypt (r={block_size}, p={parallelism}):")
+        for exponent in range(12, 19):
+            elapsed = best_of(scrypt, 2 ** exponent, block_size, parallelism, repeat=repeat)
+            memory = 128 * 2 ** exponent * block_size / (1024 * 1024)
+            self.stdout.write(f"  N=2**{exponent:<3} {elapsed * 1000:>8.1f}ms per hash  {memory:>6.0f} MiB")
+            if elapsed > budget:
+                break
+            chosen = (exponent, elapsed)
+        if chosen:
+            exponent, elapsed = chosen
+            self.stdout.write(f"Recommended LBE_SCRYPT_WORK_FACTOR = 2 ** {exponent} "
+                              f"({elapsed * 1000:.1f}ms per hash, {1 / elapsed:.1f} logins/s per core)")
+        else:
+            self.stdout.write("No scrypt work factor fits the budget at these block size/parallelism settings.")
+
+        processes = options["processes"]
+        if processes:
+            count = max(1, math.ceil(2 / measured))  # About two seconds of work per process
+            started = time.perf_counter()
+            with ProcessPoolExecutor(processes) as pool:
+                hashed = sum(pool.map(hash_many, [count] * processes, [pbkdf2] * processes, [iterations] * processes))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"All {processes} process(es) at {iterations:,} iterations: {hashed / elapsed:.1f} logins/s "
+                              f"({hashed / elapsed / processes:.1f} per process)")
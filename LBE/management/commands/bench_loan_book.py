@@ -0,0 +1,54 @@
+import gc
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from LBE.benchmarking import format_bytes, isolated_database, seed_book
+from LBE.loan_book import LoanBook
+from LBE.models import Loan
+
+
+def retained(build):
+    """(result, bytes still allocated once `build()` returns, seconds) for one call."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        result = build()
+        elapsed = time.perf_counter() - started
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, elapsed
+
+
+class Command(BaseCommand):
+    help = "Compare memory and report time of model instances against the columnar LoanBook snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loans", type=int, default=100000)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            seed_book(options["loans"])
+
+            loans, model_bytes, model_load = retained(lambda: list(Loan.objects.all()))
+            started = time.perf_counter()
+            by_status = {}
+            for loan in loans:
+                row = by_status.setdefault(loan.status, [0, 0])
+                row[0] += 1
+                row[1] += max(loan.tenure * (loan.monthly_installment or 0) - loan.amount_paid, 0)
+            model_report = time.perf_counter() - started
+            del loans
+
+            book, book_bytes, book_load = retained(LoanBook.from_queryset)
+            started = time.perf_counter()
+            book.group_by("status", measures=("outstanding",))
+            book_report = time.perf_counter() - started
+
+            self.stdout.write(f"{'':<14} {'retained':>12} {'load':>10} {'report':>10}")
+            self.stdout.write(f"{'Loan models':<14} {format_bytes(model_bytes):>12} {model_load:>9.2f}s {model_report * 1000:>8.1f}ms")
+            self.stdout.write(f"{'LoanBook':<14} {format_bytes(book_bytes):>12} {book_load:>9.2f}s {book_report * 1000:>8.1f}ms")
+            self.stdout.write(f"{len(book)} loans; LoanBook uses {model_bytes / max(book_bytes, 1):.0f}x less memory.")
@@ -0,0 +1,73 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from LBE.benchmarking import isolated_database, seed_book
+from LBE.models import Loan
+
+
+def hot_queries():
+    """The loan access paths the indexes are meant to serve."""
+    today = datetime.date.today()
+    user_id = Loan.objects.order_by("id").values_list("user_id", flat=True).first()
+    month_ago = timezone.now() - datetime.timedelta(days=30)
+    return [
+        ("foreclosure lookup (user, status)",
+         Loan.objects.filter(user_id=user_id, status="ACTIVE")),
+        ("admin filter (status, created_at)",
+         Loan.objects.filter(status="CLOSED", created_at__gte=month_ago).order_by("-created_at")[:50]),
+        ("collections (ACTIVE due within 7 days)",
+         Loan.objects.filter(status="ACTIVE", next_due_date__range=(today, today + datetime.timedelta(days=7)))
+         .values_list("id", flat=True)),
+        ("overdue ACTIVE loans",
+         Loan.objects.filter(status="ACTIVE", next_due_date__lt=today).order_by("next_due_date")[:500]),
+        ("export range (created_at)",
+         Loan.objects.filter(created_at__gte=month_ago).values_list("id", "amount")),
+    ]
+
+
+class Command(BaseCommand):
+    help = ("Seed a large loan book into a throwaway database and compare query plans and timings "
+            "without and with the Loan indexes. Run with LBE_DB_ENGINE=sqlite for SQLite.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loans", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=20_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            started = time.perf_counter()
+            seed_book(options["loans"], users=options["users"])
+            self.stdout.write(f"Seeded {options['loans']} loans in {time.perf_counter() - started:.1f}s "
+                              f"on {connection.vendor}.")
+
+            indexes = Loan._meta.indexes
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.remove_index(Loan, index)
+            self.report("WITHOUT indexes", options["repeat"])
+
+            started = time.perf_counter()
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.add_index(Loan, index)
+            self.stdout.write(f"\nBuilt {len(indexes)} indexes in {time.perf_counter() - started:.1f}s.")
+            self.report("WITH indexes", options["repeat"])
+
+    def report(self, title, repeat):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")  # Refresh planner statistics on both SQLite and PostgreSQL
+        self.stdout.write(f"\n=== {title} ===")
+        for label, queryset in hot_queries():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(f"\n{label}: best {min(timings) * 1000:.2f}ms")
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f"    {line}")
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from LBE.benchmarking import create_user, format_bytes, isolated_database, measure, seed_loans
+from LBE.models import Loan
+from LBE.serializers import LoanSerializer
+
+
+class Command(BaseCommand):
+    help = "Benchmark response time and peak memory of the loan list endpoints as the loan count grows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 50000],
+                            help="Loan counts to benchmark (cumulative).")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per scenario (best is reported).")
+        parser.add_argument("--skip-unpaginated", action="store_true",
+                            help="Skip the legacy full-book serialization baseline.")
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            admin = create_user("bench-admin", is_staff=True)
+            client = APIClient()
+            client.force_authenticate(admin)
+            url = reverse("admin-loan-list")
+
+            def get(query=""):
+                response = client.get(url + query)
+                assert response.status_code == 200, response.status_code
+                return len(response.content)
+
+            scenarios = [
+                ("page (compact)", lambda: get()),
+                ("page (?expand=schedule)", lambda: get("?expand=schedule")),
+            ]
+            if not options["skip_unpaginated"]:
+                scenarios.append(("full book + schedules (legacy)",
+                                  lambda: len(LoanSerializer(Loan.objects.all(), many=True).data)))
+
+            self.stdout.write(f"{'loans':>10}  {'scenario':<32} {'best time':>12} {'peak memory':>14}")
+            seeded = 0
+            for size in sorted(options["sizes"]):
+                seeded += seed_loans(admin, size - seeded)
+                for label, func in scenarios:
+                    elapsed, peak, _ = measure(func, repeat=options["repeat"])
+                    self.stdout.write(f"{size:>10}  {label:<32} {elapsed * 1000:>10.1f}ms {format_bytes(peak):>14}")
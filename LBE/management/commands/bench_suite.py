@@ -0,0 +1,206 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.test import RequestFactory, override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from LBE.benchmarking import (
+    SEED_TERMS, compare_results, create_user, isolated_database, latency_stats, run_metadata, seed_book,
+)
+from LBE import amortization
+from LBE.models import Loan
+from LBE.schedule_cache import schedule_cache
+from LBE.serializers import LoanSerializer
+from LBE.views import CustomLoginView
+
+PASSWORD = "bench-pass-123"
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the micro and end-to-end benchmark suite against a seeded throwaway database, "
+        "write the results as JSON and optionally compare them with a baseline run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000, help="Borrowers in the seeded background book.")
+        parser.add_argument("--loans", type=int, default=20000, help="Loans in the seeded background book.")
+        parser.add_argument("--iterations", type=int, default=200, help="Timed calls per micro-benchmark.")
+        parser.add_argument("--requests", type=int, default=200, help="Timed requests per read/write endpoint.")
+        parser.add_argument("--auth-requests", type=int, default=10,
+                            help="Timed requests for register and login (dominated by password hashing).")
+        parser.add_argument("--warmup", type=int, default=5, help="Untimed calls before each read benchmark.")
+        parser.add_argument("--only", nargs="+", metavar="PREFIX", help="Run benchmarks whose name starts with a prefix.")
+        parser.add_argument("--output", help="Write the results JSON to this file.")
+        parser.add_argument("--compare", metavar="BASELINE", help="Results JSON from an earlier run to compare against.")
+        parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Relative p50 slowdown that counts as a regression (default 0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as handle:
+                baseline = json.load(handle)["results"]
+
+        with isolated_database():
+            started = time.perf_counter()
+            seed_book(options["loans"], options["users"])
+            self.user = create_user("bench-user", password=PASSWORD)
+            self.client = APIClient()
+            self.client.force_authenticate(self.user)
+            self.stdout.write(f"Seeded {options['loans']} loans for {options['users']} users "
+                              f"in {time.perf_counter() - started:.1f}s.")
+
+            results = {}
+            for name, benchmark in self.benchmarks(options):
+                if options["only"] and not name.startswith(tuple(options["only"])):
+                    continue
+                with override_settings(LBE_THROTTLE_RATES={}):  # Repeated logins must reach the hasher
+                    results[name] = latency_stats(benchmark())
+                stats = results[name]
+                self.stdout.write(f"{name:<40} {stats['ops_per_sec'] or 0:>10.1f} ops/s  p50 {stats['p50_ms']:>9.3f}ms  "
+                                  f"p95 {stats['p95_ms']:>9.3f}ms  p99 {stats['p99_ms']:>9.3f}ms")
+            metadata = run_metadata(users=options["users"], loans=options["loans"])
+
+        report = {"meta": metadata, "results": results}
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+        if baseline is not None:
+            self.report_comparison(baseline, results, options["threshold"])
+
+    def benchmarks(self, options):
+        iterations, requests = options["iterations"], options["requests"]
+        auth_requests, warmup = options["auth_requests"], options["warmup"]
+        return [
+            ("micro.price_loan", lambda: self.timed(self.price_loan, iterations, warmup)),
+            ("micro.calculate_loan", lambda: self.timed(self.calculate_loan, iterations)),
+            ("micro.generate_payment_schedule.cold", lambda: self.timed(self.schedule(clear=True), iterations)),
+            ("micro.generate_payment_schedule.warm", lambda: self.timed(self.schedule(clear=False), iterations, warmup)),
+            ("micro.foreclose_loan", lambda: self.timed(self.foreclose, iterations, setup=self.fresh_loans)),
+            ("micro.loan_serializer.page", lambda: self.timed(self.serialize_page, iterations, warmup)),
+            ("micro.throttle.allow", lambda: self.timed(self.throttle_check(), iterations, warmup)),
+            ("http.login.throttled", lambda: self.throttled_logins(requests, warmup)),
+            ("http.register", lambda: self.timed(self.register, auth_requests)),
+            ("http.login", lambda: self.timed(self.login, auth_requests)),
+            ("http.list", lambda: self.timed(self.get(reverse("list-loans")), requests, warmup)),
+            ("http.quote", lambda: self.timed(self.quote, requests, warmup)),
+            ("http.detail", lambda: self.timed(self.detail, requests, warmup, setup=self.fresh_loans)),
+            ("http.foreclose", lambda: self.timed(self.http_foreclose, requests, setup=self.fresh_loans)),
+        ]
+
+    def timed(self, func, count, warmup=0, setup=None):
+        """Per-call wall times of `func(i)` for i in range(count); `setup(count)` runs untimed first."""
+        if setup:
+            setup(count + warmup)
+        for i in range(warmup):
+            func(i)
+        samples = []
+        for i in range(warmup, warmup + count):
+            started = time.perf_counter()
+            func(i)
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    def fresh_loans(self, count):
+        amount, tenure, rate = SEED_TERMS[0]
+        self.loans = Loan.originate_batch(
+            self.user, [{"amount": amount, "tenure": tenure, "interest_rate": rate} for _ in range(count)],
+        )
+        self.loans = list(Loan.objects.filter(id__in=[loan.id for loan in self.loans]).order_by("id"))
+
+    def price_loan(self, i):
+        amount, tenure, rate = SEED_TERMS[i % len(SEED_TERMS)]
+        amortization.price_loan(amount, rate, tenure)
+
+    def calculate_loan(self, i):
+        amount, tenure, rate = SEED_TERMS[i % len(SEED_TERMS)]
+        Loan(user=self.user, amount=amount, tenure=tenure, interest_rate=rate).calculate_loan()
+
+    def schedule(self, clear):
+        amount, tenure, rate = SEED_TERMS[2]
+        loan = Loan(amount=amount, tenure=tenure, interest_rate=rate,
+                    monthly_installment=amortization.price_loan(amount, rate, tenure).monthly_installment)
+
+        def run(i):
+            if clear:
+                schedule_cache.clear()
+            loan.generate_payment_schedule()
+        return run
+
+    def foreclose(self, i):
+        self.loans[i].foreclose_loan()
+
+    def serialize_page(self, i):
+        page = Loan.objects.order_by("-id").prefetch_related("installments")[:50]
+        LoanSerializer(page, many=True).data
+
+    def register(self, i):
+        self.expect_status(APIClient().post(reverse("register"), {
+            "username": f"bench-new-{i}", "email": f"bench-new-{i}@example.com", "password": PASSWORD,
+        }), 201)
+
+    def throttle_check(self):
+        request = Request(
+            RequestFactory().post(reverse("token_obtain_pair"), {"username": "bench-user"}, content_type="application/json"),
+            parsers=[JSONParser()],
+        )
+        throttles = [throttle() for throttle in CustomLoginView.throttle_classes]
+        for throttle in throttles:
+            throttle.get_rate = lambda: "1000000/min"  # Never rejects: times the allow path
+
+        def run(i):
+            for throttle in throttles:
+                throttle.allow_request(request, None)
+        return run
+
+    def throttled_logins(self, count, warmup):
+        with override_settings(LBE_THROTTLE_RATES={"login_username": "1/day"}):
+            return self.timed(self.throttled_login, count, warmup)
+
+    def throttled_login(self, i):
+        # Rejected in DRF's initial(), so this times the limiter plus the request stack, never the hasher
+        response = APIClient().post(reverse("token_obtain_pair"), {"username": "bench-throttled", "password": PASSWORD})
+        self.expect_status(response, 401 if i == 0 else 429)
+
+    def login(self, i):
+        self.expect_status(APIClient().post(reverse("token_obtain_pair"), {"username": "bench-user", "password": PASSWORD}), 200)
+
+    def get(self, url):
+        return lambda i: self.expect_status(self.client.get(url), 200)
+
+    def quote(self, i):
+        grid = {  # 10 x 22 x 10 = 2,200 quotes per request
+            "amounts": [str(1000 + 10000 * n) for n in range(10)],
+            "tenures": list(range(3, 25)),
+            "interest_rates": [str(8 + n) for n in range(10)],
+        }
+        self.expect_status(self.client.post(reverse("loan-quote"), grid, format="json"), 200)
+
+    def detail(self, i):
+        self.expect_status(self.client.get(reverse("loan-detail", args=[self.loans[i].id])), 200)
+
+    def http_foreclose(self, i):
+        self.expect_status(self.client.put(reverse("loan-foreclosure", args=[self.loans[i].id])), 200)
+
+    @staticmethod
+    def expect_status(response, expected):
+        if response.status_code != expected:
+            raise CommandError(f"{response.request['PATH_INFO']} returned {response.status_code}: {response.content[:200]!r}")
+
+    def report_comparison(self, baseline, results, threshold):
+        rows = compare_results(baseline, results, threshold)
+        self.stdout.write(f"\n{'benchmark':<40} {'baseline p50':>14} {'current p50':>14} {'change':>9}")
+        for name, before, after, change, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            self.stdout.write(f"{name:<40} {before:>12.3f}ms {after:>12.3f}ms {change:>+8.1%}{flag}")
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            raise CommandError(f"{len(regressions)} benchmark(s) regressed by more than {threshold:.0%}: "
+                               + ", ".join(regressions))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from LBE.outbox import MAX_ATTEMPTS, deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbound email in batches over a single mail connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting once the queue is empty.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep between polls in --loop mode.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = deliver_pending(options["batch_size"], options["max_attempts"])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"Delivered {sent}, failed {failed}.")
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(f"Outbox drained: {total_sent} sent, {total_failed} failed.")
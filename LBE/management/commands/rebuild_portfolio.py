@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LBE import portfolio
+
+
+class Command(BaseCommand):
+    help = "Rebuild the portfolio snapshot table from the loan book, or check it for drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Report drift without writing; exits non-zero if any.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["check"]:
+            mismatches = portfolio.drift()
+            for (status, bucket, month), measure, stored, expected in mismatches:
+                self.stdout.write(f"{status} {bucket} {month:%Y-%m} {measure}: stored {stored}, expected {expected}")
+            if mismatches:
+                raise CommandError(f"Portfolio snapshot drifted ({len(mismatches)} mismatches); run without --check to rebuild.")
+            self.stdout.write(f"Portfolio snapshot is consistent ({time.perf_counter() - started:.2f}s).")
+            return
+
+        buckets = portfolio.rebuild()
+        self.stdout.write(f"Rebuilt {buckets} portfolio buckets in {time.perf_counter() - started:.2f}s.")
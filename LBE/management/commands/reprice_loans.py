@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from LBE import amortization, loan_cache, portfolio
+from LBE.models import Installment, Loan
+
+PRICED_FIELDS = ["monthly_installment", "total_interest", "total_amount"]
+LEDGER_FIELDS = ["amount", "principal", "interest", "amount_paid", "status"]
+
+
+class Command(BaseCommand):
+    help = "Re-price every loan with the batch amortization engine and fix any stored figures that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument("--dry-run", action="store_true", help="Report mismatches without writing them.")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        started = time.perf_counter()
+        scanned = changed = 0
+        last_id = 0
+
+        while True:
+            rows = list(
+                Loan.objects.filter(id__gt=last_id).order_by("id")
+                .values_list("id", "amount", "interest_rate", "tenure", *PRICED_FIELDS)[:chunk_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            ids, amounts, rates, tenures, *stored = zip(*rows)
+            priced = amortization.price_batch(amounts, rates, tenures)
+
+            stale = []
+            for i, loan_id in enumerate(ids):
+                fresh = [amortization.from_paisa(priced[field][i]) for field in PRICED_FIELDS]
+                if fresh != [column[i] for column in stored]:
+                    stale.append(Loan(id=loan_id, **dict(zip(PRICED_FIELDS, fresh))))
+
+            if stale and not options["dry_run"]:
+                stale_ids = [loan.id for loan in stale]
+                with transaction.atomic():
+                    Loan.objects.bulk_update(stale, PRICED_FIELDS)
+                    Loan.objects.filter(id__in=stale_ids).update(version=F("version") + 1)  # New ETags
+                    self.reprice_ledgers(stale_ids)
+                loan_cache.invalidate(*stale_ids)
+            scanned += len(rows)
+            changed += len(stale)
+
+        if changed and not options["dry_run"]:
+            portfolio.rebuild()  # Outstanding splits depend on the EMI
+        elapsed = time.perf_counter() - started
+        verb = "would change" if options["dry_run"] else "updated"
+        self.stdout.write(f"Re-priced {scanned} loans in {elapsed:.2f}s; {verb} {changed}.")
+
+    @staticmethod
+    def reprice_ledgers(loan_ids):
+        """Rewrite the installment ledgers of re-priced loans (the UPDATE above holds their row locks)."""
+        ledgers = {}
+        for installment in Installment.objects.filter(loan_id__in=loan_ids).order_by("loan_id", "installment_no"):
+            ledgers.setdefault(installment.loan_id, []).append(installment)
+        rows = []
+        for loan in Loan.objects.filter(id__in=ledgers):
+            rows.extend(loan.reprice_installments(ledgers[loan.id]))
+        Installment.objects.bulk_update(rows, LEDGER_FIELDS, batch_size=5000)
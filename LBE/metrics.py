@@ -0,0 +1,200 @@
+"""In-process request metrics, exposed in the Prometheus text format.
+
+`RequestMetricsMiddleware` times every request routed to an `LBE` view, sync
+or async. It records latency, DB query count and time (through an
+`execute_wrapper` on each connection), time spent in serializer
+`to_representation` and response size, each as a histogram labelled by route
+pattern, method and status class. Routes are URL patterns (e.g.
+`api/loans/<int:id>/`), so label cardinality stays bounded.
+
+Each observation is a bisect plus a short locked update, which is cheap
+enough to leave on in production (`LBE_METRICS_ENABLED`). Every worker process
+keeps its own registry, so sum across workers when scraping behind gunicorn.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LABELS = ("route", "method", "status")
+
+_current = ContextVar("lbe_request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0]
+            series[index] += 1
+            series[-1] += value
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(snapshot.items()):
+            label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in zip(LABELS, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram("lbe_request_duration_seconds", "Wall time spent handling the request.", SECONDS_BUCKETS)
+DB_QUERIES = Histogram("lbe_request_db_queries", "Database queries executed per request.", QUERY_BUCKETS)
+DB_SECONDS = Histogram("lbe_request_db_duration_seconds", "Time spent in database queries per request.", SECONDS_BUCKETS)
+SERIALIZER_SECONDS = Histogram(
+    "lbe_request_serializer_duration_seconds", "Time spent in serializer to_representation per request.", SECONDS_BUCKETS,
+)
+RESPONSE_BYTES = Histogram("lbe_response_size_bytes", "Response body size (non-streaming responses).", BYTES_BUCKETS)
+REGISTRY = [REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, SERIALIZER_SECONDS, RESPONSE_BYTES]
+
+
+def render():
+    return "\n".join(histogram.render() for histogram in REGISTRY) + "\n"
+
+
+def reset():
+    for histogram in REGISTRY:
+        histogram.reset()
+
+
+class RequestStats:
+    """Per-request accumulators, reachable through a context variable while the request runs."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """`execute_wrapper` installed on every connection; a no-op outside an instrumented request.
+
+    Reading the stats from a context variable (rather than wrapping one connection
+    per request) also counts queries that async views run in `sync_to_async` threads.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def install_query_wrapper(connection, **kwargs):
+    """`connection_created` receiver (see LbeConfig.ready)."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedRepresentationMixin:
+    """Serializer mixin adding `to_representation` time to the current request's metrics."""
+
+    def to_representation(self, instance):
+        stats = _current.get()
+        if stats is None:
+            return super().to_representation(instance)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_seconds += time.perf_counter() - started
+
+
+def route_label(request):
+    """URL pattern of the LBE view that handled the request, or None for other views."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    view = getattr(match.func, "view_class", match.func)
+    if not view.__module__.startswith("LBE."):
+        return None
+    return match.route
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "LBE_METRICS_ENABLED", True)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):  # Opened before the signal was connected
+            install_query_wrapper(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        stats, started = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        stats, started = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def observe(request, response, stats, elapsed):
+        route = route_label(request)
+        if route is None:
+            return
+        labels = (route, request.method, f"{response.status_code // 100}xx")
+        REQUEST_SECONDS.observe(labels, elapsed)
+        DB_QUERIES.observe(labels, stats.queries)
+        DB_SECONDS.observe(labels, stats.db_seconds)
+        SERIALIZER_SECONDS.observe(labels, stats.serializer_seconds)
+        if not response.streaming:
+            RESPONSE_BYTES.observe(labels, len(response.content))
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LBE', '0006_loan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Installment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('installment_no', models.PositiveSmallIntegerField()),
+                ('due_date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('principal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('interest', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PAID', 'Paid'), ('OVERDUE', 'Overdue')], default='PENDING', max_length=10)),
+                ('loan', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='installments', to='LBE.loan')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['loan', 'due_date'], name='lbe_installment_loan_due'), models.Index(fields=['status', 'due_date'], name='lbe_installment_status_due')],
+                'constraints': [models.UniqueConstraint(fields=('loan', 'installment_no'), name='lbe_installment_loan_no_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:12
+
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import migrations
+
+# Frozen copy of LBE.amortization.schedule() as of this migration, so later changes to that module
+# cannot change (or break) what a fresh install backfills.
+RATE_DIVISOR = 100 * 100 * 12
+
+
+def to_paisa(value):
+    return int((Decimal(value) * 100).to_integral_value())
+
+
+def from_paisa(paisa):
+    return Decimal(int(paisa)).scaleb(-2)
+
+
+def round_half_even_div(numerator, denominator):
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    return quotient + ((twice > denominator) | ((twice == denominator) & (quotient % 2 == 1)))
+
+
+def schedule(amount, interest_rate, tenure, monthly_installment, start_date):
+    balance = to_paisa(amount)
+    rate_bp = to_paisa(interest_rate)  # Basis points
+    emi = to_paisa(monthly_installment)
+
+    rows = []
+    for i in range(tenure):
+        if i == tenure - 1:
+            interest = emi - balance
+        else:
+            interest = round_half_even_div(balance * rate_bp, RATE_DIVISOR)
+        principal = emi - interest
+        balance -= principal
+        rows.append({
+            'installment_no': i + 1,
+            'due_date': start_date + relativedelta(months=i),
+            'amount': from_paisa(emi),
+            'principal': from_paisa(principal),
+            'interest': from_paisa(interest),
+        })
+    return rows
+
+
+def backfill_installments(apps, schema_editor):
+    """Create ledger rows for loans priced before the Installment table existed."""
+    Loan = apps.get_model('LBE', 'Loan')
+    Installment = apps.get_model('LBE', 'Installment')
+
+    loans = Loan.objects.filter(monthly_installment__isnull=False, next_due_date__isnull=False, installments__isnull=True)
+    batch = []
+    for loan in loans.iterator(chunk_size=2000):
+        settled = loan.status == 'CLOSED'
+        for row in schedule(loan.amount, loan.interest_rate, loan.tenure, loan.monthly_installment, loan.next_due_date):
+            batch.append(Installment(
+                loan_id=loan.id,
+                installment_no=row['installment_no'],
+                due_date=row['due_date'],
+                amount=row['amount'],
+                principal=row['principal'],
+                interest=row['interest'],
+                amount_paid=row['amount'] if settled else 0,
+                status='PAID' if settled else 'PENDING',
+            ))
+        if len(batch) >= 5000:
+            Installment.objects.bulk_create(batch)
+            batch = []
+    Installment.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LBE', '0007_installment'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_installments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:18
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_email_collisions(apps, schema_editor):
+    """Refuse to add the constraint while emails differing only in case exist; say which ones to merge."""
+    CustomUser = apps.get_model('LBE', 'CustomUser')
+    collisions = list(
+        CustomUser.objects.using(schema_editor.connection.alias)
+        .exclude(email='')
+        .annotate(email_lower=Lower('email'))
+        .values('email_lower')
+        .annotate(accounts=Count('id'))
+        .filter(accounts__gt=1)
+        .order_by('email_lower')
+        .values_list('email_lower', flat=True)
+    )
+    if collisions:
+        raise RuntimeError(
+            f"{len(collisions)} email address(es) belong to several accounts when compared case-insensitively, "
+            f"e.g. {', '.join(collisions[:20])}. Merge or re-address those accounts, then run migrate again."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LBE', '0010_loan_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_email_collisions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='lbe_customuser_email_ci_uniq'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:26
+
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import migrations, models
+
+# Frozen copy of the LBE.portfolio / LBE.amortization logic as of this migration, so later changes to
+# those modules (new loan columns, new buckets) cannot break or alter the seed on fresh databases.
+RATE_DIVISOR = 100 * 100 * 12
+TENURE_BUCKETS = [('3-6', 6), ('7-12', 12), ('13-24', 24), ('25+', None)]
+MEASURES = ('loan_count', 'principal', 'outstanding_principal', 'interest_receivable', 'amount_paid')
+
+
+def to_paisa(value):
+    return int((Decimal(value) * 100).to_integral_value())
+
+
+def round_half_even_div(numerator, denominator):
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    return quotient + ((twice > denominator) | ((twice == denominator) & (quotient % 2 == 1)))
+
+
+def outstanding(amount, rate_bp, tenure, emi, paid):
+    """(outstanding principal, interest receivable) in paisa; payments settle installments in order."""
+    covered = min(paid // max(emi, 1), tenure)
+    balance, next_interest = amount, 0
+    for i in range(tenure):
+        interest = emi - balance if i == tenure - 1 else round_half_even_div(balance * rate_bp, RATE_DIVISOR)
+        if i == covered:
+            next_interest = interest
+            break
+        balance -= emi - interest
+    principal = max(balance - max(paid - covered * emi - next_interest, 0), 0)
+    return principal, max(tenure * emi - paid, 0) - principal
+
+
+def tenure_bucket(tenure):
+    for label, upper in TENURE_BUCKETS:
+        if upper is None or tenure <= upper:
+            return label
+
+
+def build_snapshot(apps, schema_editor):
+    """Seed the aggregates from the existing loan book."""
+    Loan = apps.get_model('LBE', 'Loan')
+    PortfolioSnapshot = apps.get_model('LBE', 'PortfolioSnapshot')
+    totals = {}
+    rows = Loan.objects.order_by('id').values_list(
+        'amount', 'interest_rate', 'tenure', 'monthly_installment', 'amount_paid', 'status', 'created_at',
+    )
+    for amount, rate, tenure, emi, paid, status, created_at in rows.iterator(chunk_size=10000):
+        amount, paid = to_paisa(amount), to_paisa(paid)
+        principal, interest = outstanding(amount, to_paisa(rate), tenure, to_paisa(emi or 0), paid)
+        key = (status, tenure_bucket(tenure), (created_at.date() + relativedelta(months=tenure)).replace(day=1))
+        bucket = totals.setdefault(key, dict.fromkeys(MEASURES, 0))
+        bucket['loan_count'] += 1
+        bucket['principal'] += amount
+        bucket['outstanding_principal'] += principal
+        bucket['interest_receivable'] += interest
+        bucket['amount_paid'] += paid
+
+    PortfolioSnapshot.objects.bulk_create([
+        PortfolioSnapshot(
+            status=status, tenure_bucket=bucket, maturity_month=month,
+            **{measure: value if measure == 'loan_count' else Decimal(value).scaleb(-2) for measure, value in measures.items()},
+        )
+        for (status, bucket, month), measures in sorted(totals.items())
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LBE', '0012_loan_version_payment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=10)),
+                ('tenure_bucket', models.CharField(max_length=10)),
+                ('maturity_month', models.DateField()),
+                ('loan_count', models.IntegerField(default=0)),
+                ('principal', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('outstanding_principal', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('interest_receivable', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('status', 'tenure_bucket', 'maturity_month'), name='lbe_portfolio_bucket_uniq')],
+            },
+        ),
+        migrations.RunPython(build_snapshot, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,14 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
 import datetime
 from datetime import timedelta
 from dateutil.relativedelta import relativedelta  # ✅ Fixes incorrect date handling
 from decimal import Decimal
+from django.utils import timezone
+from . import amortization, loan_cache, portfolio
+from .schedule_cache import schedule_cache
+from .authentication import forget_user
 
 class CustomUser(AbstractUser):
     is_verified = models.BooleanField(default=False)
@@ -13,6 +18,32 @@ class CustomUser(AbstractUser):
     USERNAME_FIELD = 'username'  # ✅ Use username for login
     REQUIRED_FIELDS = ['email']  # ✅ Email is required but not used for login
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # ✅ Case-insensitive unique email; also the index behind username-or-email lookups
+            models.UniqueConstraint(Lower('email'), condition=~models.Q(email=''), name='lbe_customuser_email_ci_uniq'),
+        ]
+
+    @staticmethod
+    def email_matches(email):
+        """Case-insensitive email filter (needs `email_lower=Lower('email')`).
+
+        Repeats the partial index's `email <> ''` predicate; without it the planner cannot use the index.
+        """
+        return models.Q(email_lower=email.lower()) & ~models.Q(email='')
+
+    @classmethod
+    def find_by_username_or_email(cls, value):
+        """Single indexed query for a user by exact username or case-insensitive email."""
+        matches = list(
+            cls.objects.annotate(email_lower=Lower('email'))
+            .filter(models.Q(username=value) | cls.email_matches(value))[:2]
+        )
+        for user in matches:
+            if user.username == value:  # A username match wins over another account's email
+                return user
+        return matches[0] if matches else None
+
     def is_otp_valid(self):
         """Check if OTP is valid (e.g., not older than 5 minutes)"""
         if self.otp_created_at:
@@ -20,6 +51,18 @@ class CustomUser(AbstractUser):
             return (now - self.otp_created_at).total_seconds() < 300  # 5 min expiry
         return False
 
+    def save(self, *args, **kwargs):
+        if getattr(self, "is_auth_snapshot", False):
+            raise RuntimeError("Cached auth users are partial; load the user from the database to modify it.")
+        super().save(*args, **kwargs)
+        forget_user(self.pk)  # ✅ Keep cached JWT auth snapshots in sync
+
+    def delete(self, *args, **kwargs):
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        forget_user(user_id)
+        return result
+
     def __str__(self):
         return self.username
 
@@ -37,21 +80,87 @@ class Loan(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     next_due_date = models.DateField(blank=True, null=True)
     status = models.CharField(max_length=10, choices=[('ACTIVE', 'Active'), ('CLOSED', 'Closed')], default='ACTIVE')
+    version = models.PositiveIntegerField(default=0)  # Bumped on every mutation (optimistic concurrency)
+    overdue_since = models.DateField(blank=True, null=True)  # Due date of the oldest unpaid installment in arrears
+    overdue_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # Unpaid EMI amount in arrears
+    penalty_accrued = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # Late-payment penalty to date
+    last_accrual_date = models.DateField(blank=True, null=True)  # Penalty accrued through this date (accrue_loans)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status'], name='lbe_loan_user_status'),  # Foreclosure / "my active loans"
+            models.Index(fields=['status', 'next_due_date'], name='lbe_loan_status_due'),  # Collections
+            models.Index(fields=['status', 'created_at'], name='lbe_loan_status_created'),  # Admin filters
+            models.Index(fields=['created_at'], name='lbe_loan_created'),  # Export / date-range filters
+            models.Index(
+                fields=['next_due_date'], name='lbe_loan_active_due', condition=models.Q(status='ACTIVE'),
+            ),  # Partial: only the (much smaller) ACTIVE slice of the book
+        ]
+
+    @classmethod
+    def originate_batch(cls, user, terms):
+        """Price and insert many loans, with their installment ledgers, in one transaction.
+
+        `terms` is a list of validated dicts with `amount`, `tenure` and `interest_rate`.
+        """
+        if not terms:
+            return []
+
+        amounts = [row["amount"] for row in terms]
+        rates = [row["interest_rate"] for row in terms]
+        tenures = [row["tenure"] for row in terms]
+        priced = amortization.price_batch(amounts, rates, tenures)
+        principal, interest, _ = amortization.schedule_batch(
+            [amortization.to_paisa(amount) for amount in amounts],
+            [amortization.to_basis_points(rate) for rate in rates],
+            tenures,
+            priced["monthly_installment"],
+        )
+
+        next_due_date = datetime.date.today() + relativedelta(months=1)
+        due_dates = [next_due_date + relativedelta(months=i) for i in range(max(tenures))]
+        from_paisa = amortization.from_paisa
+
+        loans = [
+            cls(
+                user=user,
+                amount=row["amount"],
+                tenure=row["tenure"],
+                interest_rate=row["interest_rate"],
+                monthly_installment=from_paisa(priced["monthly_installment"][i]),
+                total_interest=from_paisa(priced["total_interest"][i]),
+                total_amount=from_paisa(priced["total_amount"][i]),
+                next_due_date=next_due_date,
+            )
+            for i, row in enumerate(terms)
+        ]
+
+        with transaction.atomic():
+            cls.objects.bulk_create(loans, batch_size=1000)
+            Installment.objects.bulk_create(
+                [
+                    Installment(
+                        loan=loan,
+                        installment_no=n + 1,
+                        due_date=due_dates[n],
+                        amount=loan.monthly_installment,
+                        principal=from_paisa(principal[i, n]),
+                        interest=from_paisa(interest[i, n]),
+                    )
+                    for i, loan in enumerate(loans)
+                    for n in range(loan.tenure)
+                ],
+                batch_size=5000,
+            )
+            portfolio.record(loans)
+        return loans
 
     def calculate_loan(self):
         """Calculate monthly installment and total amount payable using compound interest formula"""
-        yearly_rate = Decimal(self.interest_rate) / 100
-        monthly_rate = yearly_rate / 12
-        months = self.tenure
-
-        if monthly_rate > 0:
-            emi = (self.amount * monthly_rate * ((1 + monthly_rate) ** months)) / (((1 + monthly_rate) ** months) - 1)
-        else:
-            emi = self.amount / months  # ✅ Handles 0% interest case properly
-
-        self.monthly_installment = round(emi, 2)
-        self.total_interest = round((self.monthly_installment * months) - self.amount, 2)
-        self.total_amount = round(self.amount + self.total_interest, 2)
+        pricing = amortization.price_loan(self.amount, self.interest_rate, self.tenure)
+        self.monthly_installment = pricing.monthly_installment
+        self.total_interest = pricing.total_interest
+        self.total_amount = pricing.total_amount
         self.next_due_date = datetime.date.today() + relativedelta(months=1)  # ✅ Fix: Uses relativedelta for correct monthly intervals
         self.save()
 
@@ -66,9 +175,22 @@ class Loan(models.Model):
         discount = remaining_interest * Decimal(0.05)  # ✅ Fix: Ensures Decimal precision
         final_settlement = (self.total_amount - self.amount_paid) - discount
 
+        with transaction.atomic():
+            # ✅ Compare-and-swap on `version`: a payment posted since we read the loan aborts the foreclosure
+            closed = Loan.objects.filter(pk=self.pk, status="ACTIVE", version=self.version).update(
+                status="CLOSED", amount_paid=models.F("total_amount"), version=models.F("version") + 1,
+            )
+            if not closed:
+                return {"error": "Loan was updated concurrently. Please retry."}
+            portfolio.record_change(
+                portfolio.loan_row(self), portfolio.loan_row(self, status="CLOSED", amount_paid=self.total_amount),
+            )
+            self.installments.exclude(status=Installment.PAID).update(status=Installment.PAID, amount_paid=models.F('amount'))
+
         self.status = "CLOSED"
         self.amount_paid = self.total_amount
-        self.save()
+        self.version += 1
+        loan_cache.invalidate(self.id)
 
         return {
             "foreclosure_discount": round(discount, 2),
@@ -76,21 +198,260 @@ class Loan(models.Model):
             "status": self.status
         }
 
+    def post_payment(self, amount):
+        """Record a repayment, then refresh `next_due_date` and the arrears, safely under concurrency.
+
+        `amount_paid` is bumped with a conditional F() UPDATE that also refuses
+        overpayment, so concurrent payments never lose updates and never need a
+        read lock; readers keep seeing the last committed row.
+        """
+        amount = Decimal(amount)
+        loans = Loan.objects.filter(pk=self.pk)
+
+        with transaction.atomic():
+            applied = loans.filter(status="ACTIVE", amount_paid__lte=models.F("total_amount") - amount).update(
+                amount_paid=models.F("amount_paid") + amount, version=models.F("version") + 1,
+            )
+            if not applied:
+                status, outstanding = loans.values_list("status", models.F("total_amount") - models.F("amount_paid")).get()
+                if status == "CLOSED":
+                    return {"error": "Loan is already closed."}
+                return {"error": f"Payment exceeds the outstanding amount of {round(outstanding, 2)}.", "field": "amount"}
+
+            # Our UPDATE holds the row lock until commit, so this read sees a stable post-payment state
+            amount_paid, total_amount, version = loans.values_list("amount_paid", "total_amount", "version").get()
+            installments_covered = min(int(amount_paid // self.monthly_installment), self.tenure)
+            self.installments.filter(installment_no__lte=installments_covered).exclude(status=Installment.PAID).update(
+                status=Installment.PAID, amount_paid=models.F("amount"),
+            )
+            self.installments.filter(installment_no=installments_covered + 1).update(
+                amount_paid=amount_paid - installments_covered * self.monthly_installment,
+            )
+
+            unpaid = [
+                (due_date, amortization.to_paisa(owed))
+                for due_date, owed in self.installments.exclude(status=Installment.PAID).order_by("due_date")
+                .values_list("due_date", models.F("amount") - models.F("amount_paid"))
+            ]
+            if installments_covered < self.tenure:  # Loans without a ledger
+                next_due_date = self.created_at.date() + relativedelta(months=installments_covered + 1)
+            else:
+                next_due_date = self.next_due_date
+            changes = Loan.due_state(unpaid, datetime.date.today(), next_due_date)
+            if amount_paid >= total_amount:
+                changes["status"] = "CLOSED"
+            loans.update(**changes)
+            portfolio.record_change(
+                portfolio.loan_row(self, status="ACTIVE", amount_paid=amount_paid - amount),
+                portfolio.loan_row(self, status=changes.get("status", "ACTIVE"), amount_paid=amount_paid),
+            )
+            payment = Payment.objects.create(loan=self, amount=amount, amount_paid_after=amount_paid)
+
+        self.amount_paid = amount_paid
+        self.version = version
+        for field, value in changes.items():
+            setattr(self, field, value)
+        loan_cache.invalidate(self.id)
+
+        return {
+            "payment_id": payment.id,
+            "amount": amount,
+            "amount_paid": amount_paid,
+            "amount_remaining": round(total_amount - amount_paid, 2),
+            "next_due_date": self.next_due_date,
+            "status": self.status,
+        }
+
+    @staticmethod
+    def due_state(unpaid, as_of, next_due_date=None):
+        """`next_due_date`, `overdue_since` and `overdue_amount` as of `as_of`.
+
+        `unpaid` lists the loan's unpaid installments as `(due_date, owed paisa)`
+        in due-date order; `next_due_date` is kept when there are none. Shared by
+        `post_payment` and the nightly accrual so both leave the same figures.
+        """
+        arrears = [(due_date, owed) for due_date, owed in unpaid if due_date < as_of]
+        upcoming = next((due_date for due_date, _ in unpaid if due_date >= as_of), None)
+        return {
+            "next_due_date": upcoming or (unpaid[0][0] if unpaid else next_due_date),
+            "overdue_since": arrears[0][0] if arrears else None,
+            "overdue_amount": amortization.from_paisa(sum(owed for _, owed in arrears)),
+        }
+
+    def build_installments(self):
+        """Unsaved `Installment` rows for this loan, starting at `next_due_date`."""
+        rows = amortization.schedule(
+            self.amount, self.interest_rate, self.tenure, self.monthly_installment, self.next_due_date
+        )
+        return [
+            Installment(
+                loan=self,
+                installment_no=row["installment_no"],
+                due_date=row["due_date"],
+                amount=row["amount"],
+                principal=row["principal"],
+                interest=row["interest"],
+            )
+            for row in rows
+        ]
+
+    def reprice_installments(self, installments):
+        """Bring this loan's ledger rows in line with its (re-priced) EMI; returns the rows to save.
+
+        Amounts come from `build_installments()`. Due dates stay, and the paid
+        state is re-derived from `amount_paid` the way `post_payment` sets it.
+        """
+        fresh = {row.installment_no: row for row in self.build_installments()}
+        covered = min(int(self.amount_paid // self.monthly_installment), self.tenure)
+        today = datetime.date.today()
+        for installment in installments:
+            row = fresh[installment.installment_no]
+            installment.amount, installment.principal, installment.interest = row.amount, row.principal, row.interest
+            if installment.installment_no <= covered:
+                installment.status, installment.amount_paid = Installment.PAID, row.amount
+                continue
+            if installment.status == Installment.PAID:
+                installment.status = Installment.OVERDUE if installment.due_date < today else Installment.PENDING
+            installment.amount_paid = (
+                self.amount_paid - covered * self.monthly_installment if installment.installment_no == covered + 1 else 0
+            )
+        return installments
+
+    def schedule_key(self, start_date=None):
+        """Terms that fully determine the payment schedule (used as the cache key)."""
+        return (self.amount, self.tenure, self.interest_rate, self.monthly_installment, start_date or datetime.date.today())
+
     def generate_payment_schedule(self):
-        """Generate a detailed payment schedule with due dates and EMI amounts."""
-        schedule = []
-        current_due_date = datetime.date.today()
-        
-        for i in range(1, self.tenure + 1):
-            schedule.append({
-                "installment_no": i,
-                "due_date": current_due_date.strftime('%Y-%m-%d'),
-                "amount": self.monthly_installment
-            })
-            current_due_date += relativedelta(months=1)  # ✅ Fix: Uses correct month-based intervals
-        
-        return schedule
+        """Generate a detailed payment schedule with due dates, EMI amounts and the principal/interest split.
+
+        Only used for loans without an installment ledger; it ignores payments.
+        """
+        start_date = datetime.date.today()
+        return schedule_cache.get_or_create(
+            self.schedule_key(start_date),
+            lambda: amortization.schedule(self.amount, self.interest_rate, self.tenure, self.monthly_installment, start_date),
+        )
 
     def __str__(self):
         return f"Loan {self.id} - {self.user.username} ({self.status})"
-#ff
\ No newline at end of file
+#ff
+
+
+# ✅ Repayments posted against a loan (see Loan.post_payment)
+class Payment(models.Model):
+    loan = models.ForeignKey('Loan', on_delete=models.CASCADE, related_name="payments")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount_paid_after = models.DecimalField(max_digits=10, decimal_places=2)  # Loan's running total after this payment
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Payment {self.id} of {self.amount} on Loan {self.loan_id}"
+
+
+class InstallmentQuerySet(models.QuerySet):
+    def due_between(self, start, end):
+        """Unpaid installments falling due in [start, end]; served by the (status, due_date) index."""
+        return self.filter(status__in=[Installment.PENDING, Installment.OVERDUE], due_date__range=(start, end))
+
+
+# ✅ Persisted installment ledger (one row per EMI), created alongside the loan
+class Installment(models.Model):
+    PENDING = 'PENDING'
+    PAID = 'PAID'
+    OVERDUE = 'OVERDUE'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (PAID, 'Paid'), (OVERDUE, 'Overdue')]
+
+    loan = models.ForeignKey('Loan', on_delete=models.CASCADE, related_name="installments", db_index=False)  # Covered by (loan, due_date)
+    installment_no = models.PositiveSmallIntegerField()
+    due_date = models.DateField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)  # EMI due
+    principal = models.DecimalField(max_digits=10, decimal_places=2)
+    interest = models.DecimalField(max_digits=10, decimal_places=2)
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+
+    objects = InstallmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['loan', 'due_date'], name='lbe_installment_loan_due'),
+            models.Index(fields=['status', 'due_date'], name='lbe_installment_status_due'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['loan', 'installment_no'], name='lbe_installment_loan_no_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Installment {self.installment_no} of Loan {self.loan_id} ({self.status})"
+
+
+# ✅ Incrementally maintained portfolio aggregates (see LBE/portfolio.py); one row per bucket
+class PortfolioSnapshot(models.Model):
+    status = models.CharField(max_length=10)
+    tenure_bucket = models.CharField(max_length=10)
+    maturity_month = models.DateField()  # First day of the month holding the loan's final installment
+    loan_count = models.IntegerField(default=0)
+    principal = models.DecimalField(max_digits=16, decimal_places=2, default=0)  # Originated amount
+    outstanding_principal = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    interest_receivable = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    amount_paid = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['status', 'tenure_bucket', 'maturity_month'], name='lbe_portfolio_bucket_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.status} {self.tenure_bucket} maturing {self.maturity_month:%Y-%m}: {self.loan_count} loans"
+
+
+# ✅ Progress of resumable batch jobs (e.g. `manage.py accrue_loans`), one row per job and business date
+class BatchCheckpoint(models.Model):
+    job = models.CharField(max_length=50)
+    as_of = models.DateField()
+    last_id = models.BigIntegerField(default=0)  # Every loan with id <= last_id is done
+    loans_processed = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'as_of'], name='lbe_batch_checkpoint_uniq'),
+        ]
+
+    def __str__(self):
+        state = "finished" if self.finished_at else f"at loan {self.last_id}"
+        return f"{self.job} {self.as_of} ({state})"
+
+
+# ✅ Outbox for transactional email; drained by `manage.py drain_outbox`
+class OutboundEmail(models.Model):
+    PENDING = 'PENDING'
+    SENT = 'SENT'
+    FAILED = 'FAILED'
+    EXPIRED = 'EXPIRED'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (FAILED, 'Failed'), (EXPIRED, 'Expired')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # Also the lease end while a worker is sending
+    expires_at = models.DateTimeField(blank=True, null=True)  # Not worth delivering after this (e.g. an OTP)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='lbe_outbox_status_next'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
@@ -0,0 +1,98 @@
+"""DB-backed outbox for transactional email.
+
+Requests only enqueue messages (`enqueue_email`); the `drain_outbox` worker
+claims a batch with a short transaction (a lease), then delivers it over a
+single reused mail connection outside any transaction, retrying failures with
+exponential backoff. Messages with an `expires_at` (OTPs) are dropped once
+they could no longer be used.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+MAX_ATTEMPTS = getattr(settings, "LBE_OUTBOX_MAX_ATTEMPTS", 5)
+BACKOFF_SECONDS = getattr(settings, "LBE_OUTBOX_BACKOFF_SECONDS", 30)
+MAX_BACKOFF_SECONDS = getattr(settings, "LBE_OUTBOX_MAX_BACKOFF_SECONDS", 3600)
+LEASE_SECONDS = getattr(settings, "LBE_OUTBOX_LEASE_SECONDS", 300)  # Longest a batch may take to send
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None, expires_at=None):
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipient_list),
+        expires_at=expires_at,
+    )
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts` (1-based): 30s, 60s, 120s, ... capped."""
+    return datetime.timedelta(seconds=min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def claim_due(batch_size, now):
+    """Lease up to `batch_size` due messages to this worker; expired ones are dropped instead of sent.
+
+    The claim commits before anything is sent, so no row lock is held while talking to the mail server. A
+    worker that dies mid-batch leaves its messages PENDING; they become due again when the lease runs out.
+    """
+    OutboundEmail.objects.filter(status=OutboundEmail.PENDING, expires_at__lte=now).update(
+        status=OutboundEmail.EXPIRED, last_error="Expired before delivery",
+    )
+    due = OutboundEmail.objects.filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now).order_by("next_attempt_at")
+    if db_connection.features.has_select_for_update_skip_locked:
+        due = due.select_for_update(skip_locked=True)  # Lets several workers drain in parallel
+
+    with transaction.atomic():
+        messages = list(due[:batch_size])
+        for message in messages:
+            message.attempts += 1
+            message.next_attempt_at = now + datetime.timedelta(seconds=LEASE_SECONDS)
+        OutboundEmail.objects.bulk_update(messages, ["attempts", "next_attempt_at"])
+    return messages
+
+
+def deliver_pending(batch_size=100, max_attempts=MAX_ATTEMPTS):
+    """Send one batch of due messages; returns (sent, failed) counts for the batch."""
+    messages = claim_due(batch_size, timezone.now())
+    if not messages:
+        return 0, 0
+
+    sent = failed = 0
+    mail_connection = get_connection()
+    try:
+        for message in messages:
+            try:
+                mail_connection.open()  # No-op while the connection is still open
+                EmailMessage(
+                    subject=message.subject,
+                    body=message.body,
+                    from_email=message.from_email,
+                    to=message.recipients,
+                    connection=mail_connection,
+                ).send()
+            except Exception as exc:
+                mail_connection.close()  # Reconnect for the next message
+                message.last_error = f"{type(exc).__name__}: {exc}"
+                message.next_attempt_at = timezone.now() + backoff(message.attempts)
+                if message.attempts >= max_attempts:
+                    message.status = OutboundEmail.FAILED
+                elif message.expires_at and message.next_attempt_at >= message.expires_at:
+                    message.status = OutboundEmail.EXPIRED  # The retry would arrive too late to be useful
+                failed += 1
+            else:
+                message.status = OutboundEmail.SENT
+                message.sent_at = timezone.now()
+                message.last_error = ""
+                sent += 1
+    finally:
+        mail_connection.close()
+
+    OutboundEmail.objects.bulk_update(messages, ["status", "next_attempt_at", "last_error", "sent_at"])
+    return sent, failed
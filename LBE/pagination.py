@@ -0,0 +1,21 @@
+from rest_framework.pagination import CursorPagination
+
+
+class LoanCursorPagination(CursorPagination):
+    """Keyset pagination for loan listings.
+
+    Pages are addressed by an opaque cursor over the primary key, so fetching
+    page N costs the same as fetching page 1 regardless of the book size.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = "-id"  # Newest loans first; `id` is unique and indexed
+
+
+class InstallmentCursorPagination(CursorPagination):
+    """Keyset pagination for installments, in due-date order."""
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = ("due_date", "id")
@@ -8,4 +8,4 @@ class IsAdminUser(BasePermission):
 class IsLoanOwner(BasePermission):
     """Allows access only to loan owners or admins"""
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.user or request.user.is_staff  # ✅ Loan owner or admin
+        return obj.user_id == request.user.pk or request.user.is_staff  # ✅ Loan owner or admin (no user fetch)
@@ -0,0 +1,198 @@
+"""Portfolio aggregates maintained incrementally as loans change.
+
+Every loan contributes to exactly one `PortfolioSnapshot` row, keyed by
+(status, tenure bucket, maturity month). Write paths call `record()`,
+`record_change()` or `remove()` inside their transaction, and each call bumps
+the affected rows with F() expressions. Reading the whole portfolio therefore
+costs one query over a few dozen rows, whatever the size of the book.
+
+Paths that bypass these hooks (queryset deletes from the Django admin, users
+deleted with their loans, raw SQL) make the table drift. `manage.py
+rebuild_portfolio --check` reports drift and a plain run rebuilds the table.
+
+`rebuild()` recomputes and swaps the table in one transaction that first
+locks it, so write hooks running meanwhile wait and then apply their deltas on
+top; none is lost between the scan and the swap.
+
+Migrations do not call these functions: 0013 keeps its own frozen copy. The
+optional `apps` argument only selects the model registry.
+"""
+from dateutil.relativedelta import relativedelta
+from django.apps import apps as global_apps
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import amortization
+
+TENURE_BUCKETS = [("3-6", 6), ("7-12", 12), ("13-24", 24), ("25+", None)]  # (label, inclusive upper bound)
+MONEY_MEASURES = ("principal", "outstanding_principal", "interest_receivable", "amount_paid")
+MEASURES = ("loan_count",) + MONEY_MEASURES
+LOAN_FIELDS = ("amount", "interest_rate", "tenure", "monthly_installment", "amount_paid", "status", "created_at")
+
+
+def tenure_bucket(tenure):
+    for label, upper in TENURE_BUCKETS:
+        if upper is None or tenure <= upper:
+            return label
+
+
+def maturity_month(created_at, tenure):
+    return (created_at.date() + relativedelta(months=tenure)).replace(day=1)
+
+
+def loan_row(loan, **overrides):
+    """The `LOAN_FIELDS` of a loan as a tuple, with some values replaced (e.g. the post-update state)."""
+    return tuple(overrides.get(field, getattr(loan, field)) for field in LOAN_FIELDS)
+
+
+def contributions(rows, sign=1, totals=None):
+    """Add (or with `sign=-1` subtract) loan rows into `{bucket key: {measure: int}}`; money in paisa."""
+    totals = {} if totals is None else totals
+    rows = list(rows)
+    if not rows:
+        return totals
+
+    amounts, rates, tenures, emis, paid, statuses, created = zip(*rows)
+    to_paisa = amortization.to_paisa
+    amount_paisa = [to_paisa(amount) for amount in amounts]
+    paid_paisa = [to_paisa(value) for value in paid]
+    principal, interest = amortization.outstanding_batch(
+        amount_paisa,
+        [amortization.to_basis_points(rate) for rate in rates],
+        tenures,
+        [to_paisa(emi or 0) for emi in emis],
+        paid_paisa,
+    )
+
+    for i in range(len(rows)):
+        key = (statuses[i], tenure_bucket(tenures[i]), maturity_month(created[i], tenures[i]))
+        bucket = totals.setdefault(key, dict.fromkeys(MEASURES, 0))
+        bucket["loan_count"] += sign
+        bucket["principal"] += sign * amount_paisa[i]
+        bucket["outstanding_principal"] += sign * int(principal[i])
+        bucket["interest_receivable"] += sign * int(interest[i])
+        bucket["amount_paid"] += sign * paid_paisa[i]
+    return totals
+
+
+def _as_fields(measures):
+    return {
+        measure: amortization.from_paisa(value) if measure in MONEY_MEASURES else value
+        for measure, value in measures.items()
+    }
+
+
+def apply(totals, apps=global_apps):
+    """Bump snapshot rows by the given deltas, creating missing rows."""
+    PortfolioSnapshot = apps.get_model("LBE", "PortfolioSnapshot")
+    for (status, bucket, month), measures in sorted(totals.items()):  # Stable order avoids lock-order deadlocks
+        if not any(measures.values()):
+            continue
+        key = {"status": status, "tenure_bucket": bucket, "maturity_month": month}
+        deltas = _as_fields(measures)
+        increments = {measure: F(measure) + value for measure, value in deltas.items() if value}
+        increments["updated_at"] = timezone.now()
+        if PortfolioSnapshot.objects.filter(**key).update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                PortfolioSnapshot.objects.create(**key, **deltas)
+        except IntegrityError:  # Created concurrently; our delta still applies
+            PortfolioSnapshot.objects.filter(**key).update(**increments)
+
+
+def record(loans, apps=global_apps):
+    """Add newly originated loans."""
+    apply(contributions(loan_row(loan) for loan in loans), apps)
+
+
+def remove(loans, apps=global_apps):
+    """Subtract loans that are about to be deleted."""
+    apply(contributions((loan_row(loan) for loan in loans), sign=-1), apps)
+
+
+def record_change(before, after, apps=global_apps):
+    """Move one loan from its `before` row (see `loan_row`) to its `after` row."""
+    apply(contributions([after], totals=contributions([before], sign=-1)), apps)
+
+
+def compute(apps=global_apps, chunk_size=10000):
+    """Aggregate the whole book from scratch, scanning loans in keyset chunks."""
+    Loan = apps.get_model("LBE", "Loan")
+    totals = {}
+    last_id = 0
+    while True:
+        rows = list(Loan.objects.filter(id__gt=last_id).order_by("id").values_list("id", *LOAN_FIELDS)[:chunk_size])
+        if not rows:
+            return totals
+        last_id = rows[-1][0]
+        contributions((row[1:] for row in rows), totals=totals)
+
+
+def stored(apps=global_apps):
+    PortfolioSnapshot = apps.get_model("LBE", "PortfolioSnapshot")
+    totals = {}
+    for row in PortfolioSnapshot.objects.values("status", "tenure_bucket", "maturity_month", *MEASURES):
+        key = (row["status"], row["tenure_bucket"], row["maturity_month"])
+        totals[key] = {
+            measure: amortization.to_paisa(row[measure]) if measure in MONEY_MEASURES else row[measure]
+            for measure in MEASURES
+        }
+    return totals
+
+
+def drift(apps=global_apps):
+    """List `(key, measure, stored, expected)` for every measure that disagrees with a full recompute."""
+    expected, actual = compute(apps), stored(apps)
+    zero = dict.fromkeys(MEASURES, 0)
+    return [
+        (key, measure, actual.get(key, zero)[measure], expected.get(key, zero)[measure])
+        for key in sorted(set(expected) | set(actual))
+        for measure in MEASURES
+        if actual.get(key, zero)[measure] != expected.get(key, zero)[measure]
+    ]
+
+
+def lock_table(PortfolioSnapshot):
+    """Make `apply()` in other transactions wait until ours ends (call inside `transaction.atomic()`)."""
+    connection = connections[router.db_for_write(PortfolioSnapshot)]
+    if connection.vendor == "postgresql":  # EXCLUSIVE still lets plain reads (summaries) through
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {connection.ops.quote_name(PortfolioSnapshot._meta.db_table)} IN EXCLUSIVE MODE")
+
+
+def rebuild(apps=global_apps):
+    """Replace the snapshot table with a full recompute; returns the number of bucket rows."""
+    PortfolioSnapshot = apps.get_model("LBE", "PortfolioSnapshot")
+    with transaction.atomic():
+        lock_table(PortfolioSnapshot)
+        PortfolioSnapshot.objects.all().delete()  # On SQLite this write is what takes the lock
+        totals = compute(apps)  # Sees every change whose delta already landed, none still to come
+        PortfolioSnapshot.objects.bulk_create([
+            PortfolioSnapshot(status=status, tenure_bucket=bucket, maturity_month=month, **_as_fields(measures))
+            for (status, bucket, month), measures in sorted(totals.items())
+            if measures["loan_count"]
+        ])
+    return sum(1 for measures in totals.values() if measures["loan_count"])
+
+
+def summary(apps=global_apps):
+    """Totals by status and tenure bucket, plus the maturity ladder of active loans (one query)."""
+    PortfolioSnapshot = apps.get_model("LBE", "PortfolioSnapshot")
+    totals, by_status, by_bucket, ladder = {}, {}, {}, {}
+    for row in PortfolioSnapshot.objects.filter(loan_count__gt=0).order_by("maturity_month"):
+        groups = [totals, by_status.setdefault(row.status, {}), by_bucket.setdefault(row.tenure_bucket, {})]
+        if row.status == "ACTIVE":
+            groups.append(ladder.setdefault(f"{row.maturity_month:%Y-%m}", {}))
+        for group in groups:
+            for measure in MEASURES:
+                group[measure] = group.get(measure, 0) + getattr(row, measure)
+
+    order = [label for label, _ in TENURE_BUCKETS]
+    return {
+        "totals": totals or _as_fields(dict.fromkeys(MEASURES, 0)),
+        "by_status": by_status,
+        "by_tenure_bucket": {label: by_bucket[label] for label in order if label in by_bucket},
+        "maturity_ladder": [{"month": month, **measures} for month, measures in ladder.items()],
+    }
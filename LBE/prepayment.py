@@ -0,0 +1,190 @@
+"""What-if prepayment and foreclosure simulation (nothing is written to the database).
+
+Loans are read as plain value rows and re-amortized with
+`amortization.simulate_batch()`. One vectorized pass serves a single loan for
+the API or tens of thousands for a retention campaign.
+
+The simulation starts from the ledger. Fully paid installments are settled, and
+a part payment counts towards the next installment (`credit`). Prepayments go
+to principal just before the installment they name.
+"""
+import datetime
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+from . import amortization
+from .models import Loan
+
+LOAN_FIELDS = ("id", "amount", "interest_rate", "tenure", "monthly_installment", "amount_paid")
+REDUCE_CHOICES = ("tenure", "emi")
+
+
+class SimulationError(ValueError):
+    """The requested plan does not apply to the loan (e.g. it is closed or already repaid by then)."""
+
+
+def loan_state(rows):
+    """Where each loan stands today, as int64 paisa arrays, from value rows in `LOAN_FIELDS` order."""
+    ids, amounts, rates, tenures, emis, paid = zip(*rows) if rows else ((),) * len(LOAN_FIELDS)
+    amount_paisa = np.array([amortization.to_paisa(value) for value in amounts], dtype=np.int64)
+    rate_bp = np.array([amortization.to_basis_points(value) for value in rates], dtype=np.int64)
+    tenures = np.array(tenures, dtype=np.int64)
+    emi_paisa = np.array([amortization.to_paisa(value) for value in emis], dtype=np.int64)
+    paid_paisa = np.array([amortization.to_paisa(value) for value in paid], dtype=np.int64)
+
+    covered = np.minimum(paid_paisa // np.maximum(emi_paisa, 1), tenures)
+    if amount_paisa.size:
+        _, _, balances = amortization.schedule_batch(amount_paisa, rate_bp, tenures, emi_paisa)
+        last = balances.shape[1] - 1
+        balance = np.where(covered > 0, balances[np.arange(covered.size), np.clip(covered - 1, 0, last)], amount_paisa)
+    else:
+        balance = amount_paisa
+    return {
+        "id": np.array(ids, dtype=np.int64),
+        "rate_bp": rate_bp,
+        "emi": emi_paisa,
+        "covered": covered,
+        "remaining": tenures - covered,
+        "balance": balance,
+        "credit": paid_paisa - covered * emi_paisa,
+    }
+
+
+def outcome(state, simulated):
+    """Per-loan before/after totals (paisa) for a `simulate_batch()` result."""
+    interest_before = state["remaining"] * state["emi"] - state["balance"]
+    interest_after = simulated["interest"].sum(axis=1)
+    return {
+        "interest_before": interest_before,
+        "interest_after": interest_after,
+        "interest_saved": interest_before - interest_after,
+        "total_payable": simulated["amount"].sum(axis=1) + simulated["prepaid"].sum(axis=1) - state["credit"],
+    }
+
+
+def simulate_loan(loan, prepayments=(), reduce="tenure", foreclose_on=None):
+    """Re-amortize one loan under `prepayments` (`[(before_installment or None, amount), ...]`) and/or a foreclosure date."""
+    if loan.status != "ACTIVE":
+        raise SimulationError("Only active loans can be simulated.")
+    state = loan_state([[getattr(loan, field) for field in LOAN_FIELDS]])
+    covered, remaining = int(state["covered"][0]), int(state["remaining"][0])
+    if remaining <= 0:
+        raise SimulationError("Loan is fully repaid.")
+
+    plan = np.zeros((1, remaining), dtype=np.int64)
+    for installment_no, amount in prepayments:
+        installment_no = installment_no or covered + 1  # Default: alongside the next installment
+        if not covered < installment_no <= loan.tenure:
+            raise SimulationError(f"before_installment must be between {covered + 1} and {loan.tenure}.")
+        plan[0, installment_no - covered - 1] += amortization.to_paisa(amount)
+
+    due_dates = installment_due_dates(loan)
+    payoff_at = None
+    if foreclose_on is not None:
+        payoff_at = sum(1 for due in due_dates[covered:] if due <= foreclose_on)  # Installments paid first
+        if payoff_at >= remaining:
+            raise SimulationError("Loan is fully repaid by that date; nothing to foreclose.")
+        plan[0, payoff_at:] = 0
+        plan[0, payoff_at] = np.iinfo(np.int64).max // 2  # Clamped to the balance: pays it off
+
+    simulated = amortization.simulate_batch(
+        state["balance"], state["rate_bp"], state["remaining"], state["emi"], plan, reduce,
+    )
+    totals = {key: int(value[0]) for key, value in outcome(state, simulated).items()}
+
+    payoff = None
+    if payoff_at is not None:
+        principal = int(simulated["prepaid"][0, payoff_at])
+        previous_due = due_dates[covered + payoff_at - 1] if covered + payoff_at else loan.created_at.date()
+        accrued = int(amortization.daily_interest(principal, int(state["rate_bp"][0]), (foreclose_on - previous_due).days))
+        totals["interest_after"] += accrued
+        totals["interest_saved"] -= accrued
+        totals["total_payable"] += accrued
+        payoff = {
+            "date": foreclose_on,
+            "principal": amortization.from_paisa(principal),
+            "accrued_interest": amortization.from_paisa(accrued),
+            "amount": amortization.from_paisa(principal + accrued),
+        }
+
+    schedule = []
+    for i in range(simulated["amount"].shape[1]):
+        if not simulated["amount"][0, i] and not simulated["prepaid"][0, i]:
+            continue
+        schedule.append({
+            "installment_no": covered + i + 1,
+            "due_date": due_dates[covered + i],
+            "prepayment": amortization.from_paisa(simulated["prepaid"][0, i]),
+            "amount": amortization.from_paisa(simulated["amount"][0, i]),
+            "principal": amortization.from_paisa(simulated["principal"][0, i]),
+            "interest": amortization.from_paisa(simulated["interest"][0, i]),
+            "balance": amortization.from_paisa(simulated["balance"][0, i]),
+        })
+
+    return {
+        "loan_id": f"LOAN{loan.id:03}",
+        "reduce": reduce,
+        "current": {
+            "monthly_installment": loan.monthly_installment,
+            "installments_left": remaining,
+            "outstanding_principal": amortization.from_paisa(state["balance"][0]),
+            "interest_remaining": amortization.from_paisa(totals["interest_before"]),
+        },
+        "simulated": {
+            "monthly_installment": amortization.from_paisa(simulated["monthly_installment"][0]),
+            "installments_left": int(simulated["tenure"][0]),
+            "interest_payable": amortization.from_paisa(totals["interest_after"]),
+            "interest_saved": amortization.from_paisa(totals["interest_saved"]),
+            "total_payable": amortization.from_paisa(totals["total_payable"]),
+            "payoff": payoff,
+            "payment_schedule": schedule,
+        },
+    }
+
+
+def installment_due_dates(loan):
+    """Due dates of installments 1..tenure, from the ledger when the loan has one."""
+    due_dates = list(loan.installments.order_by("installment_no").values_list("due_date", flat=True))
+    if len(due_dates) == loan.tenure:
+        return due_dates
+    start = loan.created_at.date() if loan.created_at else datetime.date.today()
+    return [start + relativedelta(months=i + 1) for i in range(loan.tenure)]
+
+
+def simulate_book(prepay_amount=None, prepay_percent=None, reduce="tenure", chunk_size=20000, queryset=None):
+    """Yield per-loan campaign rows for prepaying `prepay_amount` (rupees) or `prepay_percent` of the principal now.
+
+    Active loans are read in keyset chunks of value rows and each chunk is
+    simulated in one vectorized pass.
+    """
+    loans = (queryset if queryset is not None else Loan.objects.all()).filter(status="ACTIVE").order_by("id")
+    after_id = 0
+    while True:
+        rows = list(loans.filter(id__gt=after_id).values_list(*LOAN_FIELDS)[:chunk_size])
+        if not rows:
+            return
+        after_id = rows[-1][0]
+
+        state = loan_state(rows)
+        open_loans = state["remaining"] > 0
+        if prepay_amount is not None:
+            prepaid = np.full(state["balance"].shape, amortization.to_paisa(prepay_amount), dtype=np.int64)
+        else:
+            prepaid = np.rint(state["balance"] * (float(prepay_percent) / 100)).astype(np.int64)
+        simulated = amortization.simulate_batch(
+            state["balance"], state["rate_bp"], np.where(open_loans, state["remaining"], 0), state["emi"],
+            np.where(open_loans, prepaid, 0)[:, None], reduce,
+        )
+        totals = outcome(state, simulated)
+        for i in np.flatnonzero(open_loans):
+            yield {
+                "loan_id": int(state["id"][i]),
+                "outstanding_principal": amortization.from_paisa(state["balance"][i]),
+                "prepayment": amortization.from_paisa(simulated["prepaid"][i, 0]),
+                "monthly_installment": amortization.from_paisa(state["emi"][i]),
+                "installments_left": int(state["remaining"][i]),
+                "new_monthly_installment": amortization.from_paisa(simulated["monthly_installment"][i]),
+                "new_installments_left": int(simulated["tenure"][i]),
+                "interest_saved": amortization.from_paisa(totals["interest_saved"][i]),
+            }
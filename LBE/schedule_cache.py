@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class ScheduleCache:
+    """Bounded, thread-safe LRU cache of payment schedules keyed by loan terms.
+
+    Cached schedules are shared between loans with identical terms, so callers
+    must treat the returned rows as read-only. Schedules do not depend on
+    payments, so nothing needs invalidating when a loan changes. Loans with an
+    installment ledger read that instead; this only serves loans without one.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key, factory):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = factory()  # Built outside the lock; a racing duplicate is harmless
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+schedule_cache = ScheduleCache(getattr(settings, "LBE_SCHEDULE_CACHE_SIZE", 1024))
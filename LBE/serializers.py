@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Lower
 from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.auth import authenticate
@@ -18,6 +19,12 @@ class RegisterSerializer(serializers.ModelSerializer):
         model = User
         fields = ('username', 'email', 'password')
 
+    def validate_email(self, value):
+        """Emails are unique regardless of case"""
+        if value and User.objects.annotate(email_lower=Lower('email')).filter(User.email_matches(value)).exists():
+            raise serializers.ValidationError("A user with this email already exists.")
+        return value
+
     def create(self, validated_data):
         user = User(
             username=validated_data["username"],
@@ -38,7 +45,9 @@ class VerifyOTPSerializer(serializers.Serializer):
         username_or_email = data.get("username_or_email")
         otp = data.get("otp")
 
-        user = User.objects.filter(username=username_or_email).first() or User.objects.filter(email=username_or_email).first()
+        identifier, user = getattr(self.context.get("request"), "lbe_otp_account", (None, None))
+        if identifier != username_or_email:  # ✅ Not already resolved by OTPUsernameThrottle
+            user = User.find_by_username_or_email(username_or_email)  # ✅ One indexed query
 
         if not user:
             raise serializers.ValidationError({"username_or_email": "User not found!"})
@@ -49,6 +58,7 @@ class VerifyOTPSerializer(serializers.Serializer):
         if not user.is_otp_valid():
             raise serializers.ValidationError({"otp": "OTP has expired!"})
 
+        data["user"] = user  # ✅ Hand the user to the view instead of fetching it again
         return data
 
     
@@ -77,9 +87,12 @@ class VerifyOTPSerializer(serializers.Serializer):
 
 
 from rest_framework import serializers
-from .models import Loan
+from django.db import transaction
+from .models import Loan, Installment
+from . import portfolio, prepayment
+from .metrics import TimedRepresentationMixin
 
-class LoanSerializer(serializers.ModelSerializer):
+class LoanSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     loan_id = serializers.SerializerMethodField()
     amount_remaining = serializers.SerializerMethodField()
     payment_schedule = serializers.SerializerMethodField()
@@ -89,10 +102,12 @@ class LoanSerializer(serializers.ModelSerializer):
         fields = [
             'loan_id', 'amount', 'tenure', 'interest_rate', 'monthly_installment',
             'total_interest', 'total_amount', 'amount_paid', 'amount_remaining',
-            'next_due_date', 'status', 'created_at', 'payment_schedule'
+            'next_due_date', 'overdue_since', 'overdue_amount', 'penalty_accrued', 'status', 'created_at',
+            'payment_schedule'
         ]
         read_only_fields = ['monthly_installment', 'total_interest', 'total_amount', 
-                            'next_due_date', 'status', 'amount_paid', 'amount_remaining', 'payment_schedule']
+                            'next_due_date', 'overdue_since', 'overdue_amount', 'penalty_accrued',
+                            'status', 'amount_paid', 'amount_remaining', 'payment_schedule']
 
     def get_loan_id(self, obj):
         return f"LOAN{obj.id:03}"  # Example: LOAN001, LOAN002
@@ -102,7 +117,25 @@ class LoanSerializer(serializers.ModelSerializer):
         return round(Decimal(obj.total_amount) - Decimal(obj.amount_paid), 2)
 
     def get_payment_schedule(self, obj):
-        return obj.generate_payment_schedule()
+        installments = sorted(obj.installments.all(), key=lambda installment: installment.installment_no)
+        if not installments:
+            return obj.generate_payment_schedule()  # Loans without a ledger yet
+
+        balance = obj.amount
+        schedule = []
+        for installment in installments:
+            balance -= installment.principal
+            schedule.append({
+                "installment_no": installment.installment_no,
+                "due_date": installment.due_date,
+                "amount": installment.amount,
+                "principal": installment.principal,
+                "interest": installment.interest,
+                "balance": balance,
+                "amount_paid": installment.amount_paid,
+                "status": installment.status,
+            })
+        return schedule
 
     
     def validate_interest_rate(self, value):
@@ -124,6 +157,93 @@ class LoanSerializer(serializers.ModelSerializer):
         return value
     
     def create(self, validated_data):
-        loan = Loan.objects.create(**validated_data)
-        loan.calculate_loan()  # Auto-calculate loan details
-        return loan
\ No newline at end of file
+        with transaction.atomic():
+            loan = Loan(**validated_data)
+            loan.calculate_loan()  # Auto-calculate loan details (single INSERT)
+            Installment.objects.bulk_create(loan.build_installments())
+            portfolio.record([loan])
+        return loan
+
+
+class BoundedListField(serializers.ListField):
+    """`ListField` that enforces `max_length` before validating any item (DRF checks it afterwards)."""
+
+    def to_internal_value(self, data):
+        if self.max_length is not None and isinstance(data, list) and len(data) > self.max_length:
+            self.fail("max_length", max_length=self.max_length)
+        return super().to_internal_value(data)
+
+
+class LoanQuoteSerializer(serializers.Serializer):
+    """Grid of candidate terms for the stateless quote endpoint (same bounds as `LoanSerializer`)."""
+    # No list may be longer than the whole grid cap; longer ones are refused before any item is parsed
+    max_list = getattr(settings, "LBE_QUOTE_MAX_COMBINATIONS", 10000)
+    amounts = BoundedListField(child=serializers.DecimalField(max_digits=10, decimal_places=2), min_length=1,
+                               max_length=max_list)
+    tenures = BoundedListField(child=serializers.IntegerField(), min_length=1, max_length=max_list)
+    interest_rates = BoundedListField(child=serializers.DecimalField(max_digits=5, decimal_places=2), min_length=1,
+                                      max_length=max_list)
+
+    def validate_amounts(self, values):
+        return [LoanSerializer.validate_amount(self, value) for value in values]
+
+    def validate_tenures(self, values):
+        return [LoanSerializer.validate_tenure(self, value) for value in values]
+
+    def validate_interest_rates(self, values):
+        return [LoanSerializer.validate_interest_rate(self, value) for value in values]
+
+    def validate(self, data):
+        combinations = len(data["amounts"]) * len(data["tenures"]) * len(data["interest_rates"])
+        max_quotes = getattr(settings, "LBE_QUOTE_MAX_COMBINATIONS", 10000)
+        if combinations > max_quotes:
+            raise serializers.ValidationError(f"At most {max_quotes} combinations per request (got {combinations}).")
+        return data
+
+
+class PrepaymentSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.01"))
+    before_installment = serializers.IntegerField(min_value=1, required=False)  # Defaults to the next installment
+
+
+class LoanSimulationSerializer(serializers.Serializer):
+    prepayments = PrepaymentSerializer(many=True, required=False)
+    reduce = serializers.ChoiceField(choices=prepayment.REDUCE_CHOICES, default="tenure")
+    foreclose_on = serializers.DateField(required=False)
+
+    def validate_foreclose_on(self, value):
+        if value < datetime.date.today():
+            raise serializers.ValidationError("Foreclosure date cannot be in the past.")
+        return value
+
+    def validate(self, data):
+        if not data.get("prepayments") and "foreclose_on" not in data:
+            raise serializers.ValidationError("Provide prepayments, a foreclose_on date, or both.")
+        return data
+
+
+def schedule_payload(loan):
+    """Body of the schedule-only endpoints (expects `installments` prefetched)."""
+    return {"loan_id": f"LOAN{loan.id:03}", "payment_schedule": LoanSerializer().get_payment_schedule(loan)}
+
+
+class LoanListSerializer(LoanSerializer):
+    """Compact loan representation for list endpoints (no payment schedule)."""
+
+    class Meta(LoanSerializer.Meta):
+        fields = [field for field in LoanSerializer.Meta.fields if field != 'payment_schedule']
+
+
+class InstallmentSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    loan_id = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Installment
+        fields = ['loan_id', 'installment_no', 'due_date', 'amount', 'principal', 'interest', 'amount_paid', 'status']
+
+    def get_loan_id(self, obj):
+        return f"LOAN{obj.loan_id:03}"
+
+
+class PaymentSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.01"))
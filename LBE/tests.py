@@ -1,3 +1,1497 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.fields import DecimalField
+from rest_framework.test import APIClient
+
+from . import accrual, amortization, authentication, db_routers, loan_cache, metrics, outbox, portfolio, prepayment, throttling
+from .benchmarking import compare_results, latency_stats
+from .loan_book import LoanBook
+from .authentication import LoanRefreshToken
+from .models import BatchCheckpoint, CustomUser, Installment, Loan, OutboundEmail, PortfolioSnapshot
+from .schedule_cache import ScheduleCache, schedule_cache
+from .serializers import RegisterSerializer
+
+
+# The shared, file-based caches outlive a test run; tests use the per-process default and clear it
+shared_caches = override_settings(LBE_AUTH_CACHE="default", LBE_THROTTLE_CACHE="default")
+
+
+def setUpModule():
+    shared_caches.enable()
+
+
+def tearDownModule():
+    shared_caches.disable()
+
+
+def make_user(username="alice", is_staff=False):
+    user = CustomUser(username=username, email=f"{username}@example.com", is_staff=is_staff, is_verified=True)
+    user.set_password("s3cret-pass")
+    user.save()
+    return user
+
+
+def make_loan(user, amount="10000.00", tenure=12, interest_rate="10.00"):
+    loan = Loan(user=user, amount=Decimal(amount), tenure=tenure, interest_rate=Decimal(interest_rate))
+    loan.calculate_loan()
+    loan.refresh_from_db()
+    return loan
+
+
+class QueryBudgetMixin:
+    """Asserts an endpoint's query count is bounded and does not grow with the data.
+
+    Savepoint statements are ignored: they only appear because TestCase wraps
+    each test in a transaction.
+    """
+
+    def assertQueryBudget(self, budget, request, grow=None):
+        counts = []
+        for step in range(2 if grow else 1):
+            if step:
+                grow()
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            statements = [
+                query["sql"] for query in queries.captured_queries
+                if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+            ]
+            counts.append(len(statements))
+            self.assertLessEqual(len(statements), budget, "\n".join(statements))
+        if grow:
+            self.assertEqual(counts[0], counts[1], "Query count grew with the number of rows")
+
+
+class LoanListPaginationTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.admin = make_user("admin", is_staff=True)
+        self.client = APIClient()
+        for _ in range(5):
+            make_loan(self.user)
+
+    def test_list_is_cursor_paginated_and_compact(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse("list-loans"), {"page_size": 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNotNone(response.data["next"])
+        self.assertNotIn("payment_schedule", response.data["results"][0])
+
+        seen = [loan["loan_id"] for loan in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            seen.extend(loan["loan_id"] for loan in response.data["results"])
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_expand_schedule_is_opt_in(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse("admin-loan-list"), {"expand": "schedule"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"][0]["payment_schedule"]), 12)
+
+
+def legacy_pricing(amount, interest_rate, tenure):
+    """The original Loan.calculate_loan arithmetic, kept verbatim as the reconciliation reference."""
+    monthly_rate = Decimal(interest_rate) / 100 / 12
+    if monthly_rate > 0:
+        emi = (amount * monthly_rate * ((1 + monthly_rate) ** tenure)) / (((1 + monthly_rate) ** tenure) - 1)
+    else:
+        emi = amount / tenure
+    monthly_installment = round(emi, 2)
+    total_interest = round((monthly_installment * tenure) - amount, 2)
+    return monthly_installment, total_interest, round(amount + total_interest, 2)
+
+
+class AmortizationTests(SimpleTestCase):
+    def random_terms(self, count, seed=7):
+        rng = random.Random(seed)
+        return [
+            (Decimal(rng.randint(100000, 10000000)).scaleb(-2), Decimal(rng.randint(0, 3600)).scaleb(-2), rng.randint(3, 24))
+            for _ in range(count)
+        ]
+
+    def test_paisa_strings_match_decimal_rendering(self):
+        values = [0, 5, 99, 100, 171561, -5, -12345, 10**12 + 7]
+        self.assertEqual(amortization.paisa_strings(values), [str(amortization.from_paisa(value)) for value in values])
+
+    def test_batch_pricing_reconciles_to_the_paisa(self):
+        terms = self.random_terms(20000)
+        amounts, rates, tenures = zip(*terms)
+        priced = amortization.price_batch(amounts, rates, tenures)
+
+        for i, (amount, rate, tenure) in enumerate(terms):
+            expected = legacy_pricing(amount, rate, tenure)
+            actual = tuple(amortization.from_paisa(priced[field][i]) for field in amortization.Pricing._fields)
+            self.assertEqual(actual, expected, (amount, rate, tenure))
+            self.assertEqual(tuple(amortization.price_loan(amount, rate, tenure)), expected)
+
+    def test_annuity_table_reconciles_every_product_pair(self):
+        rng = random.Random(11)
+        for rate_bp in range(0, 3601, 25):
+            rate = Decimal(rate_bp).scaleb(-2)
+            for tenure in range(3, 25):
+                for amount in (Decimal("1000.00"), Decimal("100000.00"), Decimal(rng.randint(100000, 10000000)).scaleb(-2)):
+                    self.assertEqual(tuple(amortization.price_loan(amount, rate, tenure)),
+                                     legacy_pricing(amount, rate, tenure), (amount, rate, tenure))
+
+    def test_off_grid_terms_and_near_ties_use_the_decimal_formula(self):
+        with mock.patch.object(amortization, "exact_emi", wraps=amortization.exact_emi) as exact_emi:
+            amortization.emi(Decimal("10000.00"), Decimal("10.00"), 12)
+            self.assertFalse(exact_emi.called)
+            amortization.emi(Decimal("10000.00"), Decimal("10.005"), 12)
+            amortization.emi(Decimal("10000.001"), Decimal("10.00"), 12)
+            amortization.emi(Decimal("10000.00"), Decimal("10.00"), 36)
+            with mock.patch.object(amortization, "HALF_PAISA_TOLERANCE", 1):
+                amortization.emi(Decimal("10000.00"), Decimal("10.00"), 12)
+            self.assertEqual(exact_emi.call_count, 4)
+
+    def test_annuity_table_file_is_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "annuity.bin")
+            writer, reader = amortization.AnnuityTable(), amortization.AnnuityTable()
+            writer.open(path)
+            reader.open(path)
+            factor = writer.factor(1000, 12)
+            self.assertEqual(reader.factors()[1000, 12], factor)
+            self.assertEqual(reader.filled(), 1)
+
+    def test_annuity_table_refuses_files_it_cannot_trust(self):
+        with tempfile.TemporaryDirectory() as directory:
+            target, link = os.path.join(directory, "target.bin"), os.path.join(directory, "annuity.bin")
+            open(target, "wb").close()
+            os.symlink(target, link)
+            with self.assertRaises(OSError):  # ELOOP: the link is not followed
+                amortization.AnnuityTable().open(link)
+            self.assertEqual(os.path.getsize(target), 0)
+
+            os.chmod(target, 0o666)
+            with self.assertRaises(PermissionError):
+                amortization.AnnuityTable().open(target)
+
+            os.chmod(target, 0o600)
+            with mock.patch("os.geteuid", return_value=os.geteuid() + 1), self.assertRaises(PermissionError):
+                amortization.AnnuityTable().open(target)
+            amortization.AnnuityTable().open(target)
+
+    def test_schedule_splits_reconcile_with_totals(self):
+        amount, rate, tenure = Decimal("10000.00"), Decimal("10.00"), 12
+        pricing = amortization.price_loan(amount, rate, tenure)
+        rows = amortization.schedule(amount, rate, tenure, pricing.monthly_installment, datetime.date(2025, 1, 31))
+
+        self.assertEqual(rows[0]["interest"], Decimal("83.33"))
+        self.assertEqual(rows[1]["due_date"], datetime.date(2025, 2, 28))
+        self.assertEqual(rows[2]["due_date"], datetime.date(2025, 3, 31))
+        self.assertEqual(sum(row["principal"] for row in rows), amount)
+        self.assertEqual(sum(row["interest"] for row in rows), pricing.total_interest)
+        self.assertEqual(rows[-1]["balance"], Decimal("0.00"))
+
+    def test_batch_schedule_matches_single_loan_schedule(self):
+        terms = self.random_terms(300, seed=11)
+        amounts, rates, tenures = zip(*terms)
+        priced = amortization.price_batch(amounts, rates, tenures)
+        principal, interest, balance = amortization.schedule_batch(
+            [amortization.to_paisa(a) for a in amounts],
+            [amortization.to_basis_points(r) for r in rates],
+            tenures,
+            priced["monthly_installment"],
+        )
+
+        for i, (amount, rate, tenure) in enumerate(terms):
+            rows = amortization.schedule(
+                amount, rate, tenure, amortization.from_paisa(priced["monthly_installment"][i]), datetime.date.today()
+            )
+            self.assertEqual([amortization.to_paisa(row["principal"]) for row in rows], list(principal[i, :tenure]))
+            self.assertEqual([amortization.to_paisa(row["interest"]) for row in rows], list(interest[i, :tenure]))
+            self.assertEqual([amortization.to_paisa(row["balance"]) for row in rows], list(balance[i, :tenure]))
+            self.assertFalse(np.any(principal[i, tenure:]))
+
+
+class ScheduleCacheTests(TestCase):
+    def setUp(self):
+        schedule_cache.clear()
+        self.user = make_user()
+
+    def test_lru_eviction_and_counters(self):
+        cache = ScheduleCache(maxsize=2)
+        cache.get_or_create("a", lambda: 1)
+        cache.get_or_create("b", lambda: 2)
+        cache.get_or_create("a", lambda: 1)
+        cache.get_or_create("c", lambda: 3)  # evicts "b", the least recently used
+
+        self.assertEqual(cache.get_or_create("b", lambda: "rebuilt"), "rebuilt")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 4, "size": 2, "maxsize": 2})
+
+    def test_loans_with_identical_terms_share_a_schedule(self):
+        first, second = make_loan(self.user), make_loan(self.user)
+
+        self.assertIs(first.generate_payment_schedule(), second.generate_payment_schedule())
+        self.assertEqual(schedule_cache.stats()["hits"], 1)
+
+    def test_the_stored_emi_is_part_of_the_key(self):
+        first, second = make_loan(self.user), make_loan(self.user)
+        second.monthly_installment += 1
+
+        self.assertIsNot(first.generate_payment_schedule(), second.generate_payment_schedule())
+        self.assertEqual(second.generate_payment_schedule()[0]["amount"], second.monthly_installment)
+
+
+class InstallmentLedgerTests(TestCase):
+    def setUp(self):
+        loan_cache.payload_cache().clear()
+        self.user = make_user()
+        self.admin = make_user("admin", is_staff=True)
+        self.client = APIClient()
+
+    def create_loan(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse("add-loan"), {"amount": "10000", "tenure": 12, "interest_rate": "10"})
+        self.assertEqual(response.status_code, 201)
+        return Loan.objects.latest("id")
+
+    def test_create_persists_the_ledger(self):
+        loan = self.create_loan()
+        installments = list(loan.installments.order_by("installment_no"))
+
+        self.assertEqual(len(installments), 12)
+        self.assertEqual(installments[0].due_date, loan.next_due_date)
+        self.assertEqual(sum(i.interest for i in installments), loan.total_interest)
+        self.assertEqual(sum(i.principal for i in installments), loan.amount)
+
+    def test_detail_reads_schedule_from_the_ledger(self):
+        loan = self.create_loan()
+        response = self.client.get(reverse("loan-detail", args=[loan.id]))
+
+        schedule = response.data["payment_schedule"]
+        self.assertEqual(schedule[0]["due_date"], loan.next_due_date)
+        self.assertEqual(schedule[-1]["balance"], Decimal("0.00"))
+        self.assertEqual(schedule[0]["status"], Installment.PENDING)
+
+    def test_installments_due_this_week(self):
+        loan = self.create_loan()
+        Installment.objects.filter(loan=loan, installment_no=1).update(due_date=datetime.date.today())
+        loan.installments.filter(installment_no=2).update(status=Installment.PAID, due_date=datetime.date.today())
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse("admin-installments-due"))
+
+        self.assertEqual([row["installment_no"] for row in response.data["results"]], [1])
+
+        response = self.client.get(reverse("admin-installments-due"), {"days": 999999999})  # Clamped, not a 500
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["installment_no"], 1)
+
+
+    def test_repricing_rewrites_the_ledger(self):
+        loan = self.create_loan()
+        Loan.objects.filter(id=loan.id).update(monthly_installment=Decimal("900.00"))  # Drifted EMI and ledger
+        loan.installments.update(amount=Decimal("900.00"))
+        loan.installments.filter(installment_no=1).update(status=Installment.PAID, amount_paid=Decimal("900.00"))
+        Loan.objects.filter(id=loan.id).update(amount_paid=Decimal("900.00"))
+        call_command("reprice_loans", stdout=io.StringIO())
+
+        loan.refresh_from_db()
+        installments = list(loan.installments.order_by("installment_no"))
+        self.assertNotEqual(loan.monthly_installment, Decimal("900.00"))
+        self.assertEqual(sum(i.amount for i in installments), loan.total_amount)
+        self.assertEqual(sum(i.principal for i in installments), loan.amount)
+        self.assertEqual(sum(i.amount_paid for i in installments), loan.amount_paid)
+        self.assertEqual([i.status for i in installments[:2]], [Installment.PAID, Installment.PENDING])
+        self.assertEqual(installments[1].amount_paid, Decimal("900.00") - loan.monthly_installment)
+
+
+class BulkOriginationTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.rows = [
+            {"amount": "10000", "tenure": 12, "interest_rate": "10"},
+            {"amount": "500", "tenure": 12, "interest_rate": "10"},  # below the minimum amount
+            {"amount": "25000", "tenure": 6, "interest_rate": "12.5"},
+        ]
+
+    def test_json_array_inserts_valid_rows_and_reports_errors(self):
+        response = self.client.post(reverse("bulk-add-loans"), self.rows, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [1])
+        self.assertIn("amount", response.data["errors"][0]["errors"])
+
+        for loan in Loan.objects.filter(user=self.user):
+            expected = amortization.price_loan(loan.amount, loan.interest_rate, loan.tenure)
+            self.assertEqual(loan.monthly_installment, expected.monthly_installment)
+            self.assertEqual(loan.installments.count(), loan.tenure)
+            self.assertEqual(sum(i.interest for i in loan.installments.all()), loan.total_interest)
+
+    def test_ndjson_stream(self):
+        body = "\n".join(json.dumps(row) for row in self.rows[::2])
+        response = self.client.post(reverse("bulk-add-loans"), body, content_type="application/x-ndjson")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+
+    def test_atomic_mode_rejects_the_whole_batch(self):
+        response = self.client.post(reverse("bulk-add-loans") + "?atomic=true", self.rows, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Loan.objects.exists())
+
+    def test_single_create_writes_the_loan_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("add-loan"), self.rows[0], format="json")
+
+        loan_writes = [q for q in queries if 'LBE_loan"' in q["sql"] and not q["sql"].startswith("SELECT")]
+        self.assertEqual(len(loan_writes), 1)
+
+
+class LoanExportTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user("admin", is_staff=True))
+        self.active = make_loan(self.user)
+        self.closed = make_loan(self.user, amount="20000.00")
+        self.closed.foreclose_loan()
+
+    def export(self, **params):
+        response = self.client.get(reverse("admin-loan-export"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_export_with_status_filter(self):
+        lines = self.export(status="active").splitlines()
+
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(row["id"], self.active.id)
+        self.assertEqual(row["total_amount"], str(self.active.total_amount))
+
+    def test_csv_export_with_created_range(self):
+        today = datetime.date.today()
+        rows = self.export(output="csv", created_after=today.isoformat()).splitlines()
+        self.assertEqual(rows[0].split(",")[:3], ["id", "user_id", "amount"])
+        self.assertEqual(len(rows), 3)
+
+        self.assertEqual(len(self.export(output="csv", created_before=today.isoformat()).splitlines()), 1)
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.client.get(reverse("admin-loan-export"), {"output": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("admin-loan-export"), {"created_after": "soon"}).status_code, 400)
+
+
+class OutboxTests(TestCase):
+    def register(self):
+        response = APIClient().post(reverse("register"), {
+            "username": "bob", "email": "bob@example.com", "password": "s3cret-pass",
+        })
+        self.assertEqual(response.status_code, 201)
+
+    def test_registration_only_enqueues(self):
+        self.register()
+
+        self.assertEqual(len(mail.outbox), 0)
+        message = OutboundEmail.objects.get()
+        self.assertEqual(message.recipients, ["bob@example.com"])
+        self.assertIn(CustomUser.objects.get(username="bob").otp, message.body)
+
+    def test_worker_drains_the_queue(self):
+        self.register()
+        outbox.enqueue_email("Hello", "Body", ["carol@example.com"])
+
+        call_command("drain_outbox", stdout=io.StringIO())
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.SENT).exists())
+
+    def test_failed_delivery_backs_off_then_gives_up(self):
+        message = outbox.enqueue_email("Hello", "Body", ["carol@example.com"])
+        with mock.patch("django.core.mail.EmailMessage.send", side_effect=OSError("connection refused")):
+            self.assertEqual(outbox.deliver_pending(max_attempts=2), (0, 1))
+            message.refresh_from_db()
+            self.assertEqual(message.status, OutboundEmail.PENDING)
+            self.assertGreater(message.next_attempt_at, message.created_at)
+            self.assertEqual(outbox.deliver_pending(max_attempts=2), (0, 0))  # Not due yet
+
+            OutboundEmail.objects.update(next_attempt_at=message.created_at)
+            self.assertEqual(outbox.deliver_pending(max_attempts=2), (0, 1))
+
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboundEmail.FAILED, 2))
+        self.assertIn("connection refused", message.last_error)
+
+    def test_messages_are_leased_before_sending(self):
+        message = outbox.enqueue_email("Hello", "Body", ["carol@example.com"])
+        seen = []
+
+        def send(email):
+            seen.append(OutboundEmail.objects.values_list("attempts", "next_attempt_at").get(pk=message.pk))
+            return 1
+
+        with mock.patch("django.core.mail.EmailMessage.send", autospec=True, side_effect=send):
+            self.assertEqual(outbox.deliver_pending(), (1, 0))
+
+        attempts, lease_until = seen[0]
+        self.assertEqual(attempts, 1)  # The claim was saved before the mail server was contacted
+        self.assertGreater(lease_until, timezone.now() + datetime.timedelta(seconds=outbox.LEASE_SECONDS - 60))
+        self.assertEqual(outbox.deliver_pending(), (0, 0))
+
+    def test_expired_otp_emails_are_dropped(self):
+        self.register()
+        OutboundEmail.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+
+        self.assertEqual(outbox.deliver_pending(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.EXPIRED)
+
+    def test_no_retry_is_scheduled_past_expiry(self):
+        message = outbox.enqueue_email("Code", "123456", ["carol@example.com"],
+                                       expires_at=timezone.now() + datetime.timedelta(seconds=10))
+        with mock.patch("django.core.mail.EmailMessage.send", side_effect=OSError("connection refused")):
+            self.assertEqual(outbox.deliver_pending(), (0, 1))  # First retry would be 30s out
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundEmail.EXPIRED)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        loan_cache.payload_cache().clear()
+        self.user = make_user()
+        self.admin = make_user("admin", is_staff=True)
+        self.client = APIClient()
+        self.loan = self.create_loans(self.user, 1)[0]
+
+    def create_loans(self, user, count):
+        return Loan.originate_batch(user, [
+            {"amount": Decimal("10000"), "tenure": 12, "interest_rate": Decimal("10")} for _ in range(count)
+        ])
+
+    def add_loans_for_many_users(self):
+        for i in range(5):
+            self.create_loans(make_user(f"borrower{i}"), 3)
+        self.create_loans(self.user, 5)
+
+    def test_register(self):
+        counter = iter(range(100))
+
+        def register():
+            n = next(counter)
+            response = self.client.post(reverse("register"), {
+                "username": f"new{n}", "email": f"new{n}@example.com", "password": "s3cret-pass",
+            })
+            self.assertEqual(response.status_code, 201)
+
+        self.assertQueryBudget(5, register, grow=self.add_loans_for_many_users)
+
+    def test_login(self):
+        def login():
+            response = self.client.post(reverse("token_obtain_pair"), {"username": "alice", "password": "s3cret-pass"})
+            self.assertEqual(response.status_code, 200)
+
+        self.assertQueryBudget(1, login, grow=self.add_loans_for_many_users)
+
+    def test_list_and_detail(self):
+        self.client.force_authenticate(self.user)
+        self.assertQueryBudget(1, lambda: self.client.get(reverse("list-loans")), grow=self.add_loans_for_many_users)
+        self.assertQueryBudget(2, lambda: self.client.get(reverse("list-loans"), {"expand": "schedule"}))
+        self.assertQueryBudget(3, lambda: self.client.get(reverse("loan-detail", args=[self.loan.id])))  # Version + loan + ledger
+        self.assertQueryBudget(1, lambda: self.client.get(reverse("loan-detail", args=[self.loan.id])))  # Cached payload
+
+    def test_admin_list(self):
+        self.client.force_authenticate(self.admin)
+        self.assertQueryBudget(1, lambda: self.client.get(reverse("admin-loan-list")), grow=self.add_loans_for_many_users)
+
+    def test_admin_changelist(self):
+        self.admin.is_superuser = True
+        self.admin.save()
+        self.client.force_login(self.admin)
+
+        def changelist():
+            self.assertEqual(self.client.get(reverse("admin:LBE_loan_changelist")).status_code, 200)
+
+        self.assertQueryBudget(6, changelist, grow=self.add_loans_for_many_users)
+
+    def test_foreclose(self):
+        self.client.force_authenticate(self.user)
+        loans = iter(self.create_loans(self.user, 3))
+
+        def foreclose():
+            response = self.client.put(reverse("loan-foreclosure", args=[next(loans).id]))
+            self.assertEqual(response.status_code, 200)
+
+        foreclose()  # Creates the CLOSED portfolio bucket; later foreclosures only bump it
+        self.assertQueryBudget(5, foreclose, grow=self.add_loans_for_many_users)
+
+
+class VerifyOTPTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = make_user("dave")
+        self.user.is_verified = False
+        self.user.otp = "123456"
+        self.user.otp_created_at = timezone.now()
+        self.user.save()
+
+    def verify(self, username_or_email, otp="123456"):
+        return APIClient().post(reverse("verify-email"), {"username_or_email": username_or_email, "otp": otp})
+
+    def test_verifies_by_case_insensitive_email_with_one_lookup(self):
+        def verify():
+            self.assertEqual(self.verify("DAVE@Example.com").status_code, 200)
+
+        self.assertQueryBudget(2, verify)  # one SELECT, one UPDATE
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+        self.assertIsNone(self.user.otp)
+
+    def test_username_match_wins_over_another_accounts_email(self):
+        other = make_user("someone")
+        other.email = "dave"
+        other.save()
+
+        self.assertEqual(self.verify("dave").status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+
+    def test_rejects_wrong_otp_and_unknown_user(self):
+        self.assertIn("otp", self.verify("dave", otp="000000").data)
+        self.assertIn("username_or_email", self.verify("nobody").data)
+
+    def plan(self, lookup):
+        """Query plan of the single query `lookup()` runs."""
+        with CaptureQueriesContext(connection) as queries:
+            lookup()
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")  # A tiny test table would be scanned anyway
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {queries.captured_queries[-1]['sql']}")
+            return " ".join(str(column) for row in cursor.fetchall() for column in row)
+
+    def test_email_lookups_use_the_case_insensitive_index(self):
+        plans = [
+            self.plan(lambda: CustomUser.find_by_username_or_email("DAVE@Example.com")),
+            self.plan(lambda: RegisterSerializer().validate_email("Nobody@Example.com")),
+        ]
+        for plan in plans:
+            self.assertIn("lbe_customuser_email_ci_uniq", plan)
+
+    def test_register_rejects_duplicate_email_in_any_case(self):
+        response = APIClient().post(reverse("register"), {
+            "username": "dave2", "email": "Dave@EXAMPLE.com", "password": "s3cret-pass",
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("email", response.data)
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_user()
+        self.now = 1_000_000 * 60.0  # Start of a minute window
+        timer = mock.patch("LBE.throttling.SlidingWindowThrottle.timer", side_effect=lambda: self.now)
+        timer.start()
+        self.addCleanup(timer.stop)
+
+    def login(self, username="alice", password="wrong", ip="10.0.0.1"):
+        return APIClient().post(reverse("token_obtain_pair"), {"username": username, "password": password}, REMOTE_ADDR=ip)
+
+    def test_username_limit_rejects_before_hashing(self):
+        for i in range(5):
+            self.assertEqual(self.login("Alice", ip=f"10.0.0.{i}").status_code, 401)
+        with mock.patch("LBE.views.authenticate") as authenticate:
+            response = self.login(password="s3cret-pass", ip="10.0.1.1")
+        authenticate.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertEqual(self.login("bob", ip="10.0.1.1").status_code, 401)  # Other accounts are unaffected
+
+    @override_settings(LBE_THROTTLE_RATES={"login_ip": "3/min", "login_username": None})
+    def test_ip_limit_spans_usernames(self):
+        statuses = [self.login(f"user{i}").status_code for i in range(4)]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+        self.assertEqual(self.login(ip="10.0.0.2").status_code, 401)
+
+    @override_settings(LBE_THROTTLE_RATES={"login_ip": "2/min", "login_username": None})
+    def test_spoofed_forwarded_for_does_not_get_a_new_bucket(self):
+        statuses = [
+            APIClient().post(reverse("token_obtain_pair"), {"username": f"user{i}", "password": "wrong"},
+                             REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR=f"203.0.113.{i}").status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [401, 401, 429])
+
+    @override_settings(LBE_THROTTLE_RATES={"login_ip": "2/min", "login_username": None})
+    def test_behind_a_trusted_proxy_the_proxy_supplied_address_counts(self):
+        def login(forwarded_for):
+            return APIClient().post(reverse("token_obtain_pair"), {"username": "alice", "password": "wrong"},
+                                    REMOTE_ADDR="10.9.9.9", HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}):
+            # Whatever the client prepends, the entry our proxy appended identifies it
+            self.assertEqual([login(f"198.51.100.{i}, 203.0.113.7") for i in range(3)], [401, 401, 429])
+            self.assertEqual(login("203.0.113.8"), 401)
+
+    @override_settings(LBE_THROTTLE_RATES={"login_ip": "10/min"})
+    def test_window_slides(self):
+        self.now += 50
+        for i in range(10):
+            self.assertEqual(self.login(f"user{i}").status_code, 401)
+        self.assertEqual(self.login().status_code, 429)
+
+        self.now += 40  # 30s into the next window: half of the previous 10 still count
+        statuses = [self.login(f"next{i}").status_code for i in range(6)]
+        self.assertEqual(statuses, [401] * 5 + [429])
+
+    def test_otp_guesses_are_limited_per_account(self):
+        user = make_user("dave")
+        user.is_verified, user.otp, user.otp_created_at = False, "123456", timezone.now()
+        user.save()
+        spellings = ["dave", "DAVE@example.com", " dave@Example.com", "dave@example.com ", "Dave@EXAMPLE.COM"]
+        for i, identifier in enumerate(spellings):  # The username and any spelling of the email share a budget
+            response = APIClient().post(reverse("verify-email"), {"username_or_email": identifier, "otp": f"00000{i}"},
+                                        REMOTE_ADDR=f"10.0.0.{i}")
+            self.assertEqual(response.status_code, 400)
+        response = APIClient().post(reverse("verify-email"), {"username_or_email": "dave@example.com", "otp": "123456"})
+        self.assertEqual(response.status_code, 429)
+        user.refresh_from_db()
+        self.assertFalse(user.is_verified)
+
+
+@override_settings(LBE_PBKDF2_ITERATIONS=1000)
+class PasswordHashingPolicyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+
+    def login(self):
+        response = APIClient().post(reverse("token_obtain_pair"), {"username": "alice", "password": "s3cret-pass"})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        return self.user.password
+
+    def test_new_passwords_use_the_configured_cost(self):
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+
+    def test_login_rehashes_to_a_higher_or_lower_cost(self):
+        with self.settings(LBE_PBKDF2_ITERATIONS=2000):
+            self.assertTrue(self.login().startswith("pbkdf2_sha256$2000$"))
+        with self.settings(LBE_PBKDF2_ITERATIONS=500):
+            self.assertTrue(self.login().startswith("pbkdf2_sha256$500$"))
+            unchanged = self.user.password
+            self.assertEqual(self.login(), unchanged)  # Already at the policy: no write
+
+    @override_settings()
+    def test_bench_hashers_defaults_to_djangos_iterations(self):
+        del settings.LBE_PBKDF2_ITERATIONS
+        out = io.StringIO()
+        call_command("bench_hashers", "--budget-ms", "5", "--repeat", "1", "--processes", "0", stdout=out)
+        self.assertIn(f"configured {PBKDF2PasswordHasher.iterations:,} iterations", out.getvalue())
+
+    def test_switching_to_scrypt_migrates_on_login(self):
+        hashers = ["LBE.hashers.TunedScryptPasswordHasher", "LBE.hashers.TunedPBKDF2PasswordHasher"]
+        with self.settings(PASSWORD_HASHERS=hashers, LBE_SCRYPT_WORK_FACTOR=2 ** 10):
+            self.assertTrue(self.login().startswith("scrypt$"))
+            self.assertTrue(self.user.check_password("s3cret-pass"))
+        self.assertTrue(self.login().startswith("pbkdf2_sha256$1000$"))  # And back again
+
+
+class PaymentPostingTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.loan = Loan.originate_batch(self.user, [
+            {"amount": Decimal("10000"), "tenure": 12, "interest_rate": Decimal("10")},
+        ])[0]
+
+    def pay(self, amount):
+        return self.client.post(reverse("loan-payment", args=[self.loan.id]), {"amount": amount})
+
+    def test_payment_rolls_due_date_and_allocates_installments(self):
+        emi = self.loan.monthly_installment
+        response = self.pay(str(emi * 2 + 10))
+
+        self.assertEqual(response.status_code, 201)
+        self.loan.refresh_from_db()
+        installments = list(self.loan.installments.order_by("installment_no"))
+        self.assertEqual(self.loan.amount_paid, emi * 2 + 10)
+        self.assertEqual(self.loan.next_due_date, installments[2].due_date)
+        self.assertEqual(self.loan.version, 1)
+        self.assertEqual([i.status for i in installments[:3]], [Installment.PAID, Installment.PAID, Installment.PENDING])
+        self.assertEqual(installments[2].amount_paid, Decimal("10.00"))
+        self.assertEqual(self.loan.payments.get().amount_paid_after, emi * 2 + 10)
+
+    def test_overpayment_is_refused_and_full_payment_closes(self):
+        response = self.pay(str(self.loan.total_amount + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data), ["amount"])
+
+        self.assertEqual(self.pay(str(self.loan.total_amount)).status_code, 201)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.status, "CLOSED")
+        self.assertFalse(self.loan.installments.exclude(status=Installment.PAID).exists())
+        self.assertEqual(self.pay("1").data, {"error": "Loan is already closed."})
+
+    def test_paying_arrears_clears_them_at_once(self):
+        emi, today = self.loan.monthly_installment, datetime.date.today()
+        for n, days_late in [(1, 40), (2, 10)]:
+            self.loan.installments.filter(installment_no=n).update(due_date=today - datetime.timedelta(days=days_late))
+        call_command("accrue_loans", "--workers", "1", stdout=io.StringIO())
+        installments = list(self.loan.installments.order_by("installment_no"))
+
+        self.assertEqual(self.pay(str(emi)).status_code, 201)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.overdue_since, installments[1].due_date)
+        self.assertEqual(self.loan.overdue_amount, emi)
+        self.assertEqual(self.loan.next_due_date, installments[2].due_date)  # Not installment 2, already past
+
+        self.assertEqual(self.pay(str(emi)).status_code, 201)
+        self.loan.refresh_from_db()
+        self.assertIsNone(self.loan.overdue_since)
+        self.assertEqual(self.loan.overdue_amount, Decimal("0.00"))
+        self.assertEqual(self.loan.next_due_date, installments[2].due_date)
+
+    def test_foreclosure_refuses_a_stale_loan(self):
+        stale = Loan.objects.get(pk=self.loan.pk)
+        self.loan.post_payment("100")
+
+        self.assertIn("error", stale.foreclose_loan())
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).status, "ACTIVE")
+
+
+class LoanAdminTests(TestCase):
+    def setUp(self):
+        loan_cache.payload_cache().clear()
+        self.user = make_user()
+        self.loan = Loan.originate_batch(self.user, [
+            {"amount": Decimal("10000"), "tenure": 12, "interest_rate": Decimal("10")},
+        ])[0]
+        admin_user = make_user("admin", is_staff=True)
+        admin_user.is_superuser = True
+        admin_user.save()
+        self.client.force_login(admin_user)
+        self.url = reverse("admin:LBE_loan_change", args=[self.loan.id])
+
+    def edit(self, version, **fields):
+        data = {"user": self.user.id, "version": version, "overdue_amount": "0", "penalty_accrued": "0", **fields}
+        return self.client.post(self.url, data)
+
+    def test_terms_are_read_only(self):
+        response = self.edit(0, amount="99999", interest_rate="1", penalty_accrued="5")
+        self.assertEqual(response.status_code, 302)
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.amount, self.loan.interest_rate), (Decimal("10000.00"), Decimal("10.00")))
+        self.assertEqual((self.loan.penalty_accrued, self.loan.version), (Decimal("5.00"), 1))
+        self.assertEqual(portfolio.drift(), [])
+
+    def test_an_edit_never_overwrites_a_payment_posted_meanwhile(self):
+        self.assertContains(self.client.get(self.url), 'name="version" value="0"')
+        self.loan.post_payment("500.00")
+
+        response = self.edit(0, penalty_accrued="5")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "changed while you were editing it")
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.amount_paid, self.loan.penalty_accrued), (Decimal("500.00"), Decimal("0.00")))
+
+        self.assertEqual(self.edit(1, penalty_accrued="5").status_code, 302)
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.amount_paid, self.loan.version), (Decimal("500.00"), 2))
+
+
+class PaymentConcurrencyTests(TransactionTestCase):
+    """Hammers one loan from many threads and checks no payment is lost or overpaid."""
+    threads = 8
+    payments_per_thread = 20
+
+    def test_concurrent_payments_keep_balances_consistent(self):
+        user = make_user()
+        loan = Loan.originate_batch(user, [{"amount": Decimal("10000"), "tenure": 12, "interest_rate": Decimal("10")}])[0]
+        accepted, rejected = [], []
+
+        def worker():
+            try:
+                for _ in range(self.payments_per_thread):
+                    while True:
+                        try:
+                            result = Loan.objects.get(pk=loan.pk).post_payment("100.00")
+                            break
+                        except OperationalError:  # SQLite's shared in-memory test DB reports lock contention
+                            time.sleep(0.001)
+                    (rejected if "error" in result else accepted).append(result)
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+
+        loan.refresh_from_db()
+        expected_accepted = int((loan.total_amount // 100))  # 100.00 payments that fit under the total
+        self.assertEqual(len(accepted), expected_accepted)
+        self.assertEqual(len(accepted) + len(rejected), self.threads * self.payments_per_thread)
+        self.assertEqual(loan.amount_paid, Decimal("100.00") * expected_accepted)
+        self.assertEqual(loan.payments.aggregate(total=Sum("amount"))["total"], loan.amount_paid)
+        self.assertEqual(loan.version, expected_accepted)
+        self.assertEqual(sorted(result["amount_paid"] for result in accepted),
+                         [Decimal("100.00") * n for n in range(1, expected_accepted + 1)])
+
+
+class CachedJWTAuthenticationTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        loan_cache.payload_cache().clear()
+        self.user = make_user()
+        self.loan = make_loan(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {LoanRefreshToken.for_user(self.user).access_token}")
+
+    def test_login_token_carries_authorization_claims(self):
+        response = self.client.post(reverse("token_obtain_pair"), {"username": "alice", "password": "s3cret-pass"})
+        access = LoanRefreshToken(response.data["refresh"]).access_token
+        self.assertEqual((access["is_staff"], access["is_verified"], access["is_active"]), (False, True, True))
+
+    def test_warm_requests_skip_the_user_query(self):
+        self.assertQueryBudget(2, lambda: self.client.get(reverse("list-loans")))  # Cold: user + loans
+        self.assertQueryBudget(1, lambda: self.client.get(reverse("list-loans")))
+        self.assertQueryBudget(3, lambda: self.client.get(reverse("loan-detail", args=[self.loan.id])))
+        self.assertQueryBudget(1, lambda: self.client.get(reverse("loan-detail", args=[self.loan.id])))
+
+    def test_user_changes_invalidate_the_snapshot(self):
+        self.assertEqual(self.client.get(reverse("list-loans")).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("list-loans")).status_code, 401)
+
+    def test_snapshot_users_are_read_only(self):
+        self.client.get(reverse("list-loans"))
+        request = self.client.get(reverse("list-loans")).wsgi_request
+        with self.assertRaises(RuntimeError):
+            request.user.save()
+
+
+class PortfolioTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.admin = make_user("admin", is_staff=True)
+        self.client = APIClient()
+
+    def add_loan(self, amount, tenure):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse("add-loan"), {"amount": amount, "tenure": tenure, "interest_rate": 12})
+        self.assertEqual(response.status_code, 201)
+        return Loan.objects.latest("id")
+
+    def summary(self):
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            return self.client.get(reverse("admin-portfolio")).data["data"]
+
+    def test_outstanding_split_follows_the_schedule(self):
+        emi = amortization.to_paisa(amortization.price_loan(Decimal("10000"), Decimal("12"), 12).monthly_installment)
+        rows = amortization.schedule(Decimal("10000"), Decimal("12"), 12, amortization.from_paisa(emi), datetime.date.today())
+        paid = [0, emi, 3 * emi, 3 * emi + 50, 3 * emi + 10000, 12 * emi]
+        principal, interest = amortization.outstanding_batch([1000000] * 6, [1200] * 6, [12] * 6, [emi] * 6, paid)
+
+        self.assertEqual(principal[0], 1000000)
+        self.assertEqual(principal[2], amortization.to_paisa(rows[2]["balance"]))
+        self.assertEqual(principal[3], principal[2])  # Part-payment below the interest due only settles interest
+        self.assertEqual(principal[4], principal[2] - (10000 - amortization.to_paisa(rows[3]["interest"])))
+        self.assertEqual((principal[5], interest[5]), (0, 0))
+        np.testing.assert_array_equal(principal + interest, 12 * emi - np.array(paid))
+
+    def test_snapshot_tracks_every_write_path(self):
+        first = self.add_loan(10000, 12)
+        Loan.originate_batch(self.user, [{"amount": Decimal("5000"), "tenure": 6, "interest_rate": Decimal("9")}] * 2)
+        self.assertEqual(portfolio.drift(), [])
+
+        self.client.post(reverse("loan-payment", args=[first.id]), {"amount": "1500.00"})
+        self.assertEqual(portfolio.drift(), [])
+        self.client.put(reverse("loan-foreclosure", args=[first.id]))
+        self.assertEqual(portfolio.drift(), [])
+
+        data = self.summary()
+        self.assertEqual(data["totals"]["loan_count"], 3)
+        self.assertEqual(data["by_status"]["CLOSED"]["loan_count"], 1)
+        self.assertEqual(data["by_status"]["CLOSED"]["outstanding_principal"], 0)
+        self.assertEqual(data["by_tenure_bucket"]["3-6"]["principal"], Decimal("10000.00"))
+        self.assertEqual(sum(rung["loan_count"] for rung in data["maturity_ladder"]), 2)
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.delete(reverse("admin-loan-delete", args=[first.id])).status_code, 204)
+        self.assertEqual(portfolio.drift(), [])
+        self.assertEqual(self.summary()["totals"]["loan_count"], 2)
+
+    def test_check_reports_drift_and_rebuild_repairs_it(self):
+        self.add_loan(20000, 24)
+        Loan.objects.all().delete()  # Bypasses the hooks
+        with self.assertRaises(CommandError):
+            call_command("rebuild_portfolio", "--check", stdout=io.StringIO())
+
+        call_command("rebuild_portfolio", stdout=io.StringIO())
+        call_command("rebuild_portfolio", "--check", stdout=io.StringIO())
+        self.assertFalse(PortfolioSnapshot.objects.exists())
+
+
+class PortfolioRebuildConcurrencyTests(TransactionTestCase):
+    def test_a_payment_during_a_rebuild_is_not_lost(self):
+        user = make_user()
+        loan = Loan.originate_batch(user, [{"amount": Decimal("10000"), "tenure": 12, "interest_rate": Decimal("10")}])[0]
+        compute = portfolio.compute
+        payments = []
+
+        def pay():
+            try:
+                while True:
+                    try:
+                        payments.append(Loan.objects.get(pk=loan.pk).post_payment("500.00"))
+                        return
+                    except OperationalError:  # SQLite's shared in-memory test DB reports lock contention
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        def compute_then_pay(*args, **kwargs):
+            totals = compute(*args, **kwargs)
+            thread.start()
+            thread.join(0.3)  # The payment waits for the rebuild instead of landing before the swap
+            return totals
+
+        thread = threading.Thread(target=pay)
+        with mock.patch.object(portfolio, "compute", side_effect=compute_then_pay):
+            portfolio.rebuild()
+        thread.join()
+
+        self.assertNotIn("error", payments[0])
+        self.assertEqual(portfolio.drift(), [])
+
+
+class AccrualTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.loans = Loan.originate_batch(self.user, [
+            {"amount": Decimal("10000"), "tenure": 12, "interest_rate": Decimal("10")} for _ in range(5)
+        ])
+        self.due_dates = list(self.loans[0].installments.order_by("installment_no").values_list("due_date", flat=True))
+        self.as_of = self.due_dates[2] + datetime.timedelta(days=10)  # Three installments missed
+
+    def accrue(self, *args):
+        call_command("accrue_loans", "--as-of", self.as_of.isoformat(), "--workers", "1", "--chunk-size", "2",
+                     *args, stdout=io.StringIO())
+
+    def test_rolls_due_dates_flags_arrears_and_accrues_penalty(self):
+        Loan.objects.get(id=self.loans[1].id).post_payment(self.loans[1].monthly_installment)
+        self.accrue()
+
+        loan = Loan.objects.get(id=self.loans[0].id)
+        emi = amortization.to_paisa(loan.monthly_installment)
+        self.assertEqual(loan.next_due_date, self.due_dates[3])
+        self.assertEqual(loan.overdue_since, self.due_dates[0])
+        self.assertEqual(loan.overdue_amount, amortization.from_paisa(3 * emi))
+        self.assertEqual(loan.penalty_accrued, amortization.from_paisa(sum(  # Each EMI from the end of its own grace
+            self.penalty(emi, (self.as_of - due_date).days - accrual.GRACE_DAYS) for due_date in self.due_dates[:3]
+        )))
+        self.assertEqual(loan.installments.filter(status=Installment.OVERDUE).count(), 3)
+
+        self.assertEqual(Loan.objects.get(id=self.loans[1].id).overdue_since, self.due_dates[1])
+        checkpoint = BatchCheckpoint.objects.get(job="accrue_loans", as_of=self.as_of)
+        self.assertIsNotNone(checkpoint.finished_at)
+        self.assertEqual((checkpoint.last_id, checkpoint.loans_processed), (self.loans[-1].id, 5))
+
+    @staticmethod
+    def penalty(owed_paisa, days):
+        return amortization.penalty(owed_paisa, amortization.to_basis_points(accrual.PENALTY_RATE), days)
+
+    def test_incremental_runs_skip_installments_still_in_grace(self):
+        self.accrue()
+        before = Loan.objects.get(id=self.loans[0].id).penalty_accrued
+        self.as_of = self.due_dates[3] + datetime.timedelta(days=1)  # Fourth EMI missed but within its grace
+        self.accrue()
+
+        loan = Loan.objects.get(id=self.loans[0].id)
+        emi = amortization.to_paisa(loan.monthly_installment)
+        days = (self.as_of - (self.due_dates[2] + datetime.timedelta(days=10))).days
+        self.assertEqual(loan.overdue_amount, amortization.from_paisa(4 * emi))
+        self.assertEqual(loan.penalty_accrued - before, amortization.from_paisa(3 * self.penalty(emi, days)))
+
+    def test_rerunning_a_date_does_not_double_accrue(self):
+        self.accrue()
+        penalties = list(Loan.objects.order_by("id").values_list("penalty_accrued", flat=True))
+        self.accrue("--restart")
+        self.assertEqual(list(Loan.objects.order_by("id").values_list("penalty_accrued", flat=True)), penalties)
+
+    def test_resumes_after_the_checkpoint(self):
+        BatchCheckpoint.objects.create(job="accrue_loans", as_of=self.as_of, last_id=self.loans[1].id, loans_processed=2)
+        self.accrue()
+
+        accrued = set(Loan.objects.filter(last_accrual_date=self.as_of).values_list("id", flat=True))
+        self.assertEqual(accrued, {loan.id for loan in self.loans[2:]})
+        self.assertEqual(BatchCheckpoint.objects.get(as_of=self.as_of).loans_processed, 5)
+
+    def test_chunk_bounds_cover_active_loans_only(self):
+        Loan.objects.get(id=self.loans[4].id).foreclose_loan()
+        ids = [loan.id for loan in self.loans]
+        self.assertEqual(list(accrual.chunk_bounds(chunk_size=2)), [(ids[0], ids[1]), (ids[2], ids[3])])
+
+
+class LoanPayloadCacheTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        loan_cache.payload_cache().clear()
+        self.user = make_user()
+        self.loan = Loan.originate_batch(self.user, [{"amount": Decimal("10000"), "tenure": 12, "interest_rate": Decimal("10")}])[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("loan-detail", args=[self.loan.id])
+
+    def test_conditional_get_answers_304_from_the_version_row(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["ETag"], loan_cache.etag("detail", self.loan.id, 0))
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+    def test_warm_payload_skips_the_serializer(self):
+        first = self.client.get(self.url).json()
+        with mock.patch("LBE.views.LoanSerializer.to_representation") as to_representation:
+            response = self.client.get(self.url)
+        to_representation.assert_not_called()
+        self.assertEqual(response.json(), first)
+
+    def test_mutations_change_the_etag_and_payload(self):
+        etag = self.client.get(self.url)["ETag"]
+        Loan.objects.get(id=self.loan.id).post_payment(self.loan.monthly_installment)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(Decimal(response.json()["amount_paid"]), self.loan.monthly_installment)
+
+        etag = response["ETag"]
+        Loan.objects.get(id=self.loan.id).foreclose_loan()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()["status"], "CLOSED")
+
+    def test_repricing_changes_the_etag_and_payload(self):
+        Loan.objects.filter(id=self.loan.id).update(monthly_installment=Decimal("1.00"))  # Drifted figure
+        etag = self.client.get(self.url)["ETag"]
+        call_command("reprice_loans", stdout=io.StringIO())
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.json()["monthly_installment"]), self.loan.monthly_installment)
+
+    def test_accrual_invalidates_the_payload(self):
+        self.client.get(self.url)
+        as_of = self.loan.next_due_date + datetime.timedelta(days=10)
+        call_command("accrue_loans", "--as-of", as_of.isoformat(), "--workers", "1", stdout=io.StringIO())
+
+        payload = self.client.get(self.url).json()
+        self.assertEqual(Decimal(payload["overdue_amount"]), self.loan.monthly_installment)
+        self.assertEqual(payload["payment_schedule"][0]["status"], Installment.OVERDUE)
+
+    def test_schedule_endpoint(self):
+        url = reverse("loan-schedule", args=[self.loan.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["payment_schedule"]), 12)
+        self.assertNotEqual(response["ETag"], self.client.get(self.url)["ETag"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        self.client.force_authenticate(make_user("bob"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(reverse("loan-schedule", args=[999999])).status_code, 404)
+
+
+class LoanQuoteTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+
+    def quote(self, **grid):
+        return self.client.post(reverse("loan-quote"), grid, format="json")
+
+    def test_quotes_every_combination_without_saving(self):
+        grid = {"amounts": ["1000", "25000.50", "100000"], "tenures": list(range(3, 25)), "interest_rates": ["0.5", "10", "18.25"]}
+        self.assertQueryBudget(0, lambda: self.quote(**grid))
+        response = self.quote(**grid)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 3 * 22 * 3)
+        self.assertFalse(Loan.objects.exists())
+        for row in response.json()["quotes"]:
+            pricing = amortization.price_loan(Decimal(row["amount"]), Decimal(row["interest_rate"]), row["tenure"])
+            self.assertEqual(row["monthly_installment"], str(pricing.monthly_installment))  # Same strings as LoanSerializer
+            self.assertEqual(row["total_interest"], str(pricing.total_interest))
+        self.assertEqual(response.json()["quotes"][1], {**response.json()["quotes"][1], "amount": "1000.00", "tenure": 3, "interest_rate": "10.00"})
+
+    def test_applies_loan_bounds_and_a_grid_limit(self):
+        response = self.quote(amounts=["999"], tenures=[25], interest_rates=["0"])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {"amounts", "tenures", "interest_rates"})
+
+        with self.settings(LBE_QUOTE_MAX_COMBINATIONS=10):
+            response = self.quote(amounts=["1000", "2000"], tenures=[3, 6, 12], interest_rates=["10", "12"])
+        self.assertEqual(response.status_code, 400)
+
+        parse = DecimalField.to_internal_value
+        with mock.patch.object(DecimalField, "to_internal_value", autospec=True, side_effect=parse) as to_internal_value:
+            response = self.quote(amounts=["1000"] * 10001, tenures=[3], interest_rates=["10"])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("amounts", response.data)
+        self.assertEqual(to_internal_value.call_count, 1)  # Only the rate; the amounts were refused on length alone
+
+
+class PrepaymentSimulationTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.loan = Loan.originate_batch(self.user, [{"amount": Decimal("10000"), "tenure": 12, "interest_rate": Decimal("10")}])[0]
+        self.loan = Loan.objects.get(id=self.loan.id)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def simulate(self, **body):
+        return self.client.post(reverse("loan-simulate", args=[self.loan.id]), body, format="json")
+
+    def test_no_prepayment_reproduces_the_schedule(self):
+        emi = amortization.to_paisa(self.loan.monthly_installment)
+        simulated = amortization.simulate_batch([1000000], [1000], [12], [emi], np.zeros((1, 12)))
+        _, interest, balance = amortization.schedule_batch([1000000], [1000], [12], [emi])
+        self.assertEqual(simulated["interest"].tolist(), interest.tolist())
+        self.assertEqual(simulated["balance"].tolist(), balance.tolist())
+
+    def test_reduce_tenure_and_reduce_emi(self):
+        self.loan.post_payment(self.loan.monthly_installment * 3)
+        before = Loan.objects.values().get(id=self.loan.id)
+
+        tenure = self.simulate(prepayments=[{"amount": "3000"}]).data["data"]
+        emi = self.simulate(prepayments=[{"amount": "3000"}], reduce="emi").data["data"]
+
+        self.assertEqual(tenure["current"]["installments_left"], 9)
+        self.assertLess(tenure["simulated"]["installments_left"], 9)
+        self.assertLessEqual(Decimal(tenure["simulated"]["monthly_installment"]), self.loan.monthly_installment)
+        self.assertEqual(emi["simulated"]["installments_left"], 9)
+        self.assertLess(Decimal(emi["simulated"]["monthly_installment"]), self.loan.monthly_installment)
+        self.assertGreater(tenure["simulated"]["interest_saved"], emi["simulated"]["interest_saved"])
+
+        for result in (tenure, emi):
+            schedule = result["simulated"]["payment_schedule"]
+            self.assertEqual(schedule[0]["installment_no"], 4)
+            self.assertEqual(schedule[0]["prepayment"], Decimal("3000.00"))
+            self.assertEqual(sum(row["principal"] + row["prepayment"] for row in schedule), Decimal(result["current"]["outstanding_principal"]))
+            self.assertEqual(schedule[-1]["balance"], Decimal("0.00"))
+            self.assertEqual(result["simulated"]["interest_saved"],
+                             result["current"]["interest_remaining"] - result["simulated"]["interest_payable"])
+        self.assertEqual(Loan.objects.values().get(id=self.loan.id), before)
+
+    def test_foreclosure_on_a_date(self):
+        due_dates = list(self.loan.installments.order_by("installment_no").values_list("due_date", flat=True))
+        on = due_dates[1] + datetime.timedelta(days=10)
+        result = self.simulate(foreclose_on=on.isoformat()).data["data"]["simulated"]
+
+        payoff = result["payoff"]
+        schedule = result["payment_schedule"]
+        self.assertEqual([row["installment_no"] for row in schedule], [1, 2, 3])
+        self.assertEqual(payoff["principal"], schedule[1]["balance"])
+        self.assertEqual(payoff["accrued_interest"], amortization.from_paisa(
+            amortization.daily_interest(amortization.to_paisa(payoff["principal"]), 1000, 10)))
+        self.assertEqual(result["installments_left"], 2)
+        self.assertEqual(self.loan.installments.filter(status=Installment.PENDING).count(), 12)
+
+    def test_rejects_invalid_plans(self):
+        self.assertEqual(self.simulate().status_code, 400)
+        self.assertEqual(self.simulate(foreclose_on="2000-01-01").status_code, 400)
+        self.assertEqual(self.simulate(prepayments=[{"amount": "100", "before_installment": 13}]).status_code, 400)
+        self.loan.foreclose_loan()
+        self.assertEqual(self.simulate(prepayments=[{"amount": "100"}]).data, {"error": "Only active loans can be simulated."})
+        self.client.force_authenticate(make_user("bob"))
+        self.assertEqual(self.simulate(prepayments=[{"amount": "100"}]).status_code, 403)
+
+    def test_campaign_matches_the_single_loan_path(self):
+        Loan.originate_batch(self.user, [
+            {"amount": Decimal(amount), "tenure": tenure, "interest_rate": Decimal("12.5")}
+            for amount, tenure in (("5000", 6), ("50000", 24), ("1000", 3))
+        ])
+        out = io.StringIO()
+        call_command("simulate_prepayments", "--percent", "25", "--reduce", "emi", "--chunk-size", "2", stdout=out, stderr=io.StringIO())
+
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 4)
+        for row in rows:
+            loan = Loan.objects.get(id=row["loan_id"])
+            expected = prepayment.simulate_loan(loan, [(None, Decimal(row["prepayment"]))], reduce="emi")["simulated"]
+            self.assertEqual(Decimal(row["interest_saved"]), expected["interest_saved"])
+            self.assertEqual(Decimal(row["new_monthly_installment"]), expected["monthly_installment"])
+
+
+class LoanBookTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.other = make_user("bob")
+        Loan.originate_batch(self.user, [
+            {"amount": Decimal(amount), "tenure": tenure, "interest_rate": Decimal(rate)}
+            for amount, tenure, rate in (("10000", 12, "10"), ("25000.50", 6, "12.5"), ("1000", 3, "18"))
+        ])
+        Loan.originate_batch(self.other, [{"amount": Decimal("50000"), "tenure": 24, "interest_rate": Decimal("9.75")}])
+        Loan.objects.filter(tenure=6).get().foreclose_loan()
+        Loan.objects.filter(tenure=12).get().post_payment(Decimal("1000"))
+
+    def test_snapshot_matches_the_database(self):
+        book = LoanBook.from_queryset(chunk_size=3)
+        self.assertEqual(len(book), 4)
+        self.assertEqual(book.records.dtype.itemsize, 63)
+        self.assertEqual(book.total("amount"), Loan.objects.aggregate(total=Sum("amount"))["total"])
+        self.assertEqual(book.total("amount_paid"), Loan.objects.aggregate(total=Sum("amount_paid"))["total"])
+
+        active = book.filter(status="ACTIVE", user_id=self.user.id)
+        self.assertEqual(sorted(active["id"].tolist()), sorted(
+            Loan.objects.filter(status="ACTIVE", user=self.user).values_list("id", flat=True)))
+        self.assertEqual(len(book.filter(interest_rate__in=["10", "9.75"], amount__gte="10000")), 2)
+        self.assertEqual(len(book.filter(created_at__lte=timezone.now(), tenure__lt=12)), 2)
+
+    def test_group_by_agrees_with_the_portfolio_aggregates(self):
+        book = LoanBook.from_queryset()
+        expected = {}
+        for (status, bucket, month), measures in portfolio.compute().items():
+            row = expected.setdefault(bucket, {"loan_count": 0, "outstanding": 0})
+            row["loan_count"] += measures["loan_count"]
+            row["outstanding"] += measures["outstanding_principal"] + measures["interest_receivable"]
+        grouped = book.group_by("tenure_bucket", measures=("outstanding",))
+        self.assertEqual(grouped, {
+            bucket: {"loan_count": row["loan_count"], "outstanding": amortization.from_paisa(row["outstanding"])}
+            for bucket, row in expected.items()
+        })
+        self.assertEqual(book.group_by("status", measures=())["CLOSED"], {"loan_count": 1})
+        self.assertEqual(LoanBook.from_queryset(Loan.objects.none()).group_by("status"), {})
+
+    def test_save_and_memory_map(self):
+        book = LoanBook.from_queryset()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.npy")
+            book.save(path)
+            loaded = LoanBook.load(path)
+            self.assertIsInstance(loaded.records, np.memmap)
+            self.assertEqual(loaded.group_by("maturity_month"), book.group_by("maturity_month"))
+            del loaded
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.user = make_user()
+        self.admin = make_user("admin", is_staff=True)
+        make_loan(self.user)
+        self.client = APIClient()
+
+    def scrape(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse("admin-metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode()
+
+    def test_records_per_route_histograms(self):
+        self.client.force_authenticate(self.user)
+        for _ in range(3):
+            self.client.get(reverse("list-loans"))
+        self.client.get(reverse("loan-detail", args=[999]))
+
+        text = self.scrape()
+        series = 'route="api/loans/",method="GET",status="2xx"'
+        self.assertIn("# TYPE lbe_request_duration_seconds histogram", text)
+        self.assertIn(f'lbe_request_duration_seconds_bucket{{{series},le="+Inf"}} 3', text)
+        self.assertIn(f"lbe_request_duration_seconds_count{{{series}}} 3", text)
+        self.assertIn(f"lbe_request_db_queries_sum{{{series}}} 3", text)  # One loan query per page
+        self.assertIn(f"lbe_request_serializer_duration_seconds_count{{{series}}} 3", text)
+        self.assertIn(f"lbe_response_size_bytes_count{{{series}}} 3", text)
+        self.assertIn('route="api/loans/<int:id>/",method="GET",status="4xx"', text)
+
+    def test_only_lbe_routes_are_recorded_and_endpoint_is_admin_only(self):
+        self.client.get("/")
+        self.assertNotIn('route=""', self.scrape())
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse("admin-metrics")).status_code, 403)
+
+
+class BenchmarkReportTests(SimpleTestCase):
+    def test_latency_stats(self):
+        stats = latency_stats([0.001 * n for n in range(1, 101)])  # 1ms .. 100ms
+        self.assertEqual((stats["count"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]), (100, 50.0, 95.0, 99.0))
+        self.assertAlmostEqual(stats["mean_ms"], 50.5)
+
+    def test_compare_flags_only_slowdowns_past_the_threshold(self):
+        baseline = {"http.list": {"p50_ms": 10.0}, "http.detail": {"p50_ms": 4.0}, "http.gone": {"p50_ms": 1.0}}
+        current = {"http.list": {"p50_ms": 13.0}, "http.detail": {"p50_ms": 4.4}, "http.new": {"p50_ms": 1.0}}
+        rows = {row[0]: row for row in compare_results(baseline, current, threshold=0.2)}
+        self.assertEqual(set(rows), {"http.list", "http.detail"})
+        self.assertTrue(rows["http.list"][4])
+        self.assertFalse(rows["http.detail"][4])
+
+
+class AsyncReadEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        loan_cache.payload_cache().clear()
+        self.user = make_user()
+        self.other = make_user("bob")
+        self.loans = Loan.originate_batch(self.user, [
+            {"amount": Decimal("10000"), "tenure": 12, "interest_rate": Decimal("10")} for _ in range(3)
+        ])
+        self.foreign = make_loan(self.other)
+        self.headers = {"Authorization": f"Bearer {LoanRefreshToken.for_user(self.user).access_token}"}
+
+    async def test_list_pages_forward_and_matches_the_sync_payload(self):
+        response = await self.async_client.get(reverse("async-list-loans"), {"page_size": 2}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        self.assertEqual([row["loan_id"] for row in page["results"]], [f"LOAN{self.loans[2].id:03}", f"LOAN{self.loans[1].id:03}"])
+        self.assertNotIn("payment_schedule", page["results"][0])
+
+        response = await self.async_client.get(page["next"], headers=self.headers)
+        self.assertEqual([row["loan_id"] for row in response.json()["results"]], [f"LOAN{self.loans[0].id:03}"])
+        self.assertIsNone(response.json()["next"])
+
+    async def test_detail_and_schedule_enforce_ownership(self):
+        response = await self.async_client.get(reverse("async-loan-detail", args=[self.loans[0].id]), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["payment_schedule"]), 12)
+
+        response = await self.async_client.get(reverse("async-loan-schedule", args=[self.loans[0].id]), headers=self.headers)
+        self.assertEqual(response.json()["payment_schedule"][0]["status"], Installment.PENDING)
+
+        etag = response["ETag"]
+        response = await self.async_client.get(reverse("async-loan-schedule", args=[self.loans[0].id]),
+                                               headers={**self.headers, "If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        foreign = await self.async_client.get(reverse("async-loan-detail", args=[self.foreign.id]), headers=self.headers)
+        missing = await self.async_client.get(reverse("async-loan-schedule", args=[999999]), headers=self.headers)
+        self.assertEqual((foreign.status_code, missing.status_code), (403, 404))
+
+    async def test_requires_a_valid_bearer_token(self):
+        self.assertEqual((await self.async_client.get(reverse("async-list-loans"))).status_code, 401)
+        response = await self.async_client.get(reverse("async-list-loans"), headers={"Authorization": "Bearer nope"})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "token_not_valid")
+        self.assertEqual((await self.async_client.post(reverse("async-list-loans"), headers=self.headers)).status_code, 405)
+
+
+@skipUnless("replica" in settings.DATABASES, "needs the 'replica' alias (LBE_DB_ENGINE=sqlite)")
+@override_settings(LBE_READ_REPLICAS=["replica"], LBE_REPLICA_STICKY_SECONDS=60, LBE_REPLICA_STICKY_CACHE="default")
+class ReadReplicaRoutingTests(TransactionTestCase):
+    """The test replica is a separate, empty database, so rows seen through it prove where a read went."""
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        loan_cache.payload_cache().clear()
+        self.user = make_user()
+        self.loan = make_loan(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def listed_ids(self, name="list-loans"):
+        response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, 200)
+        return [row["loan_id"] for row in response.data["results"]]
+
+    def test_read_views_use_the_replica(self):
+        self.assertEqual(self.listed_ids(), [])
+        self.assertEqual(self.client.get(reverse("loan-detail", args=[self.loan.id])).status_code, 404)
+        self.user.is_staff = True
+        self.user.save(update_fields=["is_staff"])  # Outside a request: pins nobody
+        self.assertEqual(self.listed_ids("admin-loan-list"), [])
+
+        with override_settings(LBE_READ_REPLICAS=[]):
+            self.assertEqual(self.listed_ids(), [f"LOAN{self.loan.id:03}"])
+
+    def test_a_write_pins_the_user_to_the_primary(self):
+        response = self.client.post(reverse("add-loan"), {"amount": "5000", "tenure": 6, "interest_rate": "12"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Loan.objects.using("replica").count(), 0)  # Writes never go to a replica
+
+        created = Loan.objects.latest("id")
+        self.assertEqual(self.listed_ids(), [f"LOAN{created.id:03}", f"LOAN{self.loan.id:03}"])
+        self.assertEqual(self.client.get(reverse("loan-detail", args=[created.id])).status_code, 200)
+
+        other = APIClient()
+        other.force_authenticate(make_user("bob"))
+        self.assertEqual(other.get(reverse("list-loans")).data["results"], [])  # Only the writer is pinned
+
+        cache.clear()  # The sticky window ends
+        self.assertEqual(self.listed_ids(), [])
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        token = db_routers.use_alias("replica")
+        try:
+            self.assertFalse(Loan.objects.exists())
+            with transaction.atomic():
+                self.assertTrue(Loan.objects.exists())
+        finally:
+            db_routers.reset_alias(token)
+
+    async def test_async_reads_follow_the_same_rules(self):
+        headers = {"Authorization": f"Bearer {LoanRefreshToken.for_user(self.user).access_token}"}
+        response = await self.async_client.get(reverse("async-list-loans"), headers=headers)
+        self.assertEqual(response.json()["results"], [])
+
+        await db_routers.apin_to_primary(self.user.pk)
+        response = await self.async_client.get(reverse("async-loan-detail", args=[self.loan.id]), headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def errors(self, check, **overrides):
+        with override_settings(**overrides):
+            return [error.id for error in check()]
+
+    def test_replicas_need_a_cache_every_worker_shares(self):
+        check = db_routers.check_sticky_cache
+        self.assertEqual(self.errors(check, LBE_READ_REPLICAS=[], LBE_REPLICA_STICKY_CACHE="default"), [])
+        self.assertEqual(self.errors(check, LBE_READ_REPLICAS=["replica"], LBE_REPLICA_STICKY_CACHE="default"), ["LBE.E002"])
+        self.assertEqual(self.errors(check, LBE_READ_REPLICAS=["replica"], LBE_REPLICA_STICKY_CACHE="nope"), ["LBE.E001"])
+        self.assertEqual(self.errors(check, LBE_READ_REPLICAS=["replica"], LBE_REPLICA_STICKY_CACHE="replica_pins"), [])
+
+    def test_auth_snapshots_need_a_cache_every_worker_shares(self):
+        check = authentication.check_auth_cache
+        self.assertEqual(self.errors(check, LBE_AUTH_CACHE="default"), ["LBE.E004"])
+        self.assertEqual(self.errors(check, LBE_AUTH_CACHE="nope"), ["LBE.E003"])
+        self.assertEqual(self.errors(check, LBE_AUTH_CACHE="auth_snapshots"), [])
+
+    def test_throttle_counters_need_a_cache_every_worker_shares(self):
+        check = throttling.check_throttle_cache
+        self.assertEqual(self.errors(check, LBE_THROTTLE_CACHE="default"), ["LBE.E006"])
+        self.assertEqual(self.errors(check, LBE_THROTTLE_CACHE="nope"), ["LBE.E005"])
+        self.assertEqual(self.errors(check, LBE_THROTTLE_CACHE="throttle"), [])
@@ -0,0 +1,149 @@
+"""Sliding-window rate limits for the credential endpoints, kept in Django's cache.
+
+DRF runs throttles in `APIView.initial()`, before the handler. A rejected login
+therefore never reaches `authenticate()` and its password hash, and a rejected
+OTP guess is never compared with the stored code.
+
+Each limit is a sliding-window counter. The cache holds one integer per fixed
+window, and the previous window's count is weighted by how much of it still
+overlaps the sliding window. A check costs one `get_many` plus one `incr`,
+whatever the limit, instead of DRF's pickled list of timestamps per client.
+Counters must live in a cache every worker shares, or each worker grants the
+full budget; `check_throttle_cache()` fails the system checks for a
+per-process backend. File or database caches work, no Redis required.
+
+Client IPs come from DRF's `get_ident()`: `REMOTE_ADDR`, or the entry
+`NUM_PROXIES` hops from the right of `X-Forwarded-For` when the app sits
+behind that many trusted proxies. A client-supplied header is never trusted
+on its own.
+
+Rates come from `LBE_THROTTLE_RATES` (DRF syntax, e.g. "5/min"), read on every
+check so they can be changed with `override_settings`. A missing or `None`
+rate disables that scope.
+"""
+import hashlib
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+from .checks import shared_cache_errors
+from .models import CustomUser
+
+DEFAULT_RATES = {
+    "login_ip": "30/min",
+    "login_username": "5/min",
+    "otp_ip": "30/min",
+    "otp_username": "5/hour",  # A 6-digit OTP gets a handful of guesses in its lifetime
+}
+
+
+def check_throttle_cache(app_configs=None, **kwargs):
+    """System check: limits hold across workers only if they all count in one cache."""
+    return shared_cache_errors(
+        "LBE_THROTTLE_CACHE", ("LBE.E005", "LBE.E006"),
+        "every worker grants the full login and OTP budgets on its own",
+    )
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    cache_format = "lbe:throttle:%(scope)s:%(ident)s"
+
+    def __init__(self):
+        pass  # The rate is resolved on every check, not frozen at construction
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "LBE_THROTTLE_CACHE", "default")]
+
+    def get_rate(self):
+        return getattr(settings, "LBE_THROTTLE_RATES", DEFAULT_RATES).get(self.scope)
+
+    def get_ident_value(self, request):
+        raise NotImplementedError
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_value(request)
+        if not ident:
+            return None
+        digest = hashlib.sha256(ident.encode()).hexdigest()[:32]  # Bounded, backend-safe keys
+        return self.cache_format % {"scope": self.scope, "ident": digest}
+
+    def allow_request(self, request, view):
+        self.num_requests, self.duration = self.parse_rate(self.get_rate())
+        if self.num_requests is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        current_key, previous_key = f"{self.key}:{window}", f"{self.key}:{window - 1}"
+        counts = self.cache.get_many([current_key, previous_key])
+        self.current, self.previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+        self.elapsed = self.now - window * self.duration
+
+        if self.previous * (1 - self.elapsed / self.duration) + self.current >= self.num_requests:
+            return False
+        try:
+            self.cache.incr(current_key)
+        except ValueError:  # First hit in this window (or the key just expired)
+            if not self.cache.add(current_key, 1, timeout=2 * self.duration):
+                self.cache.incr(current_key)  # Another request created it first
+        return True
+
+    def wait(self):
+        """Seconds until the weighted count drops below the limit again."""
+        remaining = self.duration - self.elapsed
+        if self.current < self.num_requests and self.previous:
+            # previous * (1 - (elapsed + t) / duration) + current < limit
+            seconds = self.duration * (1 - (self.num_requests - self.current) / self.previous) - self.elapsed
+            return max(1, math.ceil(min(seconds, remaining)))
+        return max(1, math.ceil(remaining + self.duration * (1 - self.num_requests / max(self.current, 1))))
+
+
+class ClientIPThrottle(SlidingWindowThrottle):
+    def get_ident_value(self, request):
+        return self.get_ident(request)
+
+
+class CredentialThrottle(SlidingWindowThrottle):
+    """Keyed on an identifier the client submits (case-folded), so rotating IPs does not help."""
+    field = None
+
+    def get_ident_value(self, request):
+        value = request.data.get(self.field) if hasattr(request.data, "get") else None
+        return value.strip().lower() if isinstance(value, str) else None
+
+
+class LoginIPThrottle(ClientIPThrottle):
+    scope = "login_ip"
+
+
+class LoginUsernameThrottle(CredentialThrottle):
+    scope = "login_username"
+    field = "username"
+
+
+class OTPIPThrottle(ClientIPThrottle):
+    scope = "otp_ip"
+
+
+class OTPUsernameThrottle(CredentialThrottle):
+    """Keyed on the account the identifier resolves to, so its username and every spelling of its email share one budget.
+
+    The lookup is left on the request (`lbe_otp_account`) for `VerifyOTPSerializer`, so it still costs one query.
+    """
+    scope = "otp_username"
+    field = "username_or_email"
+
+    def get_ident_value(self, request):
+        value = request.data.get(self.field) if hasattr(request.data, "get") else None
+        if not isinstance(value, str) or not value.strip():
+            return None
+        value = value.strip()  # As the serializer's CharField sees it
+        user = CustomUser.find_by_username_or_email(value)
+        request.lbe_otp_account = (value, user)
+        return f"user:{user.pk}" if user else f"unknown:{value.lower()}"
@@ -1,9 +1,12 @@
 from django.urls import path
 from .views import (
     RegisterView, VerifyOTPView, CustomLoginView,
-    LoanCreateView, LoanListView, LoanDetailView, LoanForeclosureView,
-    AdminLoanListView, LoanDeleteView
+    LoanCreateView, LoanBulkCreateView, LoanQuoteView, LoanListView, LoanDetailView, LoanScheduleView, LoanForeclosureView,
+    LoanPaymentView, LoanSimulationView,
+    AdminLoanListView, AdminLoanExportView, LoanDeleteView, AdminInstallmentsDueView, AdminPortfolioView,
+    AdminMetricsView
 )
+from .async_views import AsyncLoanListView, AsyncLoanDetailView, AsyncLoanScheduleView
 
 urlpatterns = [
     # ✅ Authentication Endpoints
@@ -13,11 +16,25 @@ urlpatterns = [
 
     # ✅ Loan Management (User)
     path("loans/add/", LoanCreateView.as_view(), name="add-loan"),
+    path("loans/bulk/", LoanBulkCreateView.as_view(), name="bulk-add-loans"),
+    path("loans/quote/", LoanQuoteView.as_view(), name="loan-quote"),
     path("loans/", LoanListView.as_view(), name="list-loans"),
     path("loans/<int:id>/", LoanDetailView.as_view(), name="loan-detail"),
+    path("loans/<int:id>/schedule/", LoanScheduleView.as_view(), name="loan-schedule"),
     path("loans/<int:id>/foreclose/", LoanForeclosureView.as_view(), name="loan-foreclosure"),
+    path("loans/<int:id>/payments/", LoanPaymentView.as_view(), name="loan-payment"),
+    path("loans/<int:id>/simulate/", LoanSimulationView.as_view(), name="loan-simulate"),
+
+    # ✅ Async read paths (served natively under ASGI)
+    path("async/loans/", AsyncLoanListView.as_view(), name="async-list-loans"),
+    path("async/loans/<int:id>/", AsyncLoanDetailView.as_view(), name="async-loan-detail"),
+    path("async/loans/<int:id>/schedule/", AsyncLoanScheduleView.as_view(), name="async-loan-schedule"),
 
     # ✅ Loan Management (Admin)
     path("admin/loans/", AdminLoanListView.as_view(), name="admin-loan-list"),
+    path("admin/loans/export/", AdminLoanExportView.as_view(), name="admin-loan-export"),
     path("admin/loans/<int:id>/delete/", LoanDeleteView.as_view(), name="admin-loan-delete"),
+    path("admin/installments/due/", AdminInstallmentsDueView.as_view(), name="admin-installments-due"),
+    path("admin/portfolio/", AdminPortfolioView.as_view(), name="admin-portfolio"),
+    path("admin/metrics/", AdminMetricsView.as_view(), name="admin-metrics"),
 ]
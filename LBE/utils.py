@@ -1,21 +1,24 @@
+import datetime
 import random
-from django.core.mail import send_mail
+from django.db import transaction
 from django.utils.timezone import now
+from .outbox import enqueue_email
 
 def generate_otp():
     """Generate a 6-digit OTP."""
     return str(random.randint(100000, 999999))
 
 def send_otp_email(user):
-    """Generate and send OTP to the user's email."""
+    """Generate an OTP and queue it for delivery to the user's email (see `drain_outbox`)."""
     otp = generate_otp()
     user.otp = otp
     user.otp_created_at = now()
-    user.save()
-
-    send_mail(
-        subject="Your OTP Code",
-        message=f"Your OTP code is {otp}. It expires in 5 minutes.",
-        from_email="noreply@yourdomain.com",
-        recipient_list=[user.email],
-    )
+    with transaction.atomic():
+        user.save(update_fields=["otp", "otp_created_at"])
+        enqueue_email(
+            subject="Your OTP Code",
+            message=f"Your OTP code is {otp}. It expires in 5 minutes.",
+            from_email="noreply@yourdomain.com",
+            recipient_list=[user.email],
+            expires_at=user.otp_created_at + datetime.timedelta(minutes=5),  # Same window as is_otp_valid()
+        )
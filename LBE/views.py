@@ -1,39 +1,82 @@
 from rest_framework.response import Response
 from rest_framework import status, generics
 from django.contrib.auth import get_user_model
-from .serializers import RegisterSerializer, VerifyOTPSerializer, LoanSerializer
+from .serializers import (
+    RegisterSerializer, VerifyOTPSerializer, LoanSerializer, LoanListSerializer, InstallmentSerializer,
+    PaymentSerializer, LoanQuoteSerializer, LoanSimulationSerializer, schedule_payload
+)
 from .utils import send_otp_email
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import LoanRefreshToken
 from rest_framework.views import APIView
-from .models import Loan
+from rest_framework.parsers import JSONParser
+from rest_framework.exceptions import ValidationError
+from django.conf import settings
+from django.db import transaction
+from .parsers import NDJSONParser
+from . import amortization, loan_cache, metrics, portfolio, prepayment
+from .models import Loan, Installment
 from .permissions import IsAdminUser, IsLoanOwner
+from .db_routers import ReplicaReadMixin
+from .throttling import LoginIPThrottle, LoginUsernameThrottle, OTPIPThrottle, OTPUsernameThrottle
+from .pagination import LoanCursorPagination, InstallmentCursorPagination
+import datetime
+import csv
+import logging
+import numpy as np
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+class LoanListMixin:
+    """Cursor-paginated loan listing; `?expand=schedule` opts into payment schedules."""
+    pagination_class = LoanCursorPagination
+    list_fields = [
+        "id", "amount", "tenure", "interest_rate", "monthly_installment", "total_interest",
+        "total_amount", "amount_paid", "next_due_date", "overdue_since", "overdue_amount", "penalty_accrued",
+        "status", "created_at",
+    ]
+
+    def expand_schedule(self):
+        return "schedule" in self.request.query_params.get("expand", "").split(",")
+
+    def get_serializer_class(self):
+        return LoanSerializer if self.expand_schedule() else LoanListSerializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset).only(*self.list_fields)
+        if self.expand_schedule():
+            queryset = queryset.prefetch_related("installments")
+        return queryset
 
 
 # ✅ Custom Login View
 class CustomLoginView(APIView):
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]  # ✅ Checked before any password hashing
+
     def post(self, request, *args, **kwargs):
         username = request.data.get("username")
         password = request.data.get("password")
 
-        print(f"🔍 Authenticating user: {username}")  
+        logger.debug("Authenticating user %s", username)
         user = authenticate(username=username, password=password)
 
         if not user:
-            print("❌ Authentication failed!")  
+            logger.info("Authentication failed for %s", username)
             return Response({"error": "Invalid username or password"}, status=status.HTTP_401_UNAUTHORIZED)
         if not user.is_verified:
             return Response({"error": "Verify email"}, status=status.HTTP_401_UNAUTHORIZED)
         if not user.is_active:
             return Response({"error": "Your account is inactive. Please verify your email."}, status=status.HTTP_403_FORBIDDEN)
 
-        print("✅ Authentication successful!")  
-
-        refresh = RefreshToken.for_user(user)
+        refresh = LoanRefreshToken.for_user(user)
         return Response({
             "refresh": str(refresh),
             "access": str(refresh.access_token),
@@ -65,28 +108,19 @@ class RegisterView(generics.CreateAPIView):
 # ✅ OTP Verification API
 class VerifyOTPView(generics.GenericAPIView):
     serializer_class = VerifyOTPSerializer  
+    throttle_classes = [OTPIPThrottle, OTPUsernameThrottle]  # ✅ Caps OTP guessing per client and per account
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        username_or_email = serializer.validated_data.get("username_or_email")  
-        otp = serializer.validated_data.get("otp")
-
-        user = User.objects.filter(username=username_or_email).first() or User.objects.filter(email=username_or_email).first()
-
-        if not user:
-            return Response({"error": "User not found!"}, status=status.HTTP_404_NOT_FOUND)
-
-        if user.otp == otp and user.is_otp_valid():
-            user.is_verified = True
-            user.otp = None  
-            user.otp_created_at = None
-            user.save()
+        user = serializer.validated_data["user"]  # ✅ Already looked up and OTP-checked by the serializer
+        user.is_verified = True
+        user.otp = None
+        user.otp_created_at = None
+        user.save(update_fields=["is_verified", "otp", "otp_created_at"])
 
-            return Response({"message": "Account verified successfully!"}, status=status.HTTP_200_OK)
-        else:
-            return Response({"error": "Invalid or expired OTP!"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"message": "Account verified successfully!"}, status=status.HTTP_200_OK)
 
 
 # ✅ Add Loan (User Only)
@@ -98,23 +132,130 @@ class LoanCreateView(generics.CreateAPIView):
         serializer.save(user=self.request.user)  
 
 
+# ✅ Bulk Add Loans (User Only): JSON array or NDJSON stream
+class LoanBulkCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"error": "Expected a non-empty JSON array or NDJSON stream of loans."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        max_rows = getattr(settings, "LBE_BULK_MAX_ROWS", 10000)
+        if len(rows) > max_rows:
+            return Response({"error": f"At most {max_rows} loans per request."},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        validator = LoanSerializer()  # One instance validates every row; fields are built once
+        valid, errors = [], []
+        for row_no, row in enumerate(rows):
+            try:
+                valid.append(validator.run_validation(row))
+            except ValidationError as exc:
+                errors.append({"row": row_no, "errors": exc.detail})
+
+        all_or_nothing = request.query_params.get("atomic", "").lower() in ("1", "true")
+        if errors and (all_or_nothing or not valid):
+            return Response({"created": 0, "loan_ids": [], "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        loans = Loan.originate_batch(request.user, valid)
+        return Response({
+            "created": len(loans),
+            "loan_ids": [f"LOAN{loan.id:03}" for loan in loans],
+            "errors": errors,
+        }, status=status.HTTP_201_CREATED)
+
+
+# ✅ Quote Loan Offers (stateless: nothing is saved)
+class LoanQuoteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = LoanQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        amount, rate, tenure, priced = amortization.price_grid(
+            serializer.validated_data["amounts"],
+            serializer.validated_data["interest_rates"],
+            serializer.validated_data["tenures"],
+        )
+        # Money and rates as 2-dp strings, like the DecimalFields everywhere else in the API
+        columns = {
+            "amount": amortization.paisa_strings(np.rint(amount * 100)),
+            "tenure": tenure.tolist(),
+            "interest_rate": amortization.paisa_strings(np.rint(rate * 100)),
+            **{field: amortization.paisa_strings(priced[field]) for field in amortization.Pricing._fields},
+        }
+        return Response({
+            "count": len(columns["amount"]),
+            "quotes": [dict(zip(columns, row)) for row in zip(*columns.values())],
+        })
+
+
 # ✅ List Active & Past Loans (User Only)
-class LoanListView(generics.ListAPIView):
-    serializer_class = LoanSerializer
+class LoanListView(ReplicaReadMixin, LoanListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         return Loan.objects.filter(user=self.request.user)
 
 
+class CachedLoanPayloadMixin:
+    """Conditional GET (ETag / 304) and cached payloads for a single loan (see LBE/loan_cache.py).
+
+    A poll costs one primary-key lookup; the serializer only runs after the loan changed.
+    """
+    payload_kind = None
+    lookup_field = "id"
+
+    def get_queryset(self):
+        return Loan.objects.prefetch_related("installments")
+
+    def retrieve(self, request, *args, **kwargs):
+        loan_id = kwargs[self.lookup_field]
+        row = Loan.objects.filter(id=loan_id).values_list("user_id", "version").first()
+        if row is None:
+            raise Http404("No Loan matches the given query.")
+        user_id, version = row
+        self.check_object_permissions(request, Loan(id=loan_id, user_id=user_id))
+
+        tag = loan_cache.etag(self.payload_kind, loan_id, version)
+        if loan_cache.not_modified(request, tag):
+            return self.with_validators(Response(status=status.HTTP_304_NOT_MODIFIED), tag)
+
+        data = loan_cache.get_payload(self.payload_kind, loan_id, version)
+        if data is None:
+            loan = self.get_object()
+            data = self.build_payload(loan)
+            loan_cache.set_payload(self.payload_kind, loan.id, loan.version, data)
+            tag = loan_cache.etag(self.payload_kind, loan.id, loan.version)
+        return self.with_validators(Response(data), tag)
+
+    @staticmethod
+    def with_validators(response, tag):
+        response["ETag"] = tag
+        response["Cache-Control"] = "private, no-cache"  # Clients must revalidate, which is a cheap 304
+        return response
+
+
 # ✅ View Loan Details (User or Admin)
-class LoanDetailView(generics.RetrieveAPIView):
+class LoanDetailView(ReplicaReadMixin, CachedLoanPayloadMixin, generics.RetrieveAPIView):
     serializer_class = LoanSerializer
     permission_classes = [IsAuthenticated, IsLoanOwner]
-    lookup_field = "id"
+    payload_kind = "detail"
+
+    def build_payload(self, loan):
+        return self.get_serializer(loan).data
 
-    def get_queryset(self):
-        return Loan.objects.all()  
+
+# ✅ View Payment Schedule only (User or Admin)
+class LoanScheduleView(ReplicaReadMixin, CachedLoanPayloadMixin, generics.RetrieveAPIView):
+    serializer_class = LoanSerializer
+    permission_classes = [IsAuthenticated, IsLoanOwner]
+    payload_kind = "schedule"
+
+    def build_payload(self, loan):
+        return schedule_payload(loan)
 
 
 # ✅ Foreclose Loan (User Only)
@@ -132,6 +273,8 @@ class LoanForeclosureView(generics.UpdateAPIView):
             return Response({"error": "Loan is already closed"}, status=status.HTTP_400_BAD_REQUEST)
 
         foreclosure_result = loan.foreclose_loan()
+        if "error" in foreclosure_result:
+            return Response(foreclosure_result, status=status.HTTP_409_CONFLICT)
         return Response({
             "status": "success",
             "message": "Loan foreclosed successfully.",
@@ -145,9 +288,57 @@ class LoanForeclosureView(generics.UpdateAPIView):
         }, status=status.HTTP_200_OK)
 
 
+# ✅ Post a Repayment (Loan Owner or Admin)
+class LoanPaymentView(generics.GenericAPIView):
+    serializer_class = PaymentSerializer
+    permission_classes = [IsAuthenticated, IsLoanOwner]
+    lookup_field = "id"
+
+    def get_queryset(self):
+        return Loan.objects.all()
+
+    def post(self, request, *args, **kwargs):
+        loan = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = loan.post_payment(serializer.validated_data["amount"])
+        if "field" in result:  # ✅ Bad input (e.g. overpayment), reported like a serializer error
+            return Response({result["field"]: [result["error"]]}, status=status.HTTP_400_BAD_REQUEST)
+        if "error" in result:
+            return Response(result, status=status.HTTP_409_CONFLICT)
+        return Response({"status": "success", "data": {"loan_id": f"LOAN{loan.id:03}", **result}},
+                        status=status.HTTP_201_CREATED)
+
+
+# ✅ Simulate Prepayments / Foreclosure (Loan Owner or Admin; nothing is saved)
+class LoanSimulationView(generics.GenericAPIView):
+    serializer_class = LoanSimulationSerializer
+    permission_classes = [IsAuthenticated, IsLoanOwner]
+    lookup_field = "id"
+
+    def get_queryset(self):
+        return Loan.objects.all()
+
+    def post(self, request, *args, **kwargs):
+        loan = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            result = prepayment.simulate_loan(
+                loan,
+                [(row.get("before_installment"), row["amount"]) for row in serializer.validated_data.get("prepayments", [])],
+                reduce=serializer.validated_data["reduce"],
+                foreclose_on=serializer.validated_data.get("foreclose_on"),
+            )
+        except prepayment.SimulationError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"status": "success", "data": result})
+
+
 # ✅ Admin: View All Loans
-class AdminLoanListView(generics.ListAPIView):
-    serializer_class = LoanSerializer
+class AdminLoanListView(ReplicaReadMixin, LoanListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
 
     def get_queryset(self):
@@ -162,3 +353,118 @@ class LoanDeleteView(generics.DestroyAPIView):
 
     def get_queryset(self):
         return Loan.objects.all()  
+
+    def perform_destroy(self, instance):
+        loan_id = instance.id
+        with transaction.atomic():
+            portfolio.remove([instance])
+            instance.delete()
+        loan_cache.invalidate(loan_id)
+
+
+# ✅ Admin: Portfolio Analytics (served from the incrementally maintained snapshot)
+class AdminPortfolioView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({"status": "success", "data": portfolio.summary()}, status=status.HTTP_200_OK)
+
+
+# ✅ Admin: Request Metrics (Prometheus text format)
+class AdminMetricsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ✅ Admin: Installments Due (defaults to the next 7 days)
+class AdminInstallmentsDueView(generics.ListAPIView):
+    serializer_class = InstallmentSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    pagination_class = InstallmentCursorPagination
+    max_days = 366  # ✅ Larger windows would overflow date arithmetic (500) and scan the whole ledger anyway
+
+    def get_queryset(self):
+        try:
+            days = min(max(int(self.request.query_params.get("days", 7)), 0), self.max_days)
+        except ValueError:
+            days = 7
+        today = datetime.date.today()
+        return Installment.objects.due_between(today, today + datetime.timedelta(days=days))
+
+
+class Echo:
+    """File-like object whose write() hands the value back, for streaming csv.writer output."""
+    def write(self, value):
+        return value
+
+
+# ✅ Admin: Stream the loan book as NDJSON or CSV (constant memory)
+class AdminLoanExportView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    export_fields = [
+        "id", "user_id", "amount", "tenure", "interest_rate", "monthly_installment", "total_interest",
+        "total_amount", "amount_paid", "next_due_date", "status", "created_at",
+    ]
+    content_types = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+    chunk_size = 2000
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get("output", "ndjson").lower()
+        if output not in self.content_types:
+            return Response({"error": "output must be 'ndjson' or 'csv'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Loan.objects.order_by("id")
+        if request.query_params.get("status"):
+            queryset = queryset.filter(status=request.query_params["status"].upper())
+        for param, lookup in (("created_after", "created_at__gte"), ("created_before", "created_at__lt")):
+            value = request.query_params.get(param)
+            if value:
+                moment = self.parse_moment(value)
+                if moment is None:
+                    return Response({"error": f"{param} must be an ISO date or datetime."},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                queryset = queryset.filter(**{lookup: moment})
+
+        rows = queryset.values_list(*self.export_fields).iterator(chunk_size=self.chunk_size)
+        lines = self.csv_lines(rows) if output == "csv" else self.ndjson_lines(rows)
+        response = StreamingHttpResponse(self.batched(lines), content_type=self.content_types[output])
+        response["Content-Disposition"] = f'attachment; filename="loans-{datetime.date.today():%Y%m%d}.{output}"'
+        return response
+
+    @staticmethod
+    def parse_moment(value):
+        """Parse an ISO date or datetime into an aware datetime (None if invalid)."""
+        try:
+            moment = parse_datetime(value)
+            if moment is None:
+                day = parse_date(value)
+                moment = datetime.datetime.combine(day, datetime.time.min) if day else None
+        except ValueError:
+            return None
+        if moment is not None and timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    def ndjson_lines(self, rows):
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            yield encoder.encode(dict(zip(self.export_fields, row))) + "\n"
+
+    def csv_lines(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.export_fields)
+        for row in rows:
+            yield writer.writerow(row)
+
+    def batched(self, lines):
+        """Group lines so each chunk written to the socket carries many rows."""
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= self.chunk_size:
+                yield "".join(batch)
+                batch = []
+        if batch:
+            yield "".join(batch)
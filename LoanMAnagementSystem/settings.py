@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -46,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LBE.metrics.RequestMetricsMiddleware',  # ✅ First, so timings cover the whole stack
+    'LBE.db_routers.ReplicaStickinessMiddleware',  # ✅ Pins a user to the primary after their writes
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,6 +101,37 @@ DATABASES = {
     }
 }
 
+# Local runs (tests, benchmarks) can use SQLite instead: LBE_DB_ENGINE=sqlite [LBE_SQLITE_PATH=...]
+if os.environ.get('LBE_DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('LBE_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+# Read replicas for the loan list/detail views (LBE/db_routers.py). Writes always go to 'default'.
+# PostgreSQL: LBE_DB_REPLICA_HOSTS=host1,host2 adds 'replica1', 'replica2', ... with default's credentials.
+# SQLite: LBE_SQLITE_REPLICA_PATH=file adds a 'replica' alias and reads use it. Without it the alias is an
+# unused in-memory database, so no file is created; the routing tests run against it.
+LBE_READ_REPLICAS = []
+if os.environ.get('LBE_DB_ENGINE') == 'sqlite':
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('LBE_SQLITE_REPLICA_PATH', ':memory:'),
+    }
+    if os.environ.get('LBE_SQLITE_REPLICA_PATH'):
+        LBE_READ_REPLICAS = ['replica']
+else:
+    for number, host in enumerate(filter(None, os.environ.get('LBE_DB_REPLICA_HOSTS', '').split(',')), start=1):
+        DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+        LBE_READ_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['LBE.db_routers.ReadReplicaRouter']
+# Read-your-writes pins must be visible to every worker: a per-process cache (locmem) fails the system check
+# while replicas are configured. The file cache is shared on one host; use Redis/Memcached across hosts.
+LBE_REPLICA_STICKY_CACHE = 'replica_pins'
+LBE_REPLICA_STICKY_SECONDS = 5  # How long a user reads from the primary after a write; above worst replica lag
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -118,6 +152,26 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing policy (LBE/hashers.py): the first hasher hashes new passwords, and stored hashes
+# from any other hasher or cost are re-hashed on the user's next successful login.
+# Pick a cost with: python manage.py bench_hashers --budget-ms 250
+LBE_PASSWORD_HASHER = os.environ.get('LBE_PASSWORD_HASHER', 'pbkdf2')  # 'pbkdf2' or 'scrypt'
+LBE_PBKDF2_ITERATIONS = int(os.environ.get('LBE_PBKDF2_ITERATIONS', 870000))  # Django 5.1's default
+LBE_SCRYPT_WORK_FACTOR = int(os.environ.get('LBE_SCRYPT_WORK_FACTOR', 2 ** 14))
+
+LBE_TUNED_HASHERS = {
+    'pbkdf2': 'LBE.hashers.TunedPBKDF2PasswordHasher',
+    'scrypt': 'LBE.hashers.TunedScryptPasswordHasher',
+}
+PASSWORD_HASHERS = [LBE_TUNED_HASHERS[LBE_PASSWORD_HASHER]] + [
+    hasher for name, hasher in LBE_TUNED_HASHERS.items() if name != LBE_PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -141,11 +195,66 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ),
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'LBE.authentication.CachedJWTAuthentication',  # ✅ JWT without a user query per request
+        'rest_framework.authentication.BasicAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    # ✅ Client IP for throttling: REMOTE_ADDR unless deployed behind this many trusted proxies (X-Forwarded-For)
+    'NUM_PROXIES': int(os.environ.get('LBE_NUM_PROXIES', 0)),
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lbe-default',
+    },
+    'responses': {  # Rendered loan detail/schedule payloads (LBE/loan_cache.py)
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lbe-responses',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+        # To share payloads between worker processes on one host, use instead:
+        # 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/var/tmp/lbe-responses',
+    },
+    'replica_pins': {  # Users pinned to the primary after a write (LBE/db_routers.py)
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'replica-pins',
+    },
+    'auth_snapshots': {  # JWT auth user snapshots (LBE/authentication.py)
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'auth-snapshots',
+    },
+    'throttle': {  # Login/OTP rate-limit counters (LBE/throttling.py)
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'throttle',
+        'OPTIONS': {'MAX_ENTRIES': 10000},  # Culling drops live counters; keep it rare
+    },
+}
+
+# Cache alias holding JWT auth user snapshots. It must be shared by every worker (a per-process cache
+# fails the system check), so saving a user revokes its snapshot everywhere at once.
+LBE_AUTH_CACHE = 'auth_snapshots'
+LBE_AUTH_CACHE_TTL = 60  # Seconds a snapshot may serve requests before it is reloaded
+
+# EMI factors per (rate, tenure), memory-mapped so every worker on the host shares one lazily filled table.
+# Set to None to keep a private table per process; rename the file if the stored factor ever changes.
+# Keep it in a directory only this user can write (never a shared /tmp): its contents price real loans.
+LBE_ANNUITY_TABLE_PATH = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or BASE_DIR / 'var', 'lbe-annuity-f64-v1.bin')
+# Sliding-window limits on login and OTP verification (LBE/throttling.py); None disables a scope.
+# Counters live in this cache alias, which every worker must share (a per-process cache fails the system check).
+LBE_THROTTLE_CACHE = 'throttle'
+LBE_THROTTLE_RATES = {
+    'login_ip': '30/min',
+    'login_username': '5/min',
+    'otp_ip': '30/min',
+    'otp_username': '5/hour',
+}
+
+LBE_QUOTE_MAX_COMBINATIONS = 10000  # amounts x tenures x rates per /api/loans/quote/ call
+LBE_RESPONSE_CACHE = 'responses'  # Cache alias for loan payloads served with ETags
+LBE_RESPONSE_CACHE_TTL = 300  # Seconds; payloads are also dropped on every loan mutation
+LBE_METRICS_ENABLED = True  # Per-route latency/DB/serializer histograms, served at /api/admin/metrics/
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -170,15 +279,4 @@ AUTHENTICATION_BACKENDS = [
 
 AUTH_USER_MODEL = 'LBE.CustomUser'  # ✅ Ensure CustomUser is set correctly
 
-REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ),
-} 
-REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
-    ]
-}
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file